@@ -0,0 +1,8 @@
+-- Student dashboard: TPs of one group, newest deadline first, without a table scan.
+USE SchoolManagementDB;
+GO
+
+CREATE NONCLUSTERED INDEX IX_TP_Groupe_DateLimite
+    ON TP (GroupeID, DateLimite DESC)
+    INCLUDE (Titre, Description, ModuleID);
+GO
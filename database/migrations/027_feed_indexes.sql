@@ -0,0 +1,13 @@
+-- Keyset pagination for the teacher timeline (TP + Annonce branches of the feed).
+USE SchoolManagementDB;
+GO
+
+CREATE NONCLUSTERED INDEX IX_TP_Formateur_DateLimite
+    ON TP (FormateurID, DateLimite DESC, TPID DESC)
+    INCLUDE (Titre, GroupeID, ModuleID);
+GO
+
+CREATE NONCLUSTERED INDEX IX_Annonce_Formateur_DatePublication
+    ON Annonce (FormateurID, DatePublication DESC, AnnonceID DESC)
+    INCLUDE (Titre, GroupeID, ModuleID);
+GO
@@ -0,0 +1,16 @@
+-- Resized variants of announcement images (thumbnail / display size).
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE AnnonceImage (
+    AnnonceID INT NOT NULL REFERENCES Annonce(AnnonceID) ON DELETE CASCADE,
+    Variante  NVARCHAR(20) NOT NULL,          -- 'thumb' | 'display'
+    Donnees   VARBINARY(MAX) NOT NULL,
+    TypeMime  NVARCHAR(50) NOT NULL,
+    Largeur   INT NOT NULL,
+    Hauteur   INT NOT NULL,
+    Taille    INT NOT NULL,
+    Empreinte CHAR(40) NOT NULL,              -- SHA-1 of Donnees, used as the HTTP ETag
+    CONSTRAINT PK_AnnonceImage PRIMARY KEY (AnnonceID, Variante)
+);
+GO
@@ -0,0 +1,7 @@
+-- Filled asynchronously by the 'file_metadata' background job.
+USE SchoolManagementDB;
+GO
+
+ALTER TABLE TP ADD Empreinte CHAR(64) NULL, NbPages INT NULL;
+ALTER TABLE Soumission ADD Empreinte CHAR(64) NULL, NbPages INT NULL;
+GO
@@ -0,0 +1,32 @@
+-- Numbered submission attempts with a "latest" flag, and cold storage for old BLOBs.
+USE SchoolManagementDB;
+GO
+
+ALTER TABLE Soumission ADD
+    Tentative   INT NOT NULL CONSTRAINT DF_Soumission_Tentative DEFAULT 1,
+    EstDerniere BIT NOT NULL CONSTRAINT DF_Soumission_EstDerniere DEFAULT 1;
+GO
+
+-- Backfill: number existing attempts per (TP, student) and flag the newest one
+WITH Numbered AS (
+    SELECT Tentative, EstDerniere,
+           ROW_NUMBER() OVER (PARTITION BY TPID, EtudiantID ORDER BY DateSoumission, SoumissionID) AS Num,
+           COUNT(*) OVER (PARTITION BY TPID, EtudiantID) AS Total
+    FROM Soumission
+)
+UPDATE Numbered SET Tentative = Num, EstDerniere = CASE WHEN Num = Total THEN 1 ELSE 0 END;
+GO
+
+-- Grading list: one seek on (TPID) returning only the latest attempt per student
+CREATE UNIQUE NONCLUSTERED INDEX UX_Soumission_Derniere
+    ON Soumission (TPID, EtudiantID)
+    INCLUDE (DateSoumission, Note, FichierNom, Tentative)
+    WHERE EstDerniere = 1;
+GO
+
+CREATE TABLE SoumissionArchive (
+    SoumissionID  INT PRIMARY KEY REFERENCES Soumission(SoumissionID) ON DELETE CASCADE,
+    FichierData   VARBINARY(MAX) NOT NULL,
+    DateArchivage DATETIME NOT NULL
+);
+GO
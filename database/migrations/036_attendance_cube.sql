@@ -0,0 +1,30 @@
+-- Pre-aggregated attendance at day grain over filiere / groupe / module / formateur.
+-- Week and month roll-ups are computed from these cells, never from Presence.
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE AttendanceCube (
+    Jour        DATE NOT NULL,
+    FiliereID   INT  NOT NULL,
+    GroupeID    INT  NOT NULL,
+    ModuleID    INT  NOT NULL,
+    FormateurID INT  NOT NULL,
+    NbPresent   INT  NOT NULL,
+    NbTotal     INT  NOT NULL,
+    CONSTRAINT PK_AttendanceCube PRIMARY KEY (Jour, GroupeID, ModuleID, FormateurID)
+);
+GO
+
+CREATE NONCLUSTERED INDEX IX_AttendanceCube_Filiere ON AttendanceCube (FiliereID, Jour) INCLUDE (NbPresent, NbTotal);
+CREATE NONCLUSTERED INDEX IX_AttendanceCube_Formateur ON AttendanceCube (FormateurID, Jour) INCLUDE (NbPresent, NbTotal);
+GO
+
+-- Initial load (the app refreshes cells incrementally afterwards)
+INSERT INTO AttendanceCube (Jour, FiliereID, GroupeID, ModuleID, FormateurID, NbPresent, NbTotal)
+SELECT CAST(S.DateDebut AS DATE), G.FiliereID, S.GroupeID, S.ModuleID, S.FormateurID,
+       COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END), COUNT(P.PresenceID)
+FROM Seance S
+JOIN Groupe G ON S.GroupeID = G.GroupeID
+LEFT JOIN Presence P ON S.SeanceID = P.SeanceID
+GROUP BY CAST(S.DateDebut AS DATE), G.FiliereID, S.GroupeID, S.ModuleID, S.FormateurID;
+GO
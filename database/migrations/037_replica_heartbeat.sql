@@ -0,0 +1,21 @@
+-- Heartbeat used by the app to measure read-replica lag (see src/replica.py).
+-- The row is written on the primary and reaches the replica through replication,
+-- so GETDATE() - Battement on the replica is how far behind it is.
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE ReplicaHeartbeat (
+    ID        INT      NOT NULL CONSTRAINT PK_ReplicaHeartbeat PRIMARY KEY,
+    Battement DATETIME NOT NULL
+);
+GO
+
+INSERT INTO ReplicaHeartbeat (ID, Battement) VALUES (1, GETDATE());
+GO
+
+-- Run on the primary every few seconds (SQL Agent job step, schedule: every 5 seconds):
+--   UPDATE ReplicaHeartbeat SET Battement = GETDATE() WHERE ID = 1;
+CREATE OR ALTER PROCEDURE dbo.usp_ReplicaHeartbeat
+AS
+    UPDATE ReplicaHeartbeat SET Battement = GETDATE() WHERE ID = 1;
+GO
@@ -0,0 +1,18 @@
+-- Replica lag is now computed on the replica itself (src/replica.py):
+--   DATEDIFF(..., Battement, SYSUTCDATETIME())
+-- so the heartbeat is written in UTC, and the app server's clock (and time zone)
+-- no longer matter.
+USE SchoolManagementDB;
+GO
+
+ALTER TABLE ReplicaHeartbeat ALTER COLUMN Battement DATETIME2(3) NOT NULL;
+GO
+
+UPDATE ReplicaHeartbeat SET Battement = SYSUTCDATETIME() WHERE ID = 1;
+GO
+
+-- Run on the primary every few seconds (SQL Agent job step, schedule: every 5 seconds)
+CREATE OR ALTER PROCEDURE dbo.usp_ReplicaHeartbeat
+AS
+    UPDATE ReplicaHeartbeat SET Battement = SYSUTCDATETIME() WHERE ID = 1;
+GO
@@ -0,0 +1,12 @@
+-- Row versioning so dashboard reads never block on (or block) presence saves and uploads.
+-- ALLOW_SNAPSHOT_ISOLATION: lets SchoolDB read methods run under SNAPSHOT (see src/isolation.py).
+-- READ_COMMITTED_SNAPSHOT: plain READ COMMITTED statements read committed versions instead of waiting.
+-- Switching RCSI on needs exclusive access to the database; run it in a maintenance window.
+USE master;
+GO
+
+ALTER DATABASE SchoolManagementDB SET ALLOW_SNAPSHOT_ISOLATION ON;
+GO
+
+ALTER DATABASE SchoolManagementDB SET READ_COMMITTED_SNAPSHOT ON WITH ROLLBACK IMMEDIATE;
+GO
@@ -0,0 +1,28 @@
+-- Text extracted from TP subjects / report PDFs, once per content hash (TP.Empreinte,
+-- Soumission.Empreinte), by the 'file_metadata' background job; searched through a
+-- full-text index when FULLTEXT_BACKEND=sqlserver.
+-- Requires the Full-Text Search feature of SQL Server.
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE TexteDocument (
+    Empreinte      CHAR(64) NOT NULL CONSTRAINT PK_TexteDocument PRIMARY KEY,
+    Contenu        NVARCHAR(MAX) NOT NULL,
+    NbCaracteres   INT NOT NULL,
+    DateExtraction DATETIME NOT NULL CONSTRAINT DF_TexteDocument_Date DEFAULT GETDATE()
+);
+GO
+
+CREATE FULLTEXT CATALOG SchoolDocuments WITH ACCENT_SENSITIVITY = OFF;
+GO
+
+-- French word breaker (LCID 1036)
+CREATE FULLTEXT INDEX ON TexteDocument (Contenu LANGUAGE 1036)
+    KEY INDEX PK_TexteDocument ON SchoolDocuments
+    WITH CHANGE_TRACKING AUTO;
+GO
+
+-- Search joins back to the files by hash
+CREATE NONCLUSTERED INDEX IX_TP_Empreinte ON TP (Empreinte) WHERE Empreinte IS NOT NULL;
+CREATE NONCLUSTERED INDEX IX_Soumission_Empreinte ON Soumission (Empreinte) WHERE Empreinte IS NOT NULL;
+GO
@@ -0,0 +1,11 @@
+-- Spooled reports (src/admission.py) are written by the 'ingest_submission' job, which may
+-- run more than once for the same upload (retry, requeue after a crash). The receipt id is
+-- stored with the attempt and is unique, so a replay finds the attempt instead of adding one.
+USE SchoolManagementDB;
+GO
+
+ALTER TABLE Soumission ADD RecuID CHAR(32) NULL;
+GO
+
+CREATE UNIQUE NONCLUSTERED INDEX UX_Soumission_RecuID ON Soumission (RecuID) WHERE RecuID IS NOT NULL;
+GO
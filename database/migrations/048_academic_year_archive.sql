@@ -0,0 +1,105 @@
+-- Closed academic years (Sept 1st -> Sept 1st, keyed by the starting year) are moved out of
+-- the operational tables by the 'archive_academic_year' job, BLOBs included, in batches.
+-- The *Hist tables have no foreign keys (DELETE ... OUTPUT INTO needs that); the
+-- v_*Toutes views are the opt-in path for historical reports.
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE SeanceHist (
+    SeanceID    INT NOT NULL PRIMARY KEY,
+    DateDebut   DATETIME NOT NULL,
+    DateFin     DATETIME NULL,
+    Salle       NVARCHAR(50) NULL,
+    ModuleID    INT NOT NULL,
+    FormateurID INT NOT NULL,
+    GroupeID    INT NOT NULL,
+    Annee       INT NOT NULL
+);
+
+CREATE TABLE PresenceHist (
+    PresenceID         INT NOT NULL PRIMARY KEY,
+    SeanceID           INT NOT NULL,
+    EtudiantID         INT NOT NULL,
+    Etat               NVARCHAR(20) NULL,
+    DateEnregistrement DATETIME NULL,
+    Annee              INT NOT NULL
+);
+CREATE NONCLUSTERED INDEX IX_PresenceHist_Seance ON PresenceHist (SeanceID) INCLUDE (EtudiantID, Etat);
+
+CREATE TABLE TPHist (
+    TPID        INT NOT NULL PRIMARY KEY,
+    Titre       NVARCHAR(200) NOT NULL,
+    Description NVARCHAR(MAX) NULL,
+    FichierData VARBINARY(MAX) NULL,
+    FichierNom  NVARCHAR(255) NULL,
+    FichierType NVARCHAR(100) NULL,
+    DateLimite  DATETIME NULL,
+    ModuleID    INT NOT NULL,
+    FormateurID INT NOT NULL,
+    GroupeID    INT NOT NULL,
+    Empreinte   CHAR(64) NULL,
+    NbPages     INT NULL,
+    Annee       INT NOT NULL
+);
+
+CREATE TABLE SoumissionHist (
+    SoumissionID   INT NOT NULL PRIMARY KEY,
+    TPID           INT NOT NULL,
+    EtudiantID     INT NOT NULL,
+    LienRapport    NVARCHAR(500) NULL,
+    FichierData    VARBINARY(MAX) NULL,  -- cold-stored attempts (SoumissionArchive) are folded back in
+    FichierNom     NVARCHAR(255) NULL,
+    FichierType    NVARCHAR(100) NULL,
+    DateSoumission DATETIME NULL,
+    Note           DECIMAL(5, 2) NULL,
+    Tentative      INT NOT NULL,
+    EstDerniere    BIT NOT NULL,
+    Empreinte      CHAR(64) NULL,
+    NbPages        INT NULL,
+    Annee          INT NOT NULL
+);
+CREATE NONCLUSTERED INDEX IX_SoumissionHist_TP ON SoumissionHist (TPID, EtudiantID) WHERE EstDerniere = 1;
+GO
+
+-- One row per (year, step); a step is finished when a batch finds nothing left to move
+CREATE TABLE ArchivageAnnee (
+    Annee     INT NOT NULL,
+    Etape     VARCHAR(20) NOT NULL,
+    Deplaces  INT NOT NULL CONSTRAINT DF_ArchivageAnnee_Deplaces DEFAULT 0,
+    Statut    VARCHAR(10) NOT NULL CONSTRAINT DF_ArchivageAnnee_Statut DEFAULT 'en_cours',
+    DateDebut DATETIME NOT NULL CONSTRAINT DF_ArchivageAnnee_Debut DEFAULT GETDATE(),
+    DateMaj   DATETIME NOT NULL CONSTRAINT DF_ArchivageAnnee_Maj DEFAULT GETDATE(),
+    CONSTRAINT PK_ArchivageAnnee PRIMARY KEY (Annee, Etape)
+);
+GO
+
+-- Batches select a year's rows by these dates
+CREATE NONCLUSTERED INDEX IX_Seance_DateDebut ON Seance (DateDebut);
+CREATE NONCLUSTERED INDEX IX_TP_DateLimite ON TP (DateLimite);
+GO
+
+-- Historical reports: operational rows + archived years
+CREATE VIEW v_SeanceToutes AS
+    SELECT SeanceID, DateDebut, DateFin, Salle, ModuleID, FormateurID, GroupeID FROM Seance
+    UNION ALL
+    SELECT SeanceID, DateDebut, DateFin, Salle, ModuleID, FormateurID, GroupeID FROM SeanceHist;
+GO
+
+CREATE VIEW v_PresenceToutes AS
+    SELECT PresenceID, SeanceID, EtudiantID, Etat, DateEnregistrement FROM Presence
+    UNION ALL
+    SELECT PresenceID, SeanceID, EtudiantID, Etat, DateEnregistrement FROM PresenceHist;
+GO
+
+-- No BLOB columns: reports never need them
+CREATE VIEW v_TPToutes AS
+    SELECT TPID, Titre, Description, FichierNom, DateLimite, ModuleID, FormateurID, GroupeID FROM TP
+    UNION ALL
+    SELECT TPID, Titre, Description, FichierNom, DateLimite, ModuleID, FormateurID, GroupeID FROM TPHist;
+GO
+
+CREATE VIEW v_SoumissionToutes AS
+    SELECT SoumissionID, TPID, EtudiantID, FichierNom, DateSoumission, Note, Tentative, EstDerniere FROM Soumission
+    UNION ALL
+    SELECT SoumissionID, TPID, EtudiantID, FichierNom, DateSoumission, Note, Tentative, EstDerniere FROM SoumissionHist;
+GO
@@ -0,0 +1,22 @@
+-- Change-data feed (src/changefeed.py). SchoolDB writes (and the root scripts) add one row
+-- per changed row -- or per table when the rows are not known -- in the same transaction
+-- as the change. Version is a ROWVERSION: MIN_ACTIVE_ROWVERSION() tells readers which
+-- versions can no longer be committed out of order, and unlike an IDENTITY it does not
+-- change what SELECT @@IDENTITY returns to the writers.
+USE SchoolManagementDB;
+GO
+
+CREATE TABLE ChangeLog (
+    Version    ROWVERSION NOT NULL,
+    Tableau    VARCHAR(20) NOT NULL,  -- versions.TABLES name ('users', 'tps', ...)
+    LigneID    INT NULL,              -- NULL: some rows of that table
+    DateChange DATETIME NOT NULL CONSTRAINT DF_ChangeLog_Date DEFAULT GETDATE(),
+    CONSTRAINT PK_ChangeLog PRIMARY KEY CLUSTERED (Version)
+);
+GO
+
+-- Latest version per table
+CREATE NONCLUSTERED INDEX IX_ChangeLog_Tableau ON ChangeLog (Tableau, Version);
+-- Retention (changefeed.prune)
+CREATE NONCLUSTERED INDEX IX_ChangeLog_Date ON ChangeLog (DateChange);
+GO
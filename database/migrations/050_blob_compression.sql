@@ -0,0 +1,17 @@
+-- Stored files may be compressed (src/storage.py): Codec is NULL for a file stored as
+-- uploaded, 'zlib' or 'zstd' otherwise; TailleOriginale is the uploaded size in bytes
+-- (DATALENGTH(FichierData) is the stored size). Existing rows stay NULL = as uploaded.
+USE SchoolManagementDB;
+GO
+
+ALTER TABLE TP ADD Codec VARCHAR(10) NULL, TailleOriginale BIGINT NULL;
+ALTER TABLE Soumission ADD Codec VARCHAR(10) NULL, TailleOriginale BIGINT NULL;
+-- Archived years keep them (migration 048)
+ALTER TABLE TPHist ADD Codec VARCHAR(10) NULL, TailleOriginale BIGINT NULL;
+ALTER TABLE SoumissionHist ADD Codec VARCHAR(10) NULL, TailleOriginale BIGINT NULL;
+GO
+
+-- compress_stored_files job: the rows still stored as uploaded
+CREATE NONCLUSTERED INDEX IX_TP_Codec ON TP (Codec) INCLUDE (FichierNom, FichierType);
+CREATE NONCLUSTERED INDEX IX_Soumission_Codec ON Soumission (Codec) INCLUDE (FichierNom, FichierType);
+GO
@@ -0,0 +1,35 @@
+import argparse
+from src.db_manager import SchoolDB
+from src.exports import DATASETS, FORMATS, export_dataset, parse_date, academic_year_bounds, needs_history
+
+def main():
+    year_start, year_end = academic_year_bounds()
+
+    parser = argparse.ArgumentParser(description="Export attendance / grades for offline analysis.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--start", help="YYYY-MM-DD (default: start of the academic year)")
+    parser.add_argument("--end", help="YYYY-MM-DD, exclusive (default: end of the academic year)")
+    parser.add_argument("--partition", choices=["month", "none"], default="month")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--out", default="exports")
+    args = parser.parse_args()
+
+    start = parse_date(args.start, year_start)
+    end = parse_date(args.end, year_end)
+
+    # Years before the current one may already be archived (archive.py)
+    historical = needs_history(start)
+    print(f"--- 📦 EXPORTING {args.dataset} ({start} -> {end}) as {args.format}"
+          f"{' incl. archived years' if historical else ''} ---")
+    with SchoolDB() as db:
+        files = db.reporting(export_dataset, args.dataset, start, end, args.format, args.out,
+                             partition=None if args.partition == "none" else "month",
+                             batch_size=args.batch_size, historical=historical)
+
+    for path, rows in files:
+        print(f"   ✅ {path}: {rows} rows")
+    print(f"\n--- 🎉 EXPORT COMPLETE ({len(files)} files) ---")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from src.db_manager import SchoolDB
+from src import changefeed
 from werkzeug.security import generate_password_hash
 import random
 
@@ -12,6 +13,7 @@ def populate_students():
     
     with SchoolDB() as db:
         cursor = db.conn.cursor()
+        added_ids = []
         
         for filiere_name in filieres:
             print(f"\nProcessing Filiere: {filiere_name}...")
@@ -52,12 +54,16 @@ def populate_students():
                         "INSERT INTO Etudiant (EtudiantID, CNE, GroupeID, DateNaissance) VALUES (?, ?, ?, GETDATE())",
                         (user_id, cne, target_group['id'])
                     )
+                    added_ids.append(user_id)
                     
                     print(f"   ✅ Added {fname} {lname} -> {target_group['name']}")
                     count += 1
                 except Exception as e:
                     print(f"   ❌ Failed to add {email}: {e}")
         
+        # Logged once, right before the commit: a ChangeLog row written early in this long
+        # transaction would hold back the change feed of every worker until it ends
+        changefeed.record(cursor, {"users": added_ids})
         db.conn.commit()
         print("\n--- 🎉 POPULATION COMPLETE ---")
 
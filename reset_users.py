@@ -1,4 +1,5 @@
 from src.db_manager import SchoolDB
+from src import changefeed
 from werkzeug.security import generate_password_hash
 
 def reset_users():
@@ -19,6 +20,8 @@ def reset_users():
             cursor.execute("DELETE FROM Etudiant")
             cursor.execute("DELETE FROM Formateur")
             cursor.execute("DELETE FROM Utilisateur")
+            # Tell the running app's caches (changefeed.py)
+            changefeed.record(cursor, dict.fromkeys(("users", "assignments", "tps", "annonces", "submissions", "presence")))
             db.conn.commit()
             print("✅ Old data cleared.")
         except Exception as e:
@@ -57,6 +60,7 @@ def reset_users():
                     "INSERT INTO Formateur (FormateurID, Matricule, Specialite) VALUES (?, ?, ?)",
                     (user_id, extra['matricule'], 'General')
                 )
+            changefeed.record(cursor, {"users": [user_id]})
                 
             print(f"👤 Created {role}: {email} (Password: {raw_password})")
 
@@ -0,0 +1,293 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime
+
+from settings import get_settings
+
+# Admission control for the upload routes (deadline bursts on /submit_rapport).
+#
+# - At most UPLOAD_CONCURRENCY uploads of a process are read at the same time;
+#   the others wait in a queue of at most UPLOAD_QUEUE_MAX, for at most
+#   UPLOAD_QUEUE_TIMEOUT seconds, then get a 503 with Retry-After.
+# - Fair: a free slot goes to the oldest waiter among the users with the fewest
+#   uploads in progress, so one user's retries cannot starve the others.
+# - Dedupe: a user waiting twice on the same route (double click, retry) keeps
+#   only the newest request; the older one is answered 409.
+#
+# A report is then spooled: the file is streamed to UPLOAD_SPOOL_PATH and a
+# receipt (who, what, received_at) is written and fsynced next to it. That is
+# the durable acknowledgement (202); the 'ingest_submission' job writes it to
+# the database later, with the receipt time as DateSoumission so queueing
+# never makes a student late. An upload whose ingest fails for good (e.g. its TP
+# was deleted) is moved to UPLOAD_SPOOL_PATH/failed with the error, for Direction
+# to look at (/api/failed_uploads), instead of being retried on every restart.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Rejected(Exception):
+    """ The request was not admitted: answer with status (and Retry-After when set). """
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("key", "user", "seq", "admitted", "superseded")
+
+    def __init__(self, key, user, seq):
+        self.key = key
+        self.user = user
+        self.seq = seq
+        self.admitted = False
+        self.superseded = False
+
+
+_cond = threading.Condition()
+_waiting = []  # tickets in arrival order
+_active = {}   # user -> uploads in progress
+_seq = [0]
+_stats = {"admitted": 0, "rejected": 0, "superseded": 0, "timed_out": 0, "max_wait_ms": 0.0, "wait_ms": 0.0}
+
+
+def _running():
+    return sum(_active.values())
+
+
+def _grant():
+    # caller holds _cond: hands free slots to the fairest waiters
+    limit = get_settings().upload_concurrency
+    while _waiting and _running() < limit:
+        ticket = min(_waiting, key=lambda t: (_active.get(t.user, 0), t.seq))
+        _waiting.remove(ticket)
+        ticket.admitted = True
+        _active[ticket.user] = _active.get(ticket.user, 0) + 1
+    _cond.notify_all()
+
+
+class slot:
+    """
+    with admission.slot(request.endpoint, user_id): ...   raises Rejected when not admitted.
+    """
+
+    def __init__(self, route, user):
+        self.route = route
+        self.user = user
+        self.ticket = None
+
+    def __enter__(self):
+        settings = get_settings()
+        started = time.monotonic()
+        with _cond:
+            key = (self.route, self.user)
+            for other in _waiting:
+                if other.key == key:
+                    other.superseded = True
+                    _waiting.remove(other)
+                    _stats["superseded"] += 1
+                    break
+            if len(_waiting) >= settings.upload_queue_max:
+                _stats["rejected"] += 1
+                raise Rejected(503, "Server busy, please retry shortly.", retry_after=5)
+
+            _seq[0] += 1
+            ticket = self.ticket = _Ticket(key, self.user, _seq[0])
+            _waiting.append(ticket)
+            _grant()
+
+            deadline = started + settings.upload_queue_timeout
+            while not ticket.admitted:
+                if ticket.superseded:
+                    raise Rejected(409, "Replaced by your newer upload.")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    _waiting.remove(ticket)
+                    _stats["timed_out"] += 1
+                    raise Rejected(503, "Server busy, please retry shortly.", retry_after=max(5, settings.upload_queue_timeout // 2))
+                _cond.wait(remaining)
+
+            waited = (time.monotonic() - started) * 1000
+            _stats["admitted"] += 1
+            _stats["wait_ms"] += waited
+            _stats["max_wait_ms"] = max(_stats["max_wait_ms"], waited)
+        return ticket
+
+    def __exit__(self, *exc):
+        with _cond:
+            left = _active.get(self.user, 1) - 1
+            if left: _active[self.user] = left
+            else: _active.pop(self.user, None)
+            _grant()
+        return False
+
+
+def stats():
+    with _cond:
+        admitted = _stats["admitted"]
+        return dict(_stats, wait_ms=round(_stats["wait_ms"], 1), max_wait_ms=round(_stats["max_wait_ms"], 1),
+                    avg_wait_ms=round(_stats["wait_ms"] / admitted, 1) if admitted else None,
+                    running=_running(), waiting=len(_waiting), limit=get_settings().upload_concurrency)
+
+
+# --- Spool ---
+def _spool_dir():
+    path = get_settings().upload_spool_path
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:  # not supported (Windows): the file fsyncs still apply
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def spool_upload(file, meta, received_at):
+    """
+    Streams an uploaded werkzeug FileStorage to the spool and writes its receipt.
+    Returns the receipt (a dict) once both are on disk.
+    """
+    directory = _spool_dir()
+    receipt_id = uuid.uuid4().hex
+    data_path = os.path.join(directory, f"{receipt_id}.bin")
+    digest = hashlib.sha256()
+    size = 0
+    with open(data_path, "wb") as out:
+        while True:
+            chunk = file.stream.read(CHUNK_SIZE)
+            if not chunk: break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+
+    return write_receipt(receipt_id, dict(meta, filename=file.filename, filetype=file.mimetype, size=size,
+                                          sha256=digest.hexdigest()), received_at)
+
+
+def spool_file(path, meta, received_at):
+    """ Moves an already assembled file (uploads.py) into the spool and writes its receipt. """
+    receipt_id = uuid.uuid4().hex
+    os.replace(path, os.path.join(_spool_dir(), f"{receipt_id}.bin"))
+    return write_receipt(receipt_id, meta, received_at)
+
+
+def write_receipt(receipt_id, meta, received_at):
+    directory = _spool_dir()
+    receipt = dict(meta, id=receipt_id, received_at=received_at.isoformat(timespec="milliseconds"))
+    # Written under a temp name then renamed: a receipt on disk is always complete
+    tmp_path = os.path.join(directory, f"{receipt_id}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        json.dump(receipt, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, receipt_path(receipt_id))
+    _fsync_dir(directory)
+    return receipt
+
+
+class SpooledFile:
+    """ A file on disk as a re-iterable sequence of chunks (what SchoolDB streams into a BLOB). """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk: break
+                yield chunk
+
+
+def receipt_path(receipt_id):
+    return os.path.join(get_settings().upload_spool_path, f"{receipt_id}.json")
+
+
+def load_receipt(receipt_id):
+    """ (receipt, path of the spooled file), or (None, None) once it has been ingested. """
+    try:
+        with open(receipt_path(receipt_id), encoding="utf-8") as f:
+            receipt = json.load(f)
+    except FileNotFoundError:
+        return None, None
+    receipt["received_at"] = datetime.fromisoformat(receipt["received_at"])
+    return receipt, os.path.join(get_settings().upload_spool_path, f"{receipt_id}.bin")
+
+
+def discard(receipt_id):
+    """ Removes an ingested upload from the spool (receipt last, so a crash leaves it retryable). """
+    directory = get_settings().upload_spool_path
+    for name in (f"{receipt_id}.bin", f"{receipt_id}.json"):
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def _failed_dir():
+    path = os.path.join(get_settings().upload_spool_path, "failed")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def dead_letter(receipt_id, error):
+    """ Moves an upload that could not be ingested to the failed/ folder, its receipt noting why. """
+    receipt, data_path = load_receipt(receipt_id)
+    if receipt is None:
+        return False
+    directory = _failed_dir()
+    if os.path.exists(data_path):
+        os.replace(data_path, os.path.join(directory, f"{receipt_id}.bin"))
+    receipt = dict(receipt, received_at=receipt["received_at"].isoformat(timespec="milliseconds"),
+                   error=error, failed_at=datetime.now().isoformat(timespec="seconds"))
+    with open(os.path.join(directory, f"{receipt_id}.json"), "w", encoding="utf-8") as out:
+        json.dump(receipt, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.remove(receipt_path(receipt_id))
+    print(f"❌ Upload {receipt_id} of student {receipt.get('etudiant_id')} could not be saved: {error}")
+    return True
+
+
+def failed_receipts():
+    """ Receipts of the uploads that could not be ingested (with their error), newest first. """
+    directory = os.path.join(get_settings().upload_spool_path, "failed")
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                found.append(json.load(f))
+    return sorted(found, key=lambda r: r.get("failed_at", ""), reverse=True)
+
+
+def pending_receipts(older_than=0):
+    """ Ids of the receipts still in the spool (not yet ingested), oldest first. """
+    directory = get_settings().upload_spool_path
+    if not os.path.isdir(directory):
+        return []
+    cutoff = time.time() - older_than
+    found = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            path = os.path.join(directory, name)
+            mtime = os.path.getmtime(path)
+            if mtime <= cutoff:
+                found.append((mtime, name[:-5]))
+    return [receipt_id for _, receipt_id in sorted(found)]
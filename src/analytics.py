@@ -0,0 +1,180 @@
+import numpy as np
+
+import archive
+
+# Vectorized attendance analytics.
+# Presence/Seance rows are pulled as columns (one NumPy array per field, filled
+# batch by batch from fetchmany) and every statistic below is computed with
+# array operations instead of Python loops over pyodbc rows.
+
+# All-integer columns (day = days since 1970-01-01) so each batch converts to one int32 matrix
+PRESENCE_SQL = """
+SELECT P.EtudiantID, S.ModuleID, S.GroupeID, DATEDIFF(DAY, '1970-01-01', S.DateDebut) AS Jour,
+       CASE WHEN P.Etat = 'Present' THEN 1 ELSE 0 END AS Present
+FROM {Presence} P
+JOIN {Seance} S ON P.SeanceID = S.SeanceID
+{where}
+"""
+
+# "3 strikes" rule used by the absence report
+MAX_ABSENCES = 3
+MIN_RATE = 75.0
+MAX_STREAK = 3
+
+
+def columns_from_matrix(matrix):
+    """ Splits an (n x 5) int matrix of PRESENCE_SQL rows into named columns. """
+    matrix = np.asarray(matrix, dtype=np.int32).reshape(-1, 5)
+    return {
+        "student": matrix[:, 0].copy(),
+        "module": matrix[:, 1].copy(),
+        "group": matrix[:, 2].copy(),
+        "day": matrix[:, 3].astype("datetime64[D]"),
+        "present": matrix[:, 4].astype(bool),
+    }
+
+
+def load_presence_columns(conn, formateur_id=None, batch_size=20000, historical=False):
+    """
+    Returns {"student", "module", "group": int32 arrays, "day": datetime64[D], "present": bool}.
+    Only one batch of pyodbc rows exists at a time.
+    historical=True adds the archived academic years (otherwise: the open year only).
+    """
+    where = "WHERE S.FormateurID = ?" if formateur_id else ""
+    params = (formateur_id,) if formateur_id else ()
+    cursor = conn.cursor()
+    cursor.execute(PRESENCE_SQL.format(where=where, **archive.tables(historical)), params)
+
+    batches = []
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows: break
+        batches.append(np.array([tuple(r) for r in rows], dtype=np.int32))
+    return columns_from_matrix(np.concatenate(batches) if batches else np.empty((0, 5), dtype=np.int32))
+
+
+def _group_keys(*arrays):
+    """
+    Dense group index for composite integer keys.
+    Keys are packed into one int64 (mixed radix) so np.unique works on a flat array.
+    Returns (unique keys as columns, inverse index); unique keys come out sorted.
+    """
+    packed = np.zeros(arrays[0].shape[0], dtype=np.int64)
+    codes = []
+    for arr in arrays:
+        values, code = np.unique(arr, return_inverse=True)
+        codes.append((values, code.reshape(-1)))
+        packed = packed * len(values) + code
+    uniq, inverse = np.unique(packed, return_inverse=True)
+
+    columns = []
+    rest = uniq
+    for values, _ in reversed(codes):
+        columns.append(values[rest % len(values)])
+        rest = rest // len(values)
+    keys = np.stack([c.astype(np.int64) for c in reversed(columns)], axis=1)
+    return keys, inverse.reshape(-1)
+
+
+def attendance_rates(cols, by=("student",)):
+    """
+    Attendance rate per key (e.g. by=("student", "module")).
+    Returns (keys [n_groups x len(by)], present counts, totals, rates %).
+    """
+    if cols["present"].size == 0:
+        return np.empty((0, len(by)), dtype=np.int64), np.array([]), np.array([]), np.array([])
+    keys, inverse = _group_keys(*(cols[k] for k in by))
+    totals = np.bincount(inverse)
+    present = np.bincount(inverse, weights=cols["present"]).astype(np.int64)
+    rates = np.round(present * 100.0 / totals, 1)
+    return keys, present, totals, rates
+
+
+def absence_streaks(cols):
+    """
+    Longest and current (most recent) run of consecutive absences per (student, module).
+    Returns (keys [n x 2], longest, current).
+    """
+    n = cols["present"].size
+    if n == 0:
+        return np.empty((0, 2), dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+
+    order = np.lexsort((cols["day"], cols["module"], cols["student"]))
+    student, module = cols["student"][order], cols["module"][order]
+    absent = ~cols["present"][order]
+
+    # A new (student, module) block starts where either key changes
+    new_block = np.empty(n, dtype=bool)
+    new_block[0] = True
+    new_block[1:] = (student[1:] != student[:-1]) | (module[1:] != module[:-1])
+    block_starts = np.flatnonzero(new_block)
+
+    # Runs break on every presence and every block boundary; count absences per run
+    run_id = np.cumsum(new_block | ~absent)
+    run_len = np.bincount(run_id, weights=absent).astype(np.int64)
+    streak_at = run_len[run_id] * absent  # streak length carried by each absent row
+
+    longest = np.maximum.reduceat(streak_at, block_starts)
+    block_ends = np.append(block_starts[1:], n) - 1
+    current = np.where(absent[block_ends], run_len[run_id[block_ends]], 0)
+
+    keys = np.stack([student[block_starts], module[block_starts]], axis=1)
+    return keys, longest, current
+
+
+def module_trends(cols, unit="W"):
+    """
+    Attendance rate per module per period (unit: 'D', 'W' or 'M'; weeks start on Monday,
+    like the cube's 'week' grain).
+    Returns [(module_id, period_start (str), rate), ...] sorted by module then period.
+    """
+    if cols["present"].size == 0:
+        return []
+    keys, inverse = _group_keys(cols["module"], period_starts(cols["day"], unit).astype(np.int64))
+    totals = np.bincount(inverse)
+    present = np.bincount(inverse, weights=cols["present"])
+    rates = np.round(present * 100.0 / totals, 1)
+    periods = keys[:, 1].astype("datetime64[D]")
+    return [(int(m), str(p), float(r)) for m, p, r in zip(keys[:, 0], periods, rates)]
+
+
+def period_starts(days, unit):
+    """
+    First day (datetime64[D]) of the period of each day. datetime64[W] counts weeks
+    from 1970-01-01, a Thursday: shifting by 3 days first gives ISO (Monday) weeks.
+    """
+    if unit == "W":
+        shifted = days.astype("datetime64[D]") + np.timedelta64(3, "D")
+        return shifted.astype("datetime64[W]").astype("datetime64[D]") - np.timedelta64(3, "D")
+    return days.astype(f"datetime64[{unit}]").astype("datetime64[D]")
+
+
+def at_risk(cols, max_absences=MAX_ABSENCES, min_rate=MIN_RATE, max_streak=MAX_STREAK):
+    """
+    Flags (student, module) pairs that break the absence rule, fall under the
+    minimum attendance rate, or are currently on a run of absences.
+    Returns a list of dicts sorted by absences (desc).
+    """
+    keys, present, totals, rates = attendance_rates(cols, by=("student", "module"))
+    if totals.size == 0:
+        return []
+    absences = totals - present
+    _, longest, current = absence_streaks(cols)
+    # Both key sets come out of a (student, module) sort, so rows line up one to one
+
+    flags = (absences >= max_absences) | (rates < min_rate) | (current >= max_streak)
+    idx = np.flatnonzero(flags)
+    idx = idx[np.argsort(-absences[idx], kind="stable")]
+    return [
+        {
+            "student_id": int(keys[i, 0]),
+            "module_id": int(keys[i, 1]),
+            "absences": int(absences[i]),
+            "sessions": int(totals[i]),
+            "rate": float(rates[i]),
+            "longest_streak": int(longest[i]),
+            "current_streak": int(current[i]),
+            "excluded": bool(absences[i] >= max_absences),
+        }
+        for i in idx
+    ]
@@ -1,17 +1,81 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file
+import sys
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, send_file, Response
 from db_manager import SchoolDB
-from dotenv import load_dotenv
+from events import broker, group_channel
+from zipstream import stream_zip, safe_name
+import isolation
+import replica
+import pool
+import statements
+import rows
+import compression
+import fragments
+import changefeed
+import search
+import fulltext
+import admission
+import uploads
+import storage
+import exports
+import archive
+import jobs
+import tasks  # registers the background job handlers
+from settings import get_settings
 import functools
 import io 
-import mimetypes
-import base64
+import csv
+import json
+import math
+import tempfile
+import queue
+import threading
+from datetime import datetime
+from urllib.parse import quote
 
-# 1. Secure Configuration
-load_dotenv()
+# 1. Secure Configuration (env / .env, read once)
 app = Flask(__name__)
 # Use a real secret key from .env, or a fallback for dev
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev_key_change_in_prod')
+app.secret_key = get_settings().secret_key
+# gzip / brotli for pages, JSON and text downloads
+compression.init_app(app)
+# {% cache %} blocks in the dashboard templates
+fragments.init_app(app)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background():
+    """
+    Starts the background work of this process, once. Called on the first request so
+    that importing the app (--check, scripts, the import-time budget) neither connects
+    to the database nor picks up queued jobs; a WSGI server may call it after forking.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started: return
+        _background_started = True
+    # Workers for post-upload processing, imports and aggregate refreshes
+    jobs.start_workers()
+    # Cache versions from the ChangeLog, polled for the writes of other workers and scripts
+    changefeed.start(SchoolDB)
+    # Admin autocomplete index: built from the DB in the background, then kept in sync by SchoolDB writes
+    search.start()
+    # Spooled reports whose ingest job was lost in a crash
+    tasks.requeue_spooled_uploads(get_settings().job_stale_seconds)
+    uploads.gc()
+
+@app.before_request
+def _start_background_once():
+    if not _background_started:
+        start_background()
+
+def lazy_db(method, *args):
+    """ A SchoolDB query run only if the template needs it (i.e. the fragment using it is not cached). """
+    def load():
+        with SchoolDB() as db:
+            return method(db, *args)
+    return fragments.Lazy(load)
 
 # --- AUTH DECORATOR ---
 def login_required(role=None):
@@ -26,6 +90,25 @@ def login_required(role=None):
         return wrapped
     return decorator
 
+@app.errorhandler(admission.Rejected)
+def upload_rejected(e):
+    """ Upload not admitted (queue full / timed out / replaced by a newer one). """
+    response = jsonify({'status': 'error', 'message': e.message})
+    response.status_code = e.status
+    if e.retry_after:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+@app.errorhandler(uploads.UploadError)
+def upload_error(e):
+    response = jsonify(dict(e.extra, status='error', message=e.message))
+    response.status_code = e.status
+    return response
+
+def json_stream(obj):
+    """ JSON response encoded piece by piece (rows.iter_json) for large listings, instead of jsonify. """
+    return Response(rows.iter_json(obj), mimetype='application/json')
+
 # --- AUTH ROUTES ---
 @app.route('/', methods=['GET', 'POST'])
 def login():
@@ -52,13 +135,11 @@ def logout():
 @app.route('/admin')
 @login_required('Direction')
 def admin_dashboard():
-    with SchoolDB() as db:
-        # Use the NEW extended fetcher
-        users = db.get_all_users_extended() 
-        grouped_groups = db.get_groups_by_filiere()
-        modules = db.get_all_modules()
-        # Fetch Global TPs for the new table
-        all_tps = db.get_all_tps_global() 
+    # Loaded lazily: sections served from the fragment cache skip their query
+    users = lazy_db(SchoolDB.get_all_users_extended)
+    grouped_groups = lazy_db(SchoolDB.get_groups_by_filiere)
+    modules = lazy_db(SchoolDB.get_all_modules)
+    all_tps = lazy_db(SchoolDB.get_all_tps_global)
     return render_template('admin.html', users=users, grouped_groups=grouped_groups, modules=modules, all_tps=all_tps)
 
 @app.route('/admin/create_user', methods=['POST'])
@@ -95,6 +176,175 @@ def create_user():
         
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/admin/import_users', methods=['POST'])
+@login_required('Direction')
+def import_users():
+    """
+    Bulk account creation from a CSV (nom, prenom, email, password, role, cne, matricule, groupe_id).
+    Rows are only parsed here; creation and password hashing run in a background job.
+    """
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        return jsonify({'status': 'error', 'message': 'No CSV file selected'})
+
+    reader = csv.DictReader(io.StringIO(file.read().decode('utf-8-sig')))
+    required = {'nom', 'prenom', 'email', 'password', 'role'}
+    if not reader.fieldnames or not required.issubset(reader.fieldnames):
+        return jsonify({'status': 'error', 'message': f"CSV must contain columns: {', '.join(sorted(required))}"})
+
+    rows = [row for row in reader if row.get('email')]
+    job_id = jobs.enqueue('bulk_import_users', {'rows': rows}, max_attempts=1, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': f'{len(rows)} users queued for import.', 'job_id': job_id})
+
+@app.route('/admin/export/<dataset>')
+@login_required('Direction')
+def export_data(dataset):
+    """
+    Attendance / grades extract for a date range (default: current academic year).
+    CSV is streamed batch by batch; Parquet/Arrow are written batch by batch to a
+    temp file that is streamed back and deleted.
+    """
+    if dataset not in exports.DATASETS:
+        return "Unknown dataset", 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return "Unknown format", 400
+
+    year_start, year_end = exports.academic_year_bounds()
+    try:
+        start = exports.parse_date(request.args.get('start'), year_start)
+        end = exports.parse_date(request.args.get('end'), year_end)
+    except ValueError:
+        return "Dates must be YYYY-MM-DD", 400
+    filename = f"{dataset}_{start}_{end}"
+    historical = exports.needs_history(start)  # closed years live in the archive tables
+
+    if fmt == 'csv':
+        def generate():
+            with SchoolDB() as db:
+                yield from exports.csv_chunks(db.reporting_stream(exports.iter_batches, dataset, start, end,
+                                                                  historical=historical))
+        return Response(generate(), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}.csv"'})
+
+    if not exports.arrow_available():
+        return "Parquet/Arrow export needs pyarrow on the server", 501
+
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    with SchoolDB() as db:
+        db.reporting(lambda conn: exports.write_file(exports.iter_batches(conn, dataset, start, end, historical=historical),
+                                                     path, fmt))
+    response = send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f"{filename}.{fmt}")
+    response.call_on_close(lambda: os.remove(path))
+    return response
+
+@app.route('/admin/archive_attempts', methods=['POST'])
+@login_required('Direction')
+def archive_attempts():
+    """ Queues the move of superseded submission BLOBs to cold storage. """
+    job_id = jobs.enqueue('archive_old_attempts', max_attempts=1, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': 'Archival started.', 'job_id': job_id})
+
+@app.route('/admin/fulltext_backfill', methods=['POST'])
+@login_required('Direction')
+def fulltext_backfill():
+    """ Queues the text extraction of files uploaded before full-text search existed. """
+    job_id = jobs.enqueue('fulltext_backfill', max_attempts=1, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': 'Indexing started.', 'job_id': job_id})
+
+@app.route('/admin/archive_year', methods=['POST'])
+@login_required('Direction')
+def archive_year():
+    """ Queues the move of a closed academic year (e.g. 2023 = 2023-2024) to the history tables. """
+    data = request.json or request.form
+    try:
+        year = int(data.get('year'))
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'year is required (e.g. 2023 for 2023-2024)'}), 400
+    if not archive.is_closed(year):
+        return jsonify({'status': 'error', 'message': f'{year}-{year + 1} is not over yet.'}), 400
+    payload = {'year': year}
+    if data.get('batch_size'):
+        payload['batch_size'] = int(data.get('batch_size'))
+    job_id = jobs.enqueue('archive_academic_year', payload, max_attempts=3, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': f'Archival of {year}-{year + 1} started.', 'job_id': job_id})
+
+@app.route('/api/archive_progress')
+@login_required('Direction')
+def archive_progress():
+    """ Rows moved per academic year and step (ArchivageAnnee). """
+    year = request.args.get('year', type=int)
+    with SchoolDB() as db:
+        return jsonify(db.get_archive_progress(year))
+
+@app.route('/admin/compress_files', methods=['POST'])
+@login_required('Direction')
+def compress_files():
+    """ Queues the compression of the files stored before BLOB compression existed. """
+    job_id = jobs.enqueue('compress_stored_files', max_attempts=1, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': 'Compression started.', 'job_id': job_id})
+
+@app.route('/api/storage_metrics')
+@login_required('Direction')
+def storage_metrics():
+    """ Stored vs original size of the files per table and codec, and this worker's read/write savings. """
+    with SchoolDB() as db:
+        report = db.get_storage_report()
+    return jsonify({'tables': report, 'process': storage.stats()})
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required()
+def job_status(job_id):
+    job = jobs.get_job(job_id)
+    # Only the user who queued it (or Direction) may see a job; others get the same 404 as a missing id
+    if not job or (session['role'] != 'Direction' and job['owner'] != session['user_id']):
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/db_metrics')
+@login_required('Direction')
+def db_metrics():
+    """ Counters of this worker process: contention, replica routing, connection pool and statement reuse. """
+    return jsonify({'contention': isolation.stats, 'replica': replica.stats,
+                    'pool': pool.pool_stats(), 'statements': statements.stats(),
+                    'uploads': admission.stats()})
+
+@app.route('/api/failed_uploads')
+@login_required('Direction')
+def failed_uploads():
+    """ Reports acknowledged (202) but never saved: the spooled file is kept in failed/ with the error. """
+    return jsonify(admission.failed_receipts())
+
+@app.route('/api/compression_metrics')
+@login_required('Direction')
+def compression_metrics():
+    """ Per-route compression ratio and CPU time of this worker process. """
+    return jsonify(compression.stats())
+
+@app.route('/api/cache_metrics')
+@login_required('Direction')
+def cache_metrics():
+    """ Hit rate and render time per template fragment, and search index size/latency, of this worker process. """
+    return jsonify(dict(fragments.stats(), search=search.stats(), fulltext=fulltext.get_index().stats(),
+                        changefeed=changefeed.stats()))
+
+@app.route('/api/changes')
+@login_required('Direction')
+def changes():
+    """
+    Change feed for external caches and aggregates: /api/changes?since=<version>[&tables=users,tps].
+    Continue from the returned version; complete=false means some changes were pruned: reload everything.
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    tables = [t for t in request.args.get('tables', '').split(',') if t]
+    with SchoolDB() as db:
+        page = changefeed.changes_since(db.conn, since, tables, limit)
+    page['changes'] = [{'version': v, 'table': t, 'id': i} for v, t, i in page['changes']]
+    return jsonify(page)
+
 @app.route('/admin/assign_module', methods=['POST'])
 @login_required('Direction')
 def assign_module():
@@ -120,6 +370,22 @@ def delete_user(user_id):
         db.delete_user(user_id)
     return redirect(url_for('admin_dashboard'))
 
+@app.route('/api/admin/users')
+@login_required('Direction')
+def api_users():
+    """ Full user listing (same rows as the admin table) as a streamed JSON array. """
+    with SchoolDB() as db:
+        users = db.get_all_users_extended()
+    return json_stream(users)
+
+@app.route('/admin/search')
+@login_required('Direction')
+def admin_search():
+    """ Autocomplete over users, TPs and announcements (in-memory index, see search.py). """
+    kinds = [k for k in request.args.get('kinds', '').split(',') if k in search.KINDS]
+    limit = min(request.args.get('limit', search.DEFAULT_LIMIT, type=int), 50)
+    return jsonify(search.query(request.args.get('q', ''), kinds or None, limit))
+
 @app.route('/admin/get_user/<int:user_id>')
 @login_required('Direction')
 def get_user(user_id):
@@ -140,16 +406,22 @@ def update_user():
 @app.route('/formateur')
 @login_required('Formateur')
 def formateur_dashboard():
-    with SchoolDB() as db:
-        my_assignments = db.get_teacher_modules(session['user_id'])
-        # Use the NEW mixed history function
-        history = db.get_formateur_history_mixed(session['user_id']) 
-        
-    return render_template('formateur.html', assignments=my_assignments, history=history)
+    my_assignments = lazy_db(SchoolDB.get_teacher_modules, session['user_id'])
+    # First page of the mixed history only; the rest is lazy-loaded via /api/feed/formateur
+    feed = lazy_db(SchoolDB.get_formateur_feed, session['user_id'])
+
+    return render_template('formateur.html', assignments=my_assignments,
+                           history=feed.then(lambda f: f['items']),
+                           next_cursor=feed.then(lambda f: f['next_cursor']))
 
 @app.route('/publish_tp', methods=['POST'])
 @login_required('Formateur')
 def publish_tp():
+    # Parsing the upload waits for an admission slot (admission.py)
+    with admission.slot(request.endpoint, session['user_id']):
+        return _publish_tp()
+
+def _publish_tp():
     # 1. basic validation
     if 'file' not in request.files:
         return jsonify({'status': 'error', 'message': 'No file part in request'})
@@ -191,6 +463,7 @@ def publish_tp():
             )
 
         if success:
+            jobs.enqueue('file_metadata', {'kind': 'tp', 'id': success})
             return jsonify({'status': 'success', 'message': 'TP successfully published to Database!'})
         else:
             return jsonify({'status': 'error', 'message': 'Database Insertion Failed'})
@@ -204,75 +477,271 @@ def publish_tp():
 @login_required('Etudiant')
 def student_dashboard():
     with SchoolDB() as db:
-        # Retrieve the student's group ID properly
-        user_details = db.get_user_details(session['user_id'])
-        group_id = user_details.get('groupe_id') if user_details else None
+        # Group resolved at login and kept in the profile cache (refreshed on update_user)
+        profile = db.get_user_profile(session['user_id'])
+        group_id = profile.get('groupe_id') if profile else None
         
-        tps = []
+        feed = {"items": [], "next_cursor": None, "top_cursor": None}
         if group_id:
-            tps = db.get_tps_for_student(group_id)
+            # First page only; older TPs are lazy-loaded via /api/feed/student
+            feed = db.get_student_feed(group_id)
             
-    return render_template('student.html', tps=tps)
+    return render_template('student.html', tps=feed['items'], next_cursor=feed['next_cursor'],
+                           top_cursor=feed['top_cursor'])
+
+# --- TIMELINE FEEDS (cursor pagination) ---
+def _feed_args():
+    """ Reads before/after/limit query params; limit is capped to keep pages cheap. """
+    try:
+        limit = int(request.args.get('limit', 0)) or None
+    except ValueError:
+        limit = None
+    if limit: limit = max(1, min(limit, 100))
+    return request.args.get('before'), request.args.get('after'), limit
+
+@app.route('/api/feed/student')
+@login_required('Etudiant')
+def student_feed():
+    before, after, limit = _feed_args()
+    with SchoolDB() as db:
+        profile = db.get_user_profile(session['user_id'])
+        group_id = profile.get('groupe_id') if profile else None
+        if not group_id:
+            return jsonify({"items": [], "next_cursor": None, "top_cursor": None})
+        feed = db.get_student_feed(group_id, before=before, after=after, limit=limit)
+    return jsonify(feed)
+
+# --- LIVE NOTIFICATIONS (Server-Sent Events) ---
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.route('/api/events/stream')
+@login_required('Etudiant')
+def event_stream():
+    """
+    One long-lived SSE connection per open student dashboard, subscribed to the
+    student's group channel. Clients only hit the feed API when notified.
+    """
+    with SchoolDB() as db:
+        profile = db.get_user_profile(session['user_id'])
+    group_id = profile.get('groupe_id') if profile else None
+    if not group_id:
+        return "No group", 404
+
+    channel = group_channel(group_id)
+
+    def stream():
+        q = broker.subscribe(channel)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = q.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(channel, q)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/feed/formateur')
+@login_required('Formateur')
+def formateur_feed():
+    before, after, limit = _feed_args()
+    with SchoolDB() as db:
+        feed = db.get_formateur_feed(session['user_id'], before=before, after=after, limit=limit)
+    return jsonify(feed)
 
 @app.route('/submit_rapport', methods=['POST'])
 @login_required('Etudiant')
 def submit_rapport():
-    if 'file' not in request.files:
-        return jsonify({'status': 'error', 'message': 'No file uploaded'})
-    
-    file = request.files['file']
-    tp_id = request.form.get('tp_id')
-    
-    if file.filename == '' or not tp_id:
-        return jsonify({'status': 'error', 'message': 'Missing file or TP ID'})
-
+    """
+    Deadline bursts: the upload waits for an admission slot, is spooled to disk with a
+    receipt and acknowledged (202); a background job writes it to the database later.
+    DateSoumission is the arrival time, so waiting here never makes a report late.
+    """
+    received_at = datetime.now()
     etudiant_id = session['user_id']
 
+    with admission.slot(request.endpoint, etudiant_id):
+        if 'file' not in request.files:
+            return jsonify({'status': 'error', 'message': 'No file uploaded'})
+
+        file = request.files['file']
+        tp_id = request.form.get('tp_id')
+
+        if file.filename == '' or not tp_id:
+            return jsonify({'status': 'error', 'message': 'Missing file or TP ID'})
+
+        try:
+            receipt = admission.spool_upload(file, {'tp_id': int(tp_id), 'etudiant_id': etudiant_id}, received_at)
+        except Exception as e:
+            print(f"❌ Spooling upload failed: {e}")
+            return jsonify({'status': 'error', 'message': 'Upload could not be saved, please retry.'}), 500
+
+    return _report_received(receipt)
+
+def _report_received(receipt):
+    """ 202 for a spooled report: queues its ingest and returns the receipt. """
+    job_id = jobs.enqueue('ingest_submission', {'receipt': receipt['id']}, max_attempts=10, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': 'Rapport received! It will appear in your submissions shortly.',
+                    'receipt': {'id': receipt['id'], 'received_at': receipt['received_at'],
+                                'sha256': receipt['sha256'], 'size': receipt['size']},
+                    'job_id': job_id}), 202
+
+# --- RESUMABLE UPLOADS (uploads.py) ---
+# kind -> role allowed to use it
+UPLOAD_ROLES = {'tp': 'Formateur', 'report': 'Etudiant'}
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required()
+def upload_create():
+    """ Opens a resumable upload: {kind, size, filename, filetype, sha256?, + tp_id or the TP fields}. """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('kind')
+    if UPLOAD_ROLES.get(kind) != session['role']:
+        return jsonify({'status': 'error', 'message': 'Upload kind not allowed for your role'}), 403
+
+    if kind == 'report':
+        try:
+            meta = {'tp_id': int(data['tp_id'])}
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Missing or invalid TP ID'}), 400
+    else:
+        meta = {k: data.get(k) for k in ('titre', 'description', 'deadline', 'module_id', 'groupe_id')}
+        if not meta['module_id'] or not meta['groupe_id']:
+            return jsonify({'status': 'error', 'message': 'Please select a class/module first.'}), 400
+
     try:
-        file_bytes = file.read()
-        
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        size = None
+    manifest = uploads.create(session['user_id'], kind, size, data.get('filename'), data.get('filetype'),
+                              data.get('sha256'), meta)
+    return jsonify(dict(uploads.status(manifest), status='success')), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required()
+def upload_status(upload_id):
+    """ Bytes received so far: where a resumed upload continues. """
+    return jsonify(dict(uploads.status(uploads.load(upload_id, session['user_id'])), status='success'))
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+@login_required()
+def upload_chunk(upload_id):
+    """ One chunk: raw body at ?offset=N, with its SHA-256 in X-Chunk-SHA256. """
+    manifest = uploads.load(upload_id, session['user_id'])
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'status': 'error', 'message': 'offset is required'}), 400
+    with admission.slot(request.endpoint, session['user_id']):
+        manifest = uploads.put_chunk(manifest, offset, request.stream, request.content_length,
+                                     request.headers.get('X-Chunk-SHA256'))
+    return jsonify(dict(uploads.status(manifest), status='success'))
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required()
+def upload_finalize(upload_id):
+    """ Complete upload -> published TP (200) or spooled report (202), like the single-request routes. """
+    uploads.load(upload_id, session['user_id'])  # 404 before queueing for a slot
+    with admission.slot(request.endpoint, session['user_id']), uploads.locked(upload_id, session['user_id']) as manifest:
+        path = uploads.assembled(manifest)
+        meta = manifest['meta']
+
+        if manifest['kind'] == 'report':
+            # Dated by the last chunk: a slow or resumed connection does not make the report late
+            received_at = datetime.fromtimestamp(manifest.get('touched_at', manifest['created_at']))
+            receipt = admission.spool_file(path, {
+                'tp_id': meta['tp_id'], 'etudiant_id': session['user_id'], 'filename': manifest['filename'],
+                'filetype': manifest['filetype'], 'size': manifest['size'], 'sha256': manifest['computed_sha256'],
+            }, received_at)
+            uploads.discard(upload_id)
+            return _report_received(receipt)
+
         with SchoolDB() as db:
-            success = db.submit_rapport_file(
-                tp_id=tp_id,
-                etudiant_id=etudiant_id,
-                file_bytes=file_bytes,
-                filename=file.filename,
-                filetype=file.mimetype
+            tp_id = db.create_tp_with_blob(
+                titre=meta['titre'],
+                description=meta['description'],
+                file_bytes=admission.SpooledFile(path),
+                filename=manifest['filename'],
+                filetype=manifest['filetype'],
+                deadline=meta['deadline'],
+                module_id=meta['module_id'],
+                formateur_id=session['user_id'],
+                groupe_id=meta['groupe_id']
             )
+        if not tp_id:
+            return jsonify({'status': 'error', 'message': 'Database Insertion Failed'})
+        uploads.discard(upload_id)
+        jobs.enqueue('file_metadata', {'kind': 'tp', 'id': tp_id})
+        return jsonify({'status': 'success', 'message': 'TP successfully published to Database!'})
 
-        if success:
-            return jsonify({'status': 'success', 'message': 'Rapport submitted successfully!'})
-        else:
-            return jsonify({'status': 'error', 'message': 'Database error'})
-            
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
+# --- SHARED: DOCUMENT SEARCH ---
+@app.route('/api/search/documents')
+@login_required()
+def search_documents():
+    """ Full-text search inside TP subjects and reports, limited to what the user may open. """
+    q = request.args.get('q', '').strip()
+    if len(q) < 2:
+        return jsonify([])
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+    with SchoolDB() as db:
+        groupe_id = None
+        if session['role'] == 'Etudiant':
+            profile = db.get_user_profile(session['user_id'])
+            groupe_id = profile.get('groupe_id') if profile else None
+        results = fulltext.search(db, q, session['role'], session['user_id'], groupe_id, limit)
+    return jsonify(results)
 
 # --- SHARED: VIEW PDF ---
 @app.route('/view_subject/<int:tp_id>')
 def view_subject(tp_id):
     with SchoolDB() as db:
-        file_info = db.get_tp_file_content(tp_id)
+        file_info = db.get_tp_file_content(tp_id, decoded=False)
 
     if file_info and file_info['data']:
         # 1. Determine Mime Type (Database vs Guess)
         # If DB has generic 'application/octet-stream', try to guess from filename
         content_type = file_info['type']
         if not content_type or 'octet-stream' in content_type:
+            import mimetypes
             content_type, _ = mimetypes.guess_type(file_info['name'])
         
         # Fallback if guess fails
         if not content_type:
             content_type = 'application/pdf' if file_info['name'].endswith('.pdf') else 'text/plain'
 
-        return send_file(
-            io.BytesIO(file_info['data']),
-            mimetype=content_type,
-            as_attachment=False, # False = Show in Browser (Inline)
-            download_name=file_info['name']
-        )
+        return stored_file_response(file_info, content_type, as_attachment=False) # Show in Browser (Inline)
     return "File not found", 404
 
+
+def stored_file_response(file_info, mimetype, as_attachment):
+    """
+    Response for a file as stored (get_*_file(..., decoded=False)). A compressed one is sent
+    as stored when the client accepts its codec as Content-Encoding, else decompressed as streamed.
+    """
+    if not file_info['codec']:
+        return compression.allow_compression(send_file(
+            io.BytesIO(file_info['data']), mimetype=mimetype,
+            as_attachment=as_attachment, download_name=file_info['name']
+        ))
+    disposition = 'attachment' if as_attachment else 'inline'
+    headers = {'Content-Disposition': f"{disposition}; filename*=UTF-8''{quote(file_info['name'] or 'file')}"}
+    coding = storage.accepted_coding(file_info['codec'], request.headers.get('Accept-Encoding'))
+    if coding:
+        storage.count_sent_encoded(len(file_info['data']), file_info['size'])
+        response = Response(bytes(file_info['data']), mimetype=mimetype, headers=headers)
+        response.headers['Content-Encoding'] = coding
+        response.vary.add('Accept-Encoding')
+        return response
+    response = Response(storage.iter_decoded(file_info['data'], file_info['codec']), mimetype=mimetype, headers=headers)
+    if file_info['size']:
+        response.headers['Content-Length'] = str(file_info['size'])
+    return response
+
 # ... Add these routes to app.py ...
 
 @app.route('/admin/get_assignments/<int:formateur_id>')
@@ -324,6 +793,7 @@ def save_presence():
         success = db.save_bulk_presence(seance_id, presence_list)
         
     if success:
+        jobs.enqueue('refresh_attendance_cube', {'seance_ids': [seance_id]})
         return jsonify({'status': 'success', 'message': 'Attendance saved!'})
     else:
         return jsonify({'status': 'error', 'message': 'Database error.'})
@@ -372,7 +842,73 @@ def get_analytics_data():
         kpis = db.get_global_kpis(target_id) # This is now crash-proof
         absences = db.get_absent_report(target_id) # New Data
         
-    return jsonify({'stats': stats, 'kpis': kpis, 'absences': absences})
+    return json_stream({'stats': stats, 'kpis': kpis, 'absences': absences})
+
+
+@app.route('/api/analytics_insights', methods=['POST'])
+@login_required()
+def get_analytics_insights():
+    """
+    At-risk students (absence rule, low rate, ongoing absence streak) and weekly
+    per-module trends, computed column-wise by the analytics module.
+    """
+    role = session['role']
+    if role == 'Etudiant':
+        return jsonify({'status': 'error', 'message': 'Access Denied'}), 403
+
+    target_id = None
+    if role == 'Formateur':
+        target_id = session['user_id']
+    else:
+        req_id = (request.json or {}).get('formateur_id')
+        if req_id and str(req_id) != 'all':
+            target_id = req_id
+    historical = bool((request.json or {}).get('historical'))  # include archived academic years
+
+    import analytics  # NumPy is only loaded by the workers that serve analytics
+    with SchoolDB() as db:
+        cols = db.reporting(analytics.load_presence_columns, target_id, historical=historical)
+        risky = analytics.at_risk(cols)
+        trends = analytics.module_trends(cols, unit='W')
+        students = db.get_students_brief({r['student_id'] for r in risky})
+        modules = {m['id']: m['name'] for m in db.get_all_modules()}
+
+    for r in risky:
+        r.update(students.get(r['student_id'], {}))
+        r['module'] = modules.get(r['module_id'])
+    trend_rows = [{"module": modules.get(m), "week": week, "rate": rate} for m, week, rate in trends]
+    return jsonify({'at_risk': risky, 'trends': trend_rows})
+
+
+@app.route('/api/analytics/cube', methods=['POST'])
+@login_required()
+def attendance_cube():
+    """
+    Drill-down / roll-up over the attendance cube.
+    Body: {"dims": ["filiere", "groupe", ...], "grain": "week", "filters": {"filiere": 1, "date_from": "2024-09-01"}}
+    Teachers are always restricted to their own sessions.
+    """
+    role = session['role']
+    if role == 'Etudiant':
+        return jsonify({'status': 'error', 'message': 'Access Denied'}), 403
+
+    body = request.json or {}
+    dims = [d for d in body.get('dims', []) if d in SchoolDB.CUBE_DIMENSIONS]
+    grain = body.get('grain') if body.get('grain') in SchoolDB.CUBE_GRAINS else None
+    filters = {k: v for k, v in (body.get('filters') or {}).items()
+               if k in SchoolDB.CUBE_DIMENSIONS or k in ('date_from', 'date_to')}
+    if role == 'Formateur':
+        filters['formateur'] = session['user_id']
+
+    with SchoolDB() as db:
+        rows = db.query_attendance_cube(dims, grain, filters)
+    return jsonify({'dims': dims, 'grain': grain, 'rows': rows})
+
+@app.route('/admin/rebuild_cube', methods=['POST'])
+@login_required('Direction')
+def rebuild_cube():
+    job_id = jobs.enqueue('refresh_attendance_cube', {}, owner=session['user_id'])
+    return jsonify({'status': 'success', 'message': 'Cube rebuild queued.', 'job_id': job_id})
 
 
 # ... inside app.py ...
@@ -399,11 +935,45 @@ def publish_annonce():
         success = db.create_annonce(title, content, image_bytes, formateur_id, groupe_id, module_id)
         
     if success:
+        if image_bytes:
+            jobs.enqueue('annonce_variants', {'annonce_id': success})
         return jsonify({'status': 'success', 'message': 'Announcement posted!'})
     else:
         return jsonify({'status': 'error', 'message': 'Database error'})
 
 
+@app.route('/annonce_image/<int:annonce_id>/<variant>')
+@login_required()
+def annonce_image(annonce_id, variant):
+    """
+    Serves a resized announcement image. Variants never change once generated,
+    so browsers revalidate with If-None-Match and get a 304 without the BLOB being read.
+    """
+    if variant not in ('thumb', 'display'):
+        return "Unknown variant", 404
+
+    with SchoolDB() as db:
+        groupe_id = None
+        if session['role'] == 'Etudiant':
+            profile = db.get_user_profile(session['user_id'])
+            groupe_id = profile.get('groupe_id') if profile else None
+        # Not found rather than forbidden: other groups' announcements are not listed either
+        if not db.can_view_annonce(annonce_id, session['role'], session['user_id'], groupe_id):
+            return "Image not found", 404
+        meta = db.get_annonce_image(annonce_id, variant, with_data=False)
+        if not meta:
+            return "Image not found", 404
+        if request.if_none_match.contains(meta['etag']):
+            return Response(status=304, headers={'ETag': f'"{meta["etag"]}"', 'Cache-Control': 'private, max-age=86400'})
+        image = db.get_annonce_image(annonce_id, variant)
+
+    content_type = image['type'] or 'application/octet-stream'
+    response = send_file(io.BytesIO(image['data']), mimetype=content_type, etag=image['etag'],
+                         max_age=86400, conditional=True)
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
 # --- GRADING ROUTES (NEW) ---
 
 @app.route('/api/submissions/<int:tp_id>')
@@ -420,7 +990,8 @@ def grade_submission():
     try:
         # Validate grade is number 0-20
         grade = float(data['grade'])
-        if grade < 0 or grade > 20:
+        # float() accepts "nan" / "inf", which compare False against both bounds
+        if not math.isfinite(grade) or grade < 0 or grade > 20:
             return jsonify({'status': 'error', 'message': 'Grade must be 0-20'})
             
         with SchoolDB() as db:
@@ -429,22 +1000,103 @@ def grade_submission():
     except ValueError:
         return jsonify({'status': 'error', 'message': 'Invalid number'})
 
+@app.route('/api/grade_submissions', methods=['POST'])
+@login_required('Formateur')
+def grade_submissions():
+    """
+    Batch grading: {"grades": [{"submission_id": 1, "grade": 14.5}, ...]}.
+    Every row is validated first; valid rows are saved in one transaction.
+    Returns per-row results in request order: ok / invalid / duplicate / not_found.
+    """
+    items = (request.json or {}).get('grades') or []
+    results = [None] * len(items)  # in request order
+    latest = {}  # submission_id -> index of its last valid row (the one that is saved)
+
+    for i, item in enumerate(items):
+        sub_id = item.get('submission_id') if isinstance(item, dict) else None
+        try:
+            sub_id = int(sub_id)
+            grade = float(item.get('grade'))
+        except (TypeError, ValueError, AttributeError):
+            results[i] = {'submission_id': sub_id, 'status': 'invalid', 'message': 'Invalid number'}
+            continue
+        if not math.isfinite(grade) or grade < 0 or grade > 20:
+            results[i] = {'submission_id': sub_id, 'status': 'invalid', 'message': 'Grade must be 0-20'}
+            continue
+        if sub_id in latest:
+            # Same submission twice in one batch: the last grade wins
+            results[latest[sub_id]] = {'submission_id': sub_id, 'status': 'duplicate',
+                                       'message': 'Replaced by a later grade for this submission'}
+        latest[sub_id] = i
+        results[i] = {'submission_id': sub_id, 'grade': grade}
+
+    valid = [(sub_id, results[i]['grade']) for sub_id, i in latest.items()]
+    if not valid:
+        return jsonify({'status': 'error', 'message': 'No valid grades to save', 'results': results})
+
+    with SchoolDB() as db:
+        updated = db.save_grades_bulk(valid)
+
+    if updated is None:
+        for i in latest.values():
+            results[i].update(status='error', message='Database error')
+        return jsonify({'status': 'error', 'message': 'Database error', 'results': results})
+
+    for sub_id, i in latest.items():
+        if sub_id in updated:
+            results[i]['status'] = 'ok'
+        else:
+            results[i].update(status='not_found', message='Submission not found')
+
+    saved = sum(1 for r in results if r['status'] == 'ok')
+    return jsonify({'status': 'success', 'message': f'{saved} grade(s) saved.', 'results': results})
+
 @app.route('/download_report/<int:submission_id>')
 @login_required('Formateur')
 def download_report(submission_id):
     with SchoolDB() as db:
-        file_info = db.get_submission_file(submission_id)
+        file_info = db.get_submission_file(submission_id, decoded=False)
         
     if file_info and file_info['data']:
-        return send_file(
-            io.BytesIO(file_info['data']),
-            mimetype=file_info['type'] or 'application/pdf',
-            as_attachment=True, # Force download for reports
-            download_name=file_info['name']
-        )
+        # Force download for reports
+        return stored_file_response(file_info, file_info['type'] or 'application/pdf', as_attachment=True)
     return "File not found", 404
 
 
+@app.route('/download_submissions_zip/<int:tp_id>')
+@login_required('Formateur')
+def download_submissions_zip(tp_id):
+    """
+    Streams every report of a TP as one ZIP, built on the fly.
+    Files are named <Nom>_<Prenom>_<CNE>/<file>; the archive is never buffered.
+    """
+    with SchoolDB() as db:
+        manifest = db.get_submission_manifest(tp_id)
+    if not manifest:
+        return "No submissions for this TP", 404
+
+    def entries(db):
+        used = set()
+        for sub in manifest:
+            folder = safe_name(f"{sub['nom']}_{sub['prenom']}_{sub['cne']}")
+            name = f"{folder}/{safe_name(sub['file_name'])}"
+            # Two students with the same name and CNE folder: keep both, numbered
+            n = 2
+            base, dot, ext = name.rpartition('.')
+            while name in used:
+                name = f"{base}_{n}.{ext}" if dot else f"{ext}_{n}"
+                n += 1
+            used.add(name)
+            yield name, db.iter_submission_file(sub['id'], sub['size'], sub['codec'])
+
+    def generate():
+        with SchoolDB() as db:
+            yield from stream_zip(entries(db))
+
+    return Response(generate(), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename="TP_{tp_id}_submissions.zip"'})
+
+
 # --- IDM-PROOF FILE VIEWER (MASKING STRATEGY) ---
 @app.route('/view_subject_secure/<int:tp_id>', methods=['POST']) 
 @login_required()
@@ -479,6 +1131,7 @@ def get_file_base64(tp_id):
     if file_info and file_info['data']:
         # 1. Encode binary data to Base64 String
         # This makes the file look like a long text string to IDM
+        import base64
         b64_data = base64.b64encode(file_info['data']).decode('utf-8')
         
         return jsonify({
@@ -501,6 +1154,7 @@ def get_submission_base64(submission_id):
 
     if file_info and file_info['data']:
         # Encode to Base64 to bypass IDM
+        import base64
         b64_data = base64.b64encode(file_info['data']).decode('utf-8')
         
         return jsonify({
@@ -513,4 +1167,8 @@ def get_submission_base64(submission_id):
     return jsonify({'status': 'error', 'message': 'File not found'}), 404
 
 if __name__ == '__main__':
+    if '--check' in sys.argv:
+        # Validate drivers / DB / migrations and exit without serving traffic
+        from startup_check import run_checks
+        sys.exit(run_checks())
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,39 @@
+from datetime import date
+
+# Academic-year archival (migration 048).
+#
+# A closed year (keyed by its first calendar year: 2023 = Sept 2023 -> Sept 2024)
+# is moved by the 'archive_academic_year' job from Presence / Seance / Soumission /
+# TP into the *Hist tables, children before parents, a batch per transaction.
+# Afterwards the operational tables only hold the open year(s), so the dashboard,
+# listing and analytics queries stay the size of one year.
+#
+# Reports that need older years opt in with historical=True: their SQL names the
+# tables through tables(), which then points at the v_*Toutes union views.
+
+# Placeholder -> operational table / union view over operational + archived rows
+_HOT = {"Presence": "Presence", "Seance": "Seance", "TP": "TP", "Soumission": "Soumission"}
+_ALL = {"Presence": "v_PresenceToutes", "Seance": "v_SeanceToutes", "TP": "v_TPToutes", "Soumission": "v_SoumissionToutes"}
+
+# Move order: a child table before the table its rows reference
+STEPS = ("presence", "seance", "soumission", "tp")
+
+
+def tables(historical=False):
+    """ Mapping for str.format() of report SQL written with {Presence}, {Seance}, {TP}, {Soumission}. """
+    return _ALL if historical else _HOT
+
+
+def year_of(day):
+    """ Academic year key of a date. """
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def year_bounds(year):
+    """ [Sept 1st, next Sept 1st) of academic year `year`. """
+    return date(year, 9, 1), date(year + 1, 9, 1)
+
+
+def is_closed(year, today=None):
+    """ Only years that ended can be archived. """
+    return year < year_of(today or date.today())
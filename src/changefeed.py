@@ -0,0 +1,150 @@
+import time
+import threading
+
+try:
+    import versions
+    from settings import get_settings
+except ImportError:  # imported as src.changefeed by the root-level scripts
+    from src import versions
+    from src.settings import get_settings
+
+# Change-data feed over the ChangeLog table (migration 049).
+#
+# Writers call record() inside their transaction: one row per changed row (or one
+# per table when the rows are not known), so a change and its log row commit or roll
+# back together. Every process then applies the log to versions.py with sync():
+# right after its own writes (SchoolDB._commit) and every CHANGE_POLL_INTERVAL
+# seconds for the writes of other workers and scripts. Table versions are therefore
+# the ChangeLog versions, the same in every worker.
+#
+# Consumers outside the process ask for changes_since(version): a range seek on the
+# clustered key, O(changes). Rows older than CHANGE_LOG_RETENTION_DAYS are pruned;
+# a consumer further behind than that gets complete=False and reloads everything.
+
+_position = [None]  # last ChangeLog version applied by this process
+_sync_lock = threading.Lock()
+_stats = {"syncs": 0, "applied": 0, "errors": 0, "pruned": 0}
+
+# Versions below MIN_ACTIVE_ROWVERSION() are committed or rolled back: no older change can show up later
+_SINCE_SQL = """
+SELECT TOP (?) CAST(Version AS BIGINT) AS Version, Tableau, LigneID
+FROM ChangeLog
+WHERE Version > CONVERT(BINARY(8), CAST(? AS BIGINT)) AND Version < MIN_ACTIVE_ROWVERSION()
+{tables}
+ORDER BY Version
+"""
+
+
+def record(cursor, changes):
+    """ changes: {table: ids or None}. Call before the commit of the write it describes. """
+    for table, ids in changes.items():
+        if ids is None:
+            cursor.execute("INSERT INTO ChangeLog (Tableau) VALUES (?)", (table,))
+        else:
+            rows = [(table, int(i)) for i in ids]
+            if rows:
+                cursor.executemany("INSERT INTO ChangeLog (Tableau, LigneID) VALUES (?, ?)", rows)
+
+
+def changes_since(conn, version, tables=None, limit=1000):
+    """
+    Committed changes after `version`, oldest first:
+    {"changes": [(version, table, id or None), ...], "version": where to continue from,
+     "more": True if limit was reached, "complete": False if some changes were already pruned}.
+    """
+    params = [limit, int(version)]
+    where = ""
+    if tables:
+        where = f"AND Tableau IN ({', '.join('?' * len(tables))})"
+        params += list(tables)
+    cursor = conn.cursor()
+    cursor.execute(_SINCE_SQL.format(tables=where), params)
+    changes = [(r.Version, r.Tableau, r.LigneID) for r in cursor.fetchall()]
+
+    cursor.execute("SELECT CAST(MIN(Version) AS BIGINT) FROM ChangeLog")
+    oldest = cursor.fetchone()[0]
+    return {
+        "changes": changes,
+        "version": changes[-1][0] if changes else int(version),
+        "more": len(changes) == limit,
+        "complete": oldest is None or int(version) >= oldest - 1,
+    }
+
+
+def table_versions(conn):
+    """ {table: latest version} (one index seek per table). """
+    cursor = conn.cursor()
+    cursor.execute("""SELECT Tableau, CAST(MAX(Version) AS BIGINT) FROM ChangeLog
+                      WHERE Version < MIN_ACTIVE_ROWVERSION() GROUP BY Tableau""")
+    return {table: version for table, version in cursor.fetchall()}
+
+
+def sync(conn, batch_size=5000):
+    """ Applies the changes this process has not seen yet to versions.py. Returns how many. """
+    with _sync_lock:
+        _stats["syncs"] += 1
+        if _position[0] is None:
+            # First sync: take the current versions, nothing to replay (caches are empty)
+            current = table_versions(conn)
+            versions.seed(current)
+            _position[0] = max(current.values(), default=0)
+            return 0
+
+        applied = 0
+        while True:
+            page = changes_since(conn, _position[0], limit=batch_size)
+            if page["changes"]:
+                versions.apply(page["changes"])
+                applied += len(page["changes"])
+            _position[0] = page["version"]
+            if not page["more"]: break
+        _stats["applied"] += applied
+        return applied
+
+
+def prune(conn, keep_days, batch_size=5000):
+    """ Deletes the log rows older than keep_days, a batch per transaction. Returns how many. """
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute("DELETE TOP (?) FROM ChangeLog WHERE DateChange < DATEADD(DAY, ?, GETDATE())", (batch_size, -keep_days))
+        n = cursor.rowcount
+        conn.commit()
+        deleted += n
+        if n < batch_size: break
+    _stats["pruned"] += deleted
+    return deleted
+
+
+def start(open_db):
+    """
+    Polls the log every CHANGE_POLL_INTERVAL seconds (writes of other workers and
+    scripts) and prunes it hourly. open_db: a SchoolDB-like context manager factory.
+    """
+    settings = get_settings()
+    try:
+        # Seed the versions now, so the first write of this process is already a change
+        with open_db() as db:
+            sync(db.conn)
+    except Exception as e:
+        print(f"⚠️ Change feed unavailable, caches rely on their TTL: {e}")
+
+    def run():
+        last_prune = 0.0
+        while True:
+            try:
+                with open_db() as db:
+                    sync(db.conn)
+                    if time.time() - last_prune > 3600:
+                        last_prune = time.time()
+                        prune(db.conn, settings.change_log_retention_days)
+            except Exception as e:
+                _stats["errors"] += 1
+                print(f"⚠️ Change feed poll failed: {e}")
+            time.sleep(settings.change_poll_interval)
+
+    threading.Thread(target=run, name="changefeed", daemon=True).start()
+
+
+def stats():
+    return dict(_stats, position=_position[0])
@@ -0,0 +1,204 @@
+import time
+import zlib
+import functools
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+from settings import get_settings
+from storage import coding_quality
+
+# Response compression for the Flask app (registered with init_app).
+#
+# - Negotiates br (if the optional `brotli` package is installed) or gzip from Accept-Encoding,
+#   with its q-values (storage.coding_quality, as for the stored BLOBs): the highest wins, br on a tie.
+# - Only text-like content types above a size threshold; PDFs, images, ZIPs and
+#   anything already encoded are left alone, as are send_file passthrough bodies.
+# - Buffered bodies get an ETag; the compressed form is kept in an LRU keyed by
+#   (ETag, encoding) so an unchanged page is compressed once, and a matching
+#   If-None-Match gets a 304.
+# - Streamed bodies (CSV exports, large JSON listings) are gzipped chunk by chunk.
+# - Per-endpoint counters: bytes in/out and CPU time spent compressing.
+
+COMPRESSIBLE_TYPES = (
+    "text/html", "text/css", "text/plain", "text/csv", "text/xml",
+    "application/json", "application/javascript", "application/xml", "image/svg+xml",
+)
+# Never worth a second pass (or would break streaming semantics)
+SKIP_TYPES = ("text/event-stream",)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_cache = OrderedDict()
+_cache_bytes = [0]
+_cache_lock = threading.Lock()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)  # a failed import is not cached by Python itself
+def _brotli():
+    try:
+        import brotli
+    except ImportError:  # optional: gzip only
+        return None
+    return brotli
+
+
+def is_compressible(mimetype):
+    mimetype = (mimetype or "").split(";")[0].strip().lower()
+    return mimetype in COMPRESSIBLE_TYPES and mimetype not in SKIP_TYPES
+
+
+def allow_compression(response):
+    """
+    Lets a send_file() response of a text-like type go through the middleware:
+    its in-memory body is buffered instead of passed straight to the server.
+    """
+    if is_compressible(response.mimetype):
+        response.direct_passthrough = False
+    return response
+
+
+def _choose_encoding(streamed=False):
+    accepted = request.headers.get("Accept-Encoding")
+    # Streamed bodies are always gzip (zlib compresses incrementally); brotli is for buffered ones
+    offered = ("gzip",) if streamed or _brotli() is None else ("br", "gzip")
+    best, best_q = None, 0
+    for encoding in offered:
+        q = coding_quality(encoding, accepted)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return _brotli().compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _record(endpoint, bytes_in, bytes_out, cpu_seconds, cached=False):
+    with _stats_lock:
+        s = _stats.setdefault(endpoint or "-", {"responses": 0, "cache_hits": 0, "bytes_in": 0,
+                                                "bytes_out": 0, "cpu_ms": 0.0})
+        s["responses"] += 1
+        s["cache_hits"] += int(cached)
+        s["bytes_in"] += bytes_in
+        s["bytes_out"] += bytes_out
+        s["cpu_ms"] += cpu_seconds * 1000
+
+
+def _cache_get(key):
+    with _cache_lock:
+        body = _cache.get(key)
+        if body is not None:
+            _cache.move_to_end(key)
+        return body
+
+
+def _cache_put(key, body):
+    settings = get_settings()
+    if len(body) > settings.compress_cache_bytes // 4:
+        return  # one huge body would evict everything else
+    with _cache_lock:
+        old = _cache.pop(key, None)
+        if old is not None:
+            _cache_bytes[0] -= len(old)
+        _cache[key] = body
+        _cache_bytes[0] += len(body)
+        while len(_cache) > settings.compress_cache_entries or _cache_bytes[0] > settings.compress_cache_bytes:
+            _, evicted = _cache.popitem(last=False)
+            _cache_bytes[0] -= len(evicted)
+
+
+def _gzip_stream(chunks, endpoint):
+    """ gzip container around a streamed body; each chunk is compressed as it is produced. """
+    comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip header/trailer
+    bytes_in = bytes_out = 0
+    cpu = 0.0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            started = time.thread_time()
+            out = comp.compress(chunk)
+            cpu += time.thread_time() - started
+            bytes_in += len(chunk)
+            if out:
+                bytes_out += len(out)
+                yield out
+        tail = comp.flush()
+        bytes_out += len(tail)
+        yield tail
+    finally:
+        _record(endpoint, bytes_in, bytes_out, cpu)
+
+
+def compress_response(response):
+    """ after_request hook. """
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or not is_compressible(response.mimetype)
+            or request.method == "HEAD"):
+        return response
+
+    encoding = _choose_encoding(streamed=response.is_streamed)
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+
+    endpoint = request.endpoint
+    if response.is_streamed:
+        response.response = _gzip_stream(response.response, endpoint)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers.pop("Content-Length", None)
+        return response
+
+    data = response.get_data()
+    if len(data) < get_settings().compress_min_size:
+        return response
+
+    if not response.get_etag()[0]:
+        response.add_etag()
+    etag, weak = response.get_etag()
+    # A compressed representation needs its own validator
+    encoded_etag = f"{etag}-{encoding}"
+    key = (encoded_etag, weak)
+
+    started = time.thread_time()
+    body = _cache_get(key)
+    cached = body is not None
+    if not cached:
+        body = _compress(data, encoding)
+        _cache_put(key, body)
+    cpu = time.thread_time() - started
+
+    if len(body) >= len(data):
+        return response
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.set_etag(encoded_etag, weak=weak)
+    _record(endpoint, len(data), len(body), cpu, cached)
+    return response.make_conditional(request)
+
+
+def stats():
+    """ Per-endpoint compression ratio, CPU time and cache hits of this process. """
+    with _stats_lock:
+        report = {}
+        for endpoint, s in _stats.items():
+            report[endpoint] = dict(s, cpu_ms=round(s["cpu_ms"], 1),
+                                    ratio=round(s["bytes_out"] / s["bytes_in"], 3) if s["bytes_in"] else None)
+    with _cache_lock:
+        entries, size = len(_cache), _cache_bytes[0]
+    return {"cache_entries": entries, "cache_bytes": size, "brotli": _brotli() is not None, "endpoints": report}
+
+
+def init_app(app):
+    app.after_request(compress_response)
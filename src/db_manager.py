@@ -1,24 +1,125 @@
-import pyodbc
-import os
-from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
 import random
+import threading
+import time
+import base64
+from collections import OrderedDict
+from datetime import datetime
+
+try:
+    from events import broker, group_channel
+    import replica
+    from replica import reads_from_replica
+    from isolation import read_isolation, write_transaction, raise_if_retryable
+    import pool
+    import statements
+    from settings import get_settings
+    from rows import record, map_rows
+    import versions
+    import changefeed
+    import archive
+    import storage
+except ImportError:  # imported as src.db_manager by the root-level scripts
+    from src.events import broker, group_channel
+    from src import replica
+    from src.replica import reads_from_replica
+    from src.isolation import read_isolation, write_transaction, raise_if_retryable
+    from src import pool
+    from src import statements
+    from src.settings import get_settings
+    from src.rows import record, map_rows
+    from src import versions
+    from src import changefeed
+    from src import archive
+    from src import storage
+
+
+def _pyodbc():
+    """ pyodbc (and the ODBC driver manager behind it) is loaded on first use, not at import time. """
+    import pyodbc
+    return pyodbc
+
+# Row records for the large listings (tuple-backed, see rows.py)
+UserRow = record("UserRow", "id name email role student_group matricule cne teacher_groups")
+TPRow = record("TPRow", "id titre deadline group module teacher")
+# Search index documents (search.py)
+UserSearchRow = record("UserSearchRow", "id name email role cne matricule group")
+ContentSearchRow = record("ContentSearchRow", "id title group module")
+PresenceStatRow = record("PresenceStatRow", "date group module present total rate")
+
+# Role-specific attributes (group, CNE, matricule) per user, resolved once at login.
+# LRU-bounded (PROFILE_CACHE_ENTRIES). Entries are dropped by update_user / delete_user,
+# and by the change listener below for 'users' writes of other workers and scripts.
+_profile_cache = OrderedDict()
+_profile_lock = threading.Lock()
+
+
+@versions.on_change
+def _evict_profiles(tables, ids):
+    if 'users' not in tables: return
+    with _profile_lock:
+        if ids is None:
+            _profile_cache.clear()
+        else:
+            for user_id in ids:
+                _profile_cache.pop(int(user_id), None)
+
+def encode_feed_cursor(date_item, item_type, item_id):
+    """ Opaque cursor for keyset pagination: the (date, type, id) sort key of one feed item. """
+    date_part = date_item.isoformat() if date_item else ""
+    raw = f"{date_part}|{item_type}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_feed_cursor(cursor):
+    """ Returns (date, type, id) from a cursor, or None if it is missing/invalid. """
+    if not cursor: return None
+    try:
+        date_part, item_type, item_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return (datetime.fromisoformat(date_part) if date_part else None, item_type, int(item_id))
+    except Exception:
+        return None
+
+
+def encode_since_cursor(*ids):
+    """ Opaque "new since last seen" cursor: the highest ids seen (TPID, or TPID and AnnonceID). """
+    raw = "since|" + "|".join(str(int(i)) for i in ids)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_since_cursor(cursor, count):
+    """ Returns the `count` ids of a since-cursor, or None if it is missing/invalid. """
+    if not cursor: return None
+    try:
+        tag, *ids = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        if tag != "since" or len(ids) != count: return None
+        return tuple(int(i) for i in ids)
+    except Exception:
+        return None
+
+
+def _keyset_clause(date_col, type_value, id_col, cursor):
+    """
+    Builds the WHERE fragment selecting rows strictly after a cursor in the feed
+    order: date DESC, type DESC, id DESC (NULL dates last).
+    type_value is the constant type label of the branch ('TP' / 'Annonce').
+    """
+    c_date, c_type, c_id = cursor
+    same_key = f"({id_col} < ?)" if type_value == c_type else ("(1=1)" if type_value < c_type else "(1=0)")
+    same_params = (c_id,) if type_value == c_type else ()
+    if c_date is None:
+        return f"({date_col} IS NULL AND {same_key})", same_params
+    return f"({date_col} < ? OR {date_col} IS NULL OR ({date_col} = ? AND {same_key}))", (c_date, c_date) + same_params
 
-load_dotenv()
 
 class SchoolDB:
-    def __init__(self):
-        driver = os.getenv('DB_DRIVER', '{ODBC Driver 17 for SQL Server}')
-        server = os.getenv('DB_SERVER', 'localhost')
-        database = os.getenv('DB_DATABASE', 'SchoolManagementDB')
-        trusted_conn = os.getenv('DB_TRUSTED_CONNECTION', 'yes')
-        trust_cert = os.getenv('DB_TRUST_CERT', 'yes')
-        
-        self.conn_str = (
-            f"DRIVER={driver};SERVER={server};DATABASE={database};"
-            f"Trusted_Connection={trusted_conn};TrustServerCertificate={trust_cert};"
-        )
+    def __init__(self, use_replica=True):
+        self.conn_str = get_settings().conn_str
         self.conn = None
+        self.pooled = None
+        # Optional read-only replica for reporting methods (see replica.py)
+        self.use_replica = use_replica
+        self.read_conn = None
         
     def __enter__(self):
         self.connect()
@@ -29,12 +130,145 @@ class SchoolDB:
 
     def connect(self):
         try:
-            self.conn = pyodbc.connect(self.conn_str)
+            if get_settings().pool_size > 0:
+                self.pooled = pool.get_pool(self.conn_str, _pyodbc().connect).acquire()
+                self.conn = self.pooled.conn
+            else:
+                self.conn = _pyodbc().connect(self.conn_str)
         except Exception as e:
             print(f"❌ Connection Error: {e}")
 
     def close(self):
-        if self.conn: self.conn.close()
+        if self.pooled:
+            pool.get_pool(self.conn_str, _pyodbc().connect).release(self.pooled)
+            self.pooled = None
+        elif self.conn: self.conn.close()
+        self.conn = None
+        self.drop_replica()
+
+    def run(self, name, params=()):
+        """ Executes a statement from the registry (statements.py) and returns its cursor. """
+        return statements.execute(self, name, params)
+
+    def run_one(self, name, params=()):
+        """ First row of a registered statement (or None); the cached cursor is always drained. """
+        rows = self.run(name, params).fetchall()
+        return rows[0] if rows else None
+
+    def _commit(self, **changes):
+        """
+        Commits the write transaction with its ChangeLog rows (changefeed.py), then
+        applies the log to this process's caches. changes: table=ids (None if not known),
+        e.g. self._commit(users=[user_id], assignments=None).
+        The written tables are bumped locally as well: sync() does not see this write
+        yet while an older transaction (e.g. a long script) is still open.
+        """
+        changefeed.record(self.conn.cursor(), changes)
+        self.conn.commit()
+        try:
+            changefeed.sync(self.conn)
+            synced = True
+        except Exception as e:
+            print(f"⚠️ Change feed sync failed, local bump only: {e}")
+            synced = False
+        # Listeners get the change from the log once it is visible (unless it cannot be read)
+        for table, ids in changes.items():
+            versions.bump(table, ids=ids, notify=not synced)
+
+    @staticmethod
+    def _blob_value(file_bytes):
+        """
+        file_bytes is either bytes or a re-iterable of chunks (admission.SpooledFile).
+        Returns (value to INSERT, chunks to append afterwards with _append_blob).
+        """
+        if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+            return _pyodbc().Binary(file_bytes), ()
+        # .WRITE cannot append to NULL: start from an empty value
+        return _pyodbc().Binary(b""), file_bytes
+
+    def _append_blob(self, cursor, table, id_col, row_id, chunks):
+        """ Streams chunks onto the end of FichierData (UPDATE .WRITE), inside the caller's transaction. """
+        for chunk in chunks:
+            cursor.execute(f"UPDATE {table} SET FichierData.WRITE(?, NULL, NULL) WHERE {id_col} = ?",
+                           (_pyodbc().Binary(chunk), row_id))
+
+    def replica_conn(self, max_lag=None):
+        """
+        The replica connection if it is configured, reachable and no more than
+        max_lag (default DB_REPLICA_MAX_LAG) seconds behind; otherwise None.
+        """
+        if not self.use_replica or not replica.replica_url() or replica.is_down():
+            return None
+        try:
+            if self.read_conn is None:
+                self.read_conn = replica.connect_replica()
+            lag = replica.replica_lag(self.read_conn)
+        except Exception as e:
+            print(f"⚠️ Replica unavailable, using primary: {e}")
+            self.drop_replica()
+            replica.mark_down()
+            return None
+
+        max_lag = max_lag if max_lag is not None else get_settings().replica_max_lag
+        if lag is None or lag > max_lag:
+            replica.stats["stale_skips"] += 1
+            return None
+        return self.read_conn
+
+    def drop_replica(self):
+        if self.read_conn:
+            try: self.read_conn.close()
+            except Exception: pass
+        self.read_conn = None
+
+    def reporting(self, fn, *args, max_lag=None, **kwargs):
+        """
+        fn(conn, *args, **kwargs) for ad-hoc reporting (exports, analytics): run on the
+        replica when it is fresh, and again on the primary if it fails there (like
+        @reads_from_replica). fn must be safe to run twice (e.g. rewrites its file).
+        """
+        read_conn = self.replica_conn(max_lag)
+        if read_conn is None:
+            replica.stats["primary_reads"] += 1
+            return fn(self.conn, *args, **kwargs)
+        try:
+            result = fn(read_conn, *args, **kwargs)
+            replica.stats["replica_reads"] += 1
+            return result
+        except Exception as e:
+            self._replica_failed(getattr(fn, '__name__', fn), e)
+            return fn(self.conn, *args, **kwargs)
+
+    def reporting_stream(self, fn, *args, max_lag=None, **kwargs):
+        """
+        Generator version of reporting() for streamed responses: falls back to the
+        primary if the replica fails before the first item (a query the replica
+        cannot run); once items were sent a failure is raised as is.
+        """
+        read_conn = self.replica_conn(max_lag)
+        if read_conn is not None:
+            items = iter(fn(read_conn, *args, **kwargs))
+            try:
+                first = next(items)
+            except StopIteration:
+                replica.stats["replica_reads"] += 1
+                return
+            except Exception as e:
+                self._replica_failed(getattr(fn, '__name__', fn), e)
+            else:
+                replica.stats["replica_reads"] += 1
+                yield first
+                yield from items
+                return
+        else:
+            replica.stats["primary_reads"] += 1
+        yield from fn(self.conn, *args, **kwargs)
+
+    def _replica_failed(self, name, error):
+        print(f"⚠️ Replica read failed in {name}, falling back to primary: {error}")
+        replica.stats["fallbacks"] += 1
+        self.drop_replica()
+        replica.mark_down()
 
     def login(self, email, password):
         cursor = self.conn.cursor()
@@ -83,6 +317,41 @@ class SchoolDB:
             if ext: data.update({'matricule': ext.Matricule})
         return data
 
+    def get_user_profile(self, user_id):
+        """
+        Returns the role-specific attributes of a user (groupe_id, cne, matricule).
+        Served from the per-user cache; on a miss it runs one narrow query (no password column).
+        """
+        user_id = int(user_id)
+        with _profile_lock:
+            if user_id in _profile_cache:
+                _profile_cache.move_to_end(user_id)
+                return _profile_cache[user_id]
+
+        cursor = self.conn.cursor()
+        sql = """
+        SELECT U.Role, E.CNE, E.GroupeID, F.Matricule
+        FROM Utilisateur U
+        LEFT JOIN Etudiant E ON U.UserID = E.EtudiantID
+        LEFT JOIN Formateur F ON U.UserID = F.FormateurID
+        WHERE U.UserID = ?
+        """
+        cursor.execute(sql, (user_id,))
+        r = cursor.fetchone()
+        if not r: return None
+
+        profile = {"role": r.Role, "groupe_id": r.GroupeID, "cne": r.CNE, "matricule": r.Matricule}
+        with _profile_lock:
+            _profile_cache[user_id] = profile
+            while len(_profile_cache) > get_settings().profile_cache_entries:
+                _profile_cache.popitem(last=False)
+        return profile
+
+    def forget_user_profile(self, user_id):
+        """ Drops the cached profile so the next lookup reads fresh data. """
+        with _profile_lock:
+            _profile_cache.pop(int(user_id), None)
+
     def update_user(self, user_id, data):
         cursor = self.conn.cursor()
         try:
@@ -119,7 +388,8 @@ class SchoolDB:
                     (matricule, user_id)
                 )
             
-            self.conn.commit()
+            self._commit(users=[int(user_id)])
+            self.forget_user_profile(user_id)
             return True
 
         except Exception as e:
@@ -131,7 +401,8 @@ class SchoolDB:
         cursor = self.conn.cursor()
         try:
             cursor.execute("DELETE FROM Utilisateur WHERE UserID = ?", (user_id,))
-            self.conn.commit()
+            self._commit(users=[int(user_id)], assignments=None)
+            self.forget_user_profile(user_id)
             return True
         except Exception: return False
 
@@ -173,7 +444,7 @@ class SchoolDB:
                     (user_id, matricule, 'General')
                 )
             
-            self.conn.commit()
+            self._commit(users=[int(user_id)])
             print(f"✅ User {email} created successfully.")
             return True
 
@@ -183,56 +454,83 @@ class SchoolDB:
             return False
         
     def login(self, email, password):
-        cursor = self.conn.cursor()
         # Fetch the HASH, not the password
-        sql = "SELECT UserID, Nom, Prenom, Role, MotDePasse FROM Utilisateur WHERE Email = ?"
-        cursor.execute(sql, (email,))
-        row = cursor.fetchone()
+        row = self.run_one("login.by_email", (email,))
         
         # Verify the hash
         if row and check_password_hash(row.MotDePasse, password):
+             # Resolve group / role attributes once here; dashboards read them from the cache
+             # (not the session, so a group change applies without logging in again)
+             self.forget_user_profile(row.UserID)
+             self.get_user_profile(row.UserID)
              return {"id": row.UserID, "name": f"{row.Nom} {row.Prenom}", "role": row.Role}
         return None
 
     # --- PROFESSIONAL FILE HANDLING (BLOBs) ---
     
+    @write_transaction
     def create_tp_with_blob(self, titre, description, file_bytes, filename, filetype, deadline, module_id, formateur_id, groupe_id):
         """
         Inserts the actual PDF bytes into the SQL Database.
-        No local files are stored.
+        No local files are stored. Returns the new TPID (False on error).
+        file_bytes may also be an iterable of chunks (resumable uploads), streamed in.
+        Compressible formats are stored compressed (storage.py).
         """
         cursor = self.conn.cursor()
         try:
             safe_deadline = deadline.replace("T", " ") if deadline else None
             sql = """
-            INSERT INTO TP (Titre, Description, FichierData, FichierNom, FichierType, DateLimite, ModuleID, FormateurID, GroupeID) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO TP (Titre, Description, FichierData, FichierNom, FichierType, DateLimite, ModuleID, FormateurID, GroupeID,
+                            Codec, TailleOriginale)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
-            # Pass 'file_bytes' directly. pyodbc handles the VARBINARY conversion.
-            cursor.execute(sql, (titre, description, pyodbc.Binary(file_bytes), filename, filetype, safe_deadline, module_id, formateur_id, groupe_id))
-            self.conn.commit()
+            # pyodbc handles the VARBINARY conversion
+            stored = storage.encode(file_bytes, filename, filetype)
+            blob, chunks = self._blob_value(stored.data)
+            cursor.execute(sql, (titre, description, blob, filename, filetype, safe_deadline, module_id, formateur_id, groupe_id,
+                                 stored.codec, stored.size))
+            cursor.execute("SELECT @@IDENTITY")
+            tp_id = int(cursor.fetchone()[0])
+            self._append_blob(cursor, "TP", "TPID", tp_id, chunks)
+            self._commit(tps=[tp_id])
             print("✅ TP (BLOB) Created Successfully")
-            return True
+            # Notify the group's open dashboards (SSE) so they fetch just the new item
+            broker.publish(group_channel(groupe_id), {"type": "tp", "id": tp_id, "title": titre})
+            return tp_id
         except Exception as e:
-            print(f"❌ FATAL DB ERROR: {e}")
             self.conn.rollback()
+            raise_if_retryable(self, e)
+            print(f"❌ FATAL DB ERROR: {e}")
             return False
 
-    def get_tp_file_content(self, tp_id):
+    def get_tp_file_content(self, tp_id, decoded=True):
         """
         Retrieves the binary data for a specific TP to serve it to the browser.
+        decoded=False: the bytes as stored, with their codec and original size (storage.py).
         """
         cursor = self.conn.cursor()
-        cursor.execute("SELECT FichierData, FichierNom, FichierType FROM TP WHERE TPID = ?", (tp_id,))
+        cursor.execute("SELECT FichierData, FichierNom, FichierType, Codec, TailleOriginale FROM TP WHERE TPID = ?", (tp_id,))
         row = cursor.fetchone()
         if row:
             return {
-                "data": row.FichierData,
+                "data": storage.decode(row.FichierData, row.Codec) if decoded else row.FichierData,
                 "name": row.FichierNom,
-                "type": row.FichierType
+                "type": row.FichierType,
+                "codec": None if decoded else row.Codec,
+                "size": row.TailleOriginale
             }
         return None
 
+    def save_file_metadata(self, kind, item_id, sha256, page_count):
+        """
+        Stores the post-upload metadata (content hash, PDF page count) computed by the background job.
+        kind = 'tp' or 'submission'.
+        """
+        table, id_col = ("TP", "TPID") if kind == 'tp' else ("Soumission", "SoumissionID")
+        cursor = self.conn.cursor()
+        cursor.execute(f"UPDATE {table} SET Empreinte = ?, NbPages = ? WHERE {id_col} = ?", (sha256, page_count, item_id))
+        self.conn.commit()
+
     def get_tps_for_student(self, groupe_id):
         cursor = self.conn.cursor()
         # We don't select FichierData here because it's heavy. We fetch it only when clicked.
@@ -251,14 +549,14 @@ class SchoolDB:
             cursor.execute("UPDATE Presence SET Etat=?, DateEnregistrement=GETDATE() WHERE SeanceID=? AND EtudiantID=?", (status, seance_id, etudiant_id))
             if cursor.rowcount == 0:
                 cursor.execute("INSERT INTO Presence (SeanceID, EtudiantID, Etat) VALUES (?,?,?)", (seance_id, etudiant_id, status))
-            self.conn.commit()
+            self._commit(presence=None)
         except Exception: pass
         
     def submit_rapport(self, tp_id, etudiant_id, rapport_link):
         cursor = self.conn.cursor()
         try:
             cursor.execute("INSERT INTO Soumission (TPID, EtudiantID, LienRapport, DateSoumission) VALUES (?, ?, ?, GETDATE())", (tp_id, etudiant_id, rapport_link))
-            self.conn.commit()
+            self._commit(submissions=None)
             return True
         except Exception: return False
         
@@ -293,7 +591,7 @@ class SchoolDB:
         try:
             sql = "INSERT INTO Affectation (FormateurID, GroupeID, ModuleID) VALUES (?, ?, ?)"
             cursor.execute(sql, (formateur_id, groupe_id, module_id))
-            self.conn.commit()
+            self._commit(assignments=None)
             return True
         except Exception as e:
             print(f"Error assigning formateur: {e}")
@@ -326,7 +624,7 @@ class SchoolDB:
         cursor = self.conn.cursor()
         try:
             cursor.execute("DELETE FROM Affectation WHERE AffectationID = ?", (assignment_id,))
-            self.conn.commit()
+            self._commit(assignments=None)
             return True
         except Exception as e:
             print(f"Error deleting assignment: {e}")
@@ -349,29 +647,77 @@ class SchoolDB:
                  "group_id": r.GroupeID, "group_name": r.NomGroupe} for r in cursor.fetchall()]
         
     
-    def submit_rapport_file(self, tp_id, etudiant_id, file_bytes, filename, filetype):
+
+    def _submission_for_receipt(self, cursor, receipt_id):
+        cursor.execute("SELECT SoumissionID FROM Soumission WHERE RecuID = ?", (receipt_id,))
+        row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    @write_transaction
+    def submit_rapport_file(self, tp_id, etudiant_id, file_bytes, filename, filetype, submitted_at=None, receipt_id=None):
         """
         Saves the Student's PDF report directly into the Database.
+        submitted_at: when the upload was received (spooled uploads are written later); it is the DateSoumission.
+        receipt_id: the spool receipt (admission.py); a replayed ingest returns the attempt already saved for it.
+        file_bytes may also be an iterable of chunks (spooled uploads), streamed in.
+        Compressible formats are stored compressed (storage.py).
+        Returns the new SoumissionID (False on error).
         """
         cursor = self.conn.cursor()
         try:
-            # Check if submission already exists (Optional: to allow re-upload)
-            # For simplicity, we just insert a new attempt
+            if receipt_id is not None:
+                existing = self._submission_for_receipt(cursor, receipt_id)
+                if existing:
+                    self.conn.rollback()
+                    return existing
+
+            # Re-uploads are kept as numbered attempts; only the newest one is flagged EstDerniere.
+            # UPDLOCK/HOLDLOCK serializes two concurrent uploads of the same student.
+            cursor.execute(
+                """SELECT ISNULL(MAX(Tentative), 0) FROM Soumission WITH (UPDLOCK, HOLDLOCK)
+                   WHERE TPID = ? AND EtudiantID = ?""",
+                (tp_id, etudiant_id)
+            )
+            attempt = cursor.fetchone()[0] + 1
+            cursor.execute(
+                "UPDATE Soumission SET EstDerniere = 0 WHERE TPID = ? AND EtudiantID = ? AND EstDerniere = 1",
+                (tp_id, etudiant_id)
+            )
+
             sql = """
-            INSERT INTO Soumission (TPID, EtudiantID, FichierData, FichierNom, FichierType, DateSoumission) 
-            VALUES (?, ?, ?, ?, ?, GETDATE())
+            INSERT INTO Soumission (TPID, EtudiantID, FichierData, FichierNom, FichierType, DateSoumission, Tentative, EstDerniere,
+                                    Codec, TailleOriginale, RecuID)
+            VALUES (?, ?, ?, ?, ?, ISNULL(?, GETDATE()), ?, 1, ?, ?, ?)
             """
             
             # Use pyodbc.Binary to handle the bytes safely
-            cursor.execute(sql, (tp_id, etudiant_id, pyodbc.Binary(file_bytes), filename, filetype))
-            self.conn.commit()
-            return True
+            stored = storage.encode(file_bytes, filename, filetype)
+            blob, chunks = self._blob_value(stored.data)
+            cursor.execute(sql, (tp_id, etudiant_id, blob, filename, filetype, submitted_at, attempt, stored.codec, stored.size,
+                                 receipt_id))
+            cursor.execute("SELECT @@IDENTITY")
+            submission_id = int(cursor.fetchone()[0])
+            self._append_blob(cursor, "Soumission", "SoumissionID", submission_id, chunks)
+            self._commit(submissions=[submission_id])
+            return submission_id
         except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
+            if receipt_id is not None:
+                # Two ingests of the same receipt raced: UX_Soumission_RecuID let one of them in
+                try:
+                    existing = self._submission_for_receipt(self.conn.cursor(), receipt_id)
+                except Exception:
+                    existing = None
+                if existing:
+                    return existing
             print(f"❌ Error submitting rapport: {e}")
             return False
         
         
     # --- ADMIN: USER MANAGEMENT ENHANCED ---
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
     def get_all_users_extended(self):
         """
         Fetches users with extra context:
@@ -379,10 +725,22 @@ class SchoolDB:
         - Formateurs: We will attach their assigned groups later in Python.
         """
         cursor = self.conn.cursor()
-        
-        # 1. Fetch Basic Info + Student Group Name
+
+        # 1. Fetch All Teacher Assignments in one go, indexed by teacher
+        sql_assign = """
+        SELECT A.FormateurID, G.NomGroupe, M.NomModule
+        FROM Affectation A
+        JOIN Groupe G ON A.GroupeID = G.GroupeID
+        JOIN Module M ON A.ModuleID = M.ModuleID
+        """
+        cursor.execute(sql_assign)
+        teacher_groups = {}
+        for assign in cursor.fetchall():
+            teacher_groups.setdefault(assign.FormateurID, []).append(f"{assign.NomGroupe} ({assign.NomModule})")
+
+        # 2. Fetch Basic Info + Student Group Name (column order = UserRow fields)
         sql = """
-        SELECT U.UserID, U.Nom, U.Prenom, U.Email, U.Role, 
+        SELECT U.UserID, CONCAT(U.Nom, ' ', U.Prenom) AS Name, U.Email, U.Role,
                G.NomGroupe, F.Matricule, E.CNE
         FROM Utilisateur U
         LEFT JOIN Etudiant E ON U.UserID = E.EtudiantID
@@ -391,38 +749,9 @@ class SchoolDB:
         ORDER BY U.Role, U.Nom
         """
         cursor.execute(sql)
-        users = []
-        for row in cursor.fetchall():
-            user = {
-                "id": row.UserID, 
-                "name": f"{row.Nom} {row.Prenom}", 
-                "email": row.Email, 
-                "role": row.Role,
-                "student_group": row.NomGroupe, # Only for students
-                "matricule": row.Matricule,
-                "cne": row.CNE,
-                "teacher_groups": [] # Will populate below
-            }
-            users.append(user)
-            
-        # 2. Fetch All Teacher Assignments in one go to be efficient
-        sql_assign = """
-        SELECT A.FormateurID, G.NomGroupe, M.NomModule
-        FROM Affectation A
-        JOIN Groupe G ON A.GroupeID = G.GroupeID
-        JOIN Module M ON A.ModuleID = M.ModuleID
-        """
-        cursor.execute(sql_assign)
-        assignments = cursor.fetchall()
-        
-        # 3. Map Assignments to Teachers
-        for assign in assignments:
-            # Find the teacher in our list and append the group
-            for u in users:
-                if u['id'] == assign.FormateurID:
-                    u['teacher_groups'].append(f"{assign.NomGroupe} ({assign.NomModule})")
-        
-        return users
+        make = UserRow._make
+        no_groups = ()
+        return [make((*r, teacher_groups.get(r[0], no_groups))) for r in cursor.fetchall()]
 
     # --- TP MANAGEMENT ---
     def get_tps_by_formateur(self, formateur_id):
@@ -439,13 +768,15 @@ class SchoolDB:
         cursor.execute(sql, (formateur_id,))
         return [{"id": r.TPID, "titre": r.Titre, "deadline": str(r.DateLimite), "group": r.NomGroupe, "module": r.NomModule} for r in cursor.fetchall()]
 
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
     def get_all_tps_global(self):
         """ For Admin Dashboard: See EVERYTHING """
         cursor = self.conn.cursor()
         sql = """
         SELECT TP.TPID, TP.Titre, TP.DateLimite, 
                G.NomGroupe, M.NomModule, 
-               U.Nom, U.Prenom
+               CONCAT(U.Nom, ' ', U.Prenom) AS Teacher
         FROM TP
         JOIN Groupe G ON TP.GroupeID = G.GroupeID
         JOIN Module M ON TP.ModuleID = M.ModuleID
@@ -453,17 +784,146 @@ class SchoolDB:
         ORDER BY TP.DateLimite DESC
         """
         cursor.execute(sql)
-        return [{
-            "id": r.TPID, 
-            "titre": r.Titre, 
-            "deadline": str(r.DateLimite), 
-            "group": r.NomGroupe, 
-            "module": r.NomModule,
-            "teacher": f"{r.Nom} {r.Prenom}"
-        } for r in cursor.fetchall()]
+        # deadline stays a datetime; the JSON layer writes it as str() like before
+        return list(map_rows(cursor, TPRow))
         
         
         
+    # --- DOCUMENT FULL-TEXT (fulltext.py) ---
+    def has_document_text(self, sha256):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM TexteDocument WHERE Empreinte = ?", (sha256,))
+        return cursor.fetchone() is not None
+
+    def save_document_text(self, sha256, text):
+        """ Stores the text extracted from a file; the full-text index picks it up (change tracking). """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO TexteDocument (Empreinte, Contenu, NbCaracteres)
+                SELECT ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM TexteDocument WHERE Empreinte = ?)
+            """, (sha256, text, len(text), sha256))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"❌ Error saving document text: {e}")
+            self.conn.rollback()
+            return False
+
+    def get_files_to_index(self):
+        """ (kind, id, sha256) of every TP subject and latest report; sha256 is None until file_metadata ran. """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT 'tp', TPID, Empreinte FROM TP WHERE FichierData IS NOT NULL
+            UNION ALL
+            SELECT 'submission', SoumissionID, Empreinte FROM Soumission WHERE EstDerniere = 1 AND FichierNom IS NOT NULL
+        """)
+        return [tuple(r) for r in cursor.fetchall()]
+
+    def search_documents(self, role, user_id, groupe_id=None, hashes=None, contains=None, snippet_term=None, limit=20):
+        """
+        TP subjects and latest reports the user may open, whose text matched:
+        - hashes: content hashes already matched by the local FTS5 index (any order), or
+        - contains: a CONTAINS expression for the SQL Server full-text index (ranked here).
+        Direction sees everything, a Formateur the TPs they published and their reports,
+        an Etudiant their group's TPs and their own reports.
+        """
+        if role == 'Direction':
+            tp_scope, sub_scope, scope_params = "1 = 1", "1 = 1", []
+        elif role == 'Formateur':
+            tp_scope, sub_scope, scope_params = "TP.FormateurID = ?", "TP.FormateurID = ?", [user_id, user_id]
+        else:
+            tp_scope, sub_scope, scope_params = "TP.GroupeID = ?", "S.EtudiantID = ?", [groupe_id, user_id]
+
+        documents = f"""
+            SELECT 'tp' AS Kind, TP.TPID AS ID, TP.Titre AS Titre, G.NomGroupe AS Detail,
+                   TP.DateLimite AS DateItem, TP.Empreinte
+            FROM TP JOIN Groupe G ON TP.GroupeID = G.GroupeID
+            WHERE TP.Empreinte IS NOT NULL AND {tp_scope}
+            UNION ALL
+            SELECT 'submission', S.SoumissionID, TP.Titre, CONCAT(U.Nom, ' ', U.Prenom),
+                   S.DateSoumission, S.Empreinte
+            FROM Soumission S
+            JOIN TP ON S.TPID = TP.TPID
+            JOIN Utilisateur U ON S.EtudiantID = U.UserID
+            WHERE S.EstDerniere = 1 AND S.Empreinte IS NOT NULL AND {sub_scope}
+        """
+        cursor = self.conn.cursor()
+        if contains is not None:
+            # Snippet: the text around the first occurrence of the first word
+            sql = f"""
+            SELECT TOP (?) D.Kind, D.ID, D.Titre, D.Detail, D.DateItem, D.Empreinte,
+                   SUBSTRING(T.Contenu, CASE WHEN P.Pos > 80 THEN P.Pos - 80 ELSE 1 END, 200) AS Extrait
+            FROM ({documents}) D
+            JOIN CONTAINSTABLE(TexteDocument, Contenu, ?) FT ON FT.[KEY] = D.Empreinte
+            JOIN TexteDocument T ON T.Empreinte = D.Empreinte
+            CROSS APPLY (SELECT CHARINDEX(?, T.Contenu) AS Pos) P
+            ORDER BY FT.RANK DESC, D.DateItem DESC
+            """
+            cursor.execute(sql, [limit, *scope_params, contains, snippet_term or ''])
+        else:
+            if not hashes:
+                return []
+            sql = f"SELECT D.*, NULL AS Extrait FROM ({documents}) D WHERE D.Empreinte IN ({','.join('?' * len(hashes))})"
+            cursor.execute(sql, [*scope_params, *hashes])
+
+        return [{
+            "kind": r.Kind,
+            "id": r.ID,
+            "title": r.Titre,
+            "detail": r.Detail,
+            "date": str(r.DateItem) if r.DateItem else None,
+            "sha256": r.Empreinte,
+            "snippet": r.Extrait,
+        } for r in cursor.fetchall()]
+
+    # --- SEARCH INDEX SOURCES ---
+    def get_search_documents(self, kind, ids=None):
+        """
+        Rows the in-memory search index is built from: kind is 'user', 'tp' or 'annonce'.
+        ids limits the load to those rows (incremental update); None loads them all.
+        """
+        cursor = self.conn.cursor()
+        if kind == 'user':
+            sql = """
+            SELECT U.UserID, CONCAT(U.Nom, ' ', U.Prenom), U.Email, U.Role,
+                   E.CNE, F.Matricule, G.NomGroupe
+            FROM Utilisateur U
+            LEFT JOIN Etudiant E ON U.UserID = E.EtudiantID
+            LEFT JOIN Groupe G ON E.GroupeID = G.GroupeID
+            LEFT JOIN Formateur F ON U.UserID = F.FormateurID
+            """
+            id_col, factory = "U.UserID", UserSearchRow
+        elif kind == 'tp':
+            sql = """
+            SELECT TP.TPID, TP.Titre, G.NomGroupe, M.NomModule
+            FROM TP
+            LEFT JOIN Groupe G ON TP.GroupeID = G.GroupeID
+            LEFT JOIN Module M ON TP.ModuleID = M.ModuleID
+            """
+            id_col, factory = "TP.TPID", ContentSearchRow
+        elif kind == 'annonce':
+            sql = """
+            SELECT A.AnnonceID, A.Titre, G.NomGroupe, M.NomModule
+            FROM Annonce A
+            LEFT JOIN Groupe G ON A.GroupeID = G.GroupeID
+            LEFT JOIN Module M ON A.ModuleID = M.ModuleID
+            """
+            id_col, factory = "A.AnnonceID", ContentSearchRow
+        else:
+            raise ValueError(f"Unknown search document kind: {kind}")
+
+        if ids is None:
+            cursor.execute(sql)
+            return list(map_rows(cursor, factory))
+        found = []
+        ids = list(ids)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            cursor.execute(f"{sql} WHERE {id_col} IN ({','.join('?' * len(chunk))})", chunk)
+            found.extend(map_rows(cursor, factory))
+        return found
+
     # --- PRESENCE MANAGEMENT ---
     
     def get_or_create_seance(self, formateur_id, groupe_id, module_id, date_str):
@@ -503,6 +963,7 @@ class SchoolDB:
         cursor.execute("SELECT @@IDENTITY")
         return cursor.fetchone()[0]
 
+    @read_isolation('SNAPSHOT')
     def get_students_with_presence(self, groupe_id, seance_id):
         """
         Fetches all students in a group, AND their presence status for a specific session.
@@ -522,122 +983,202 @@ class SchoolDB:
             for r in cursor.fetchall()
         ]
         
-    def save_bulk_presence(self, seance_id, presence_data):
+    @write_transaction
+    def save_bulk_presence(self, seance_id, presence_data, batch_size=500):
         """
         Updates presence for multiple students at once.
         presence_data = [{'student_id': 10, 'status': 'Present'}, ...]
+        One short transaction of set-based upserts instead of a round trip per student.
         """
         cursor = self.conn.cursor()
+        # Same row order for every writer, so two saves of one session cannot deadlock on each other
+        rows = sorted((int(item['student_id']), item['status']) for item in presence_data)
         try:
-            for item in presence_data:
-                # Upsert Logic
-                sql_update = "UPDATE Presence SET Etat=?, DateEnregistrement=GETDATE() WHERE SeanceID=? AND EtudiantID=?"
-                cursor.execute(sql_update, (item['status'], seance_id, item['student_id']))
-                if cursor.rowcount == 0:
-                    sql_insert = "INSERT INTO Presence (SeanceID, EtudiantID, Etat) VALUES (?,?,?)"
-                    cursor.execute(sql_insert, (seance_id, item['student_id'], item['status']))
-            self.conn.commit()
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                values_sql = ", ".join(["(?, ?)"] * len(batch))
+                values = [p for row in batch for p in row]
+                cursor.execute(f"""
+                    UPDATE P SET P.Etat = V.Etat, P.DateEnregistrement = GETDATE()
+                    FROM Presence P
+                    JOIN (VALUES {values_sql}) AS V(EtudiantID, Etat) ON P.EtudiantID = V.EtudiantID
+                    WHERE P.SeanceID = ?""", values + [seance_id])
+                cursor.execute(f"""
+                    INSERT INTO Presence (SeanceID, EtudiantID, Etat)
+                    SELECT ?, V.EtudiantID, V.Etat
+                    FROM (VALUES {values_sql}) AS V(EtudiantID, Etat)
+                    WHERE NOT EXISTS (SELECT 1 FROM Presence P WITH (UPDLOCK, HOLDLOCK)
+                                      WHERE P.SeanceID = ? AND P.EtudiantID = V.EtudiantID)""", [seance_id] + values + [seance_id])
+            self._commit(presence=None)
             return True
         except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
             print(f"Error saving presence: {e}")
             return False
         
         
     # --- ANALYTICS & DASHBOARD ---
 
-    def get_presence_stats(self, formateur_id=None):
-        """ Aggregates presence data for charts. """
+    # --- ATTENDANCE CUBE (pre-aggregated, day grain) ---
+
+    # Dimension name -> (id column in the cube, label expression, join)
+    CUBE_DIMENSIONS = {
+        "filiere":   ("C.FiliereID",   "F.NomFiliere",              "JOIN Filiere F ON C.FiliereID = F.FiliereID"),
+        "groupe":    ("C.GroupeID",    "G.NomGroupe",               "JOIN Groupe G ON C.GroupeID = G.GroupeID"),
+        "module":    ("C.ModuleID",    "M.NomModule",               "JOIN Module M ON C.ModuleID = M.ModuleID"),
+        "formateur": ("C.FormateurID", "U.Nom + ' ' + U.Prenom",    "JOIN Utilisateur U ON C.FormateurID = U.UserID"),
+    }
+    CUBE_GRAINS = {
+        "day":   "C.Jour",
+        # Day 0 (1900-01-01) is a Monday: weeks run Monday to Sunday, as in analytics.module_trends.
+        # (DATEDIFF(WEEK) counts Sunday boundaries and would put Sundays in the next week.)
+        "week":  "DATEADD(DAY, -(DATEDIFF(DAY, 0, C.Jour) % 7), C.Jour)",
+        "month": "DATEFROMPARTS(YEAR(C.Jour), MONTH(C.Jour), 1)",
+    }
+
+    @write_transaction
+    def refresh_attendance_cube(self, seance_ids=None):
+        """
+        Recomputes cube cells from Presence/Seance.
+        seance_ids=None rebuilds everything; otherwise only the (day, group, module, teacher)
+        cells touched by those sessions are recomputed (incremental refresh after a save).
+        Cells of archived academic years (ArchivageAnnee) are kept: their sessions are gone.
+        """
         cursor = self.conn.cursor()
-        where_clause = "WHERE S.FormateurID = ?" if formateur_id else ""
-        params = (formateur_id,) if formateur_id else ()
-        
-        sql = f"""
-        SELECT 
-            CAST(S.DateDebut AS DATE) as SessionDate, 
-            G.NomGroupe,
-            M.NomModule,
-            COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) as TotalPresent,
-            COUNT(P.PresenceID) as TotalStudents
+        aggregate_sql = """
+        INSERT INTO AttendanceCube (Jour, FiliereID, GroupeID, ModuleID, FormateurID, NbPresent, NbTotal)
+        SELECT CAST(S.DateDebut AS DATE), G.FiliereID, S.GroupeID, S.ModuleID, S.FormateurID,
+               COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END), COUNT(P.PresenceID)
         FROM Seance S
         JOIN Groupe G ON S.GroupeID = G.GroupeID
-        JOIN Module M ON S.ModuleID = M.ModuleID
         LEFT JOIN Presence P ON S.SeanceID = P.SeanceID
-        {where_clause}
-        GROUP BY CAST(S.DateDebut AS DATE), G.NomGroupe, M.NomModule
-        ORDER BY SessionDate ASC
+        {join}
+        GROUP BY CAST(S.DateDebut AS DATE), G.FiliereID, S.GroupeID, S.ModuleID, S.FormateurID
+        """
+        try:
+            if seance_ids is None:
+                cursor.execute("SELECT MAX(Annee) FROM ArchivageAnnee")
+                last_archived = cursor.fetchone()[0]
+                if last_archived is None:
+                    cursor.execute("DELETE FROM AttendanceCube")
+                    cursor.execute(aggregate_sql.format(join=""))
+                else:
+                    since = archive.year_bounds(last_archived + 1)[0]
+                    cursor.execute("DELETE FROM AttendanceCube WHERE Jour >= ?", (since,))
+                    cursor.execute(aggregate_sql.format(join="WHERE S.DateDebut >= ?"), (since,))
+            else:
+                seance_ids = [int(x) for x in seance_ids]
+                if not seance_ids: return True
+                marks = ", ".join("?" * len(seance_ids))
+                cells = f"""(SELECT DISTINCT CAST(DateDebut AS DATE) AS Jour, GroupeID, ModuleID, FormateurID
+                            FROM Seance WHERE SeanceID IN ({marks}))"""
+                cursor.execute(f"""
+                    DELETE C FROM AttendanceCube C
+                    JOIN {cells} K ON C.Jour = K.Jour AND C.GroupeID = K.GroupeID
+                                  AND C.ModuleID = K.ModuleID AND C.FormateurID = K.FormateurID""", seance_ids)
+                join = f"""JOIN {cells} K ON CAST(S.DateDebut AS DATE) = K.Jour AND S.GroupeID = K.GroupeID
+                                          AND S.ModuleID = K.ModuleID AND S.FormateurID = K.FormateurID"""
+                cursor.execute(aggregate_sql.format(join=join), seance_ids)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
+            print(f"❌ Error refreshing attendance cube: {e}")
+            return False
+
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
+    def query_attendance_cube(self, dims, grain=None, filters=None):
+        """
+        Roll-up / drill-down over the pre-aggregated cube.
+        dims: subset of CUBE_DIMENSIONS keys to group by; grain: 'day' | 'week' | 'month' adds the period.
+        filters: {"filiere"|"groupe"|"module"|"formateur": id, "date_from", "date_to"}.
         """
+        filters = filters or {}
+        select, group_by, joins, where, params = [], [], [], [], []
+        for dim in dims:
+            id_col, label, join = self.CUBE_DIMENSIONS[dim]
+            select += [f"{id_col} AS {dim}_id", f"{label} AS {dim}"]
+            group_by += [id_col, label]
+            joins.append(join)
+        if grain:
+            period = self.CUBE_GRAINS[grain]
+            select.append(f"{period} AS Periode")
+            group_by.append(period)
+
+        for dim, (id_col, _, _) in self.CUBE_DIMENSIONS.items():
+            if filters.get(dim):
+                where.append(f"{id_col} = ?")
+                params.append(filters[dim])
+        if filters.get('date_from'):
+            where.append("C.Jour >= ?")
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            where.append("C.Jour <= ?")
+            params.append(filters['date_to'])
+
+        select += ["SUM(C.NbPresent) AS Present", "SUM(C.NbTotal) AS Total"]
+        sql = f"""
+        SELECT {', '.join(select)}
+        FROM AttendanceCube C
+        {' '.join(joins)}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        {'GROUP BY ' + ', '.join(group_by) if group_by else ''}
+        ORDER BY {'Periode, ' if grain else ''}Total DESC
+        """
+        cursor = self.conn.cursor()
         cursor.execute(sql, params)
+        columns = [c[0] for c in cursor.description]
         results = []
         for row in cursor.fetchall():
-            total = row.TotalStudents
-            present = row.TotalPresent
-            # Avoid Python Division by Zero
-            rate = round((present / total * 100), 1) if total > 0 else 0
-            
-            results.append({
-                "date": str(row.SessionDate),
-                "group": row.NomGroupe,
-                "module": row.NomModule,
-                "present": present,
-                "total": total,
-                "rate": rate
-            })
+            item = dict(zip(columns, row))
+            present, total = item.pop('Present') or 0, item.pop('Total') or 0
+            if grain: item['period'] = str(item.pop('Periode'))[:10]
+            item.update({"present": present, "total": total,
+                         "rate": round(present / total * 100, 1) if total > 0 else 0})
+            results.append(item)
         return results
 
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
+    def get_presence_stats(self, formateur_id=None):
+        """ Aggregates presence data for charts. """
+        if formateur_id:
+            cursor = self.run("presence_stats.by_formateur", (formateur_id,))
+        else:
+            cursor = self.run("presence_stats.all")
+        # Rate is computed by the statement (0 when a session has no presence rows)
+        return list(map_rows(cursor, PresenceStatRow))
+
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
     def get_global_kpis(self, formateur_id=None):
         """ 
         Gets big numbers (CRASH PROOF VERSION). 
         Uses NULLIF to handle cases where there are 0 sessions.
         """
-        cursor = self.conn.cursor()
-        where_sql = "WHERE FormateurID = ?" if formateur_id else ""
-        params = (formateur_id,) if formateur_id else ()
-        
-        # 1. Total Sessions
-        cursor.execute(f"SELECT COUNT(*) FROM Seance {where_sql}", params)
-        total_sessions = cursor.fetchone()[0]
-        
-        # 2. Global Attendance Rate (Safe Division)
-        # NULLIF(COUNT(*), 0) returns NULL if count is 0, preventing the crash.
-        sql_rate = f"""
-        SELECT 
-            ISNULL(
-                (COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) * 100.0) / NULLIF(COUNT(*), 0), 
-                0
-            )
-        FROM Presence P
-        JOIN Seance S ON P.SeanceID = S.SeanceID
-        {where_sql}
-        """
-        cursor.execute(sql_rate, params)
-        row = cursor.fetchone()
-        avg_rate = round(row[0], 1) if row and row[0] is not None else 0
+        if formateur_id:
+            row = self.run_one("kpis.by_formateur", (formateur_id, formateur_id))
+        else:
+            row = self.run_one("kpis.all")
+        total_sessions = row.TotalSessions if row else 0
+        avg_rate = round(row.AvgRate, 1) if row and row.AvgRate is not None else 0
         
         return {"total_sessions": total_sessions, "avg_rate": avg_rate}
 
+    @reads_from_replica
+    @read_isolation('SNAPSHOT')
     def get_absent_report(self, formateur_id=None):
         """ 
         Returns comprehensive absence data including specific dates.
         Groups data by Student+Module to calculate the "3 Strikes" rule.
         """
-        cursor = self.conn.cursor()
-        
-        where_sql = "AND S.FormateurID = ?" if formateur_id else ""
-        params = (formateur_id,) if formateur_id else ()
-
-        sql = f"""
-        SELECT 
-            U.Nom, U.Prenom, E.CNE, G.NomGroupe, M.NomModule, S.DateDebut
-        FROM Presence P
-        JOIN Seance S ON P.SeanceID = S.SeanceID
-        JOIN Etudiant E ON P.EtudiantID = E.EtudiantID
-        JOIN Utilisateur U ON E.EtudiantID = U.UserID
-        JOIN Groupe G ON S.GroupeID = G.GroupeID
-        JOIN Module M ON S.ModuleID = M.ModuleID
-        WHERE P.Etat = 'Absent' {where_sql}
-        ORDER BY U.Nom, M.NomModule, S.DateDebut DESC
-        """
-        cursor.execute(sql, params)
+        if formateur_id:
+            cursor = self.run("absent_report.by_formateur", (formateur_id,))
+        else:
+            cursor = self.run("absent_report.all")
         
         report_map = {}
         for r in cursor.fetchall():
@@ -659,6 +1200,27 @@ class SchoolDB:
         return final_report
 
 
+    @reads_from_replica
+    def get_students_brief(self, student_ids):
+        """ {EtudiantID: {"name", "cne", "group"}} for a set of students (labels for analytics results). """
+        student_ids = list(student_ids)
+        if not student_ids: return {}
+        cursor = self.conn.cursor()
+        result = {}
+        # Chunked IN lists stay under the 2100-parameter limit
+        for start in range(0, len(student_ids), 1000):
+            chunk = student_ids[start:start + 1000]
+            marks = ", ".join("?" * len(chunk))
+            cursor.execute(f"""
+                SELECT E.EtudiantID, U.Nom, U.Prenom, E.CNE, G.NomGroupe
+                FROM Etudiant E
+                JOIN Utilisateur U ON E.EtudiantID = U.UserID
+                LEFT JOIN Groupe G ON E.GroupeID = G.GroupeID
+                WHERE E.EtudiantID IN ({marks})""", chunk)
+            for r in cursor.fetchall():
+                result[r.EtudiantID] = {"name": f"{r.Nom} {r.Prenom}", "cne": r.CNE, "group": r.NomGroupe}
+        return result
+
     def create_annonce(self, titre, contenu, image_bytes, formateur_id, groupe_id, module_id):
         cursor = self.conn.cursor()
         try:
@@ -667,15 +1229,80 @@ class SchoolDB:
             VALUES (?, ?, ?, ?, ?, ?, GETDATE())
             """
             # Handle optional image
-            img_data = pyodbc.Binary(image_bytes) if image_bytes else None
+            img_data = _pyodbc().Binary(image_bytes) if image_bytes else None
             
             cursor.execute(sql, (titre, contenu, img_data, formateur_id, groupe_id, module_id))
-            self.conn.commit()
-            return True
+            cursor.execute("SELECT @@IDENTITY")
+            annonce_id = int(cursor.fetchone()[0])
+            self._commit(annonces=[annonce_id])
+            broker.publish(group_channel(groupe_id), {"type": "annonce", "id": annonce_id, "title": titre})
+            # The ID (truthy) lets the caller queue the thumbnail job
+            return annonce_id
         except Exception as e:
             print(f"Error creating annonce: {e}")
             return False
 
+    def save_annonce_variants(self, annonce_id, variants, commit=True):
+        """ Stores the resized variants produced by images.build_variants (replaces existing ones). """
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM AnnonceImage WHERE AnnonceID = ?", (annonce_id,))
+        for name, v in variants.items():
+            cursor.execute(
+                """INSERT INTO AnnonceImage (AnnonceID, Variante, Donnees, TypeMime, Largeur, Hauteur, Taille, Empreinte)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (annonce_id, name, _pyodbc().Binary(v['data']), v['type'], v['width'], v['height'], len(v['data']), v['etag'])
+            )
+        if commit: self.conn.commit()
+
+    def get_annonce_original_image(self, annonce_id):
+        """ Raw uploaded image bytes (input of the thumbnail job). """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT ImageBin FROM Annonce WHERE AnnonceID = ?", (annonce_id,))
+        row = cursor.fetchone()
+        return row.ImageBin if row else None
+
+    def can_view_annonce(self, annonce_id, role, user_id, groupe_id=None):
+        """
+        Same scope as the announcement listings: Direction sees every announcement,
+        a Formateur the ones they published, an Etudiant the ones of their group.
+        """
+        if role == 'Direction':
+            scope, params = "1 = 1", []
+        elif role == 'Formateur':
+            scope, params = "FormateurID = ?", [user_id]
+        else:
+            scope, params = "GroupeID = ?", [groupe_id]
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT 1 FROM Annonce WHERE AnnonceID = ? AND {scope}", [annonce_id, *params])
+        return cursor.fetchone() is not None
+
+    def get_annonce_image(self, annonce_id, variant, with_data=True):
+        """
+        Returns one image variant of an announcement: {"data", "type", "etag", "width", "height"}.
+        with_data=False only reads the metadata (enough to answer a 304).
+        Falls back to the original ImageBin when no variants were generated.
+        """
+        cursor = self.conn.cursor()
+        data_col = "Donnees" if with_data else "NULL"
+        cursor.execute(
+            f"SELECT {data_col} AS Donnees, TypeMime, Empreinte, Largeur, Hauteur FROM AnnonceImage WHERE AnnonceID = ? AND Variante = ?",
+            (annonce_id, variant)
+        )
+        r = cursor.fetchone()
+        if r:
+            return {"data": r.Donnees, "type": r.TypeMime, "etag": r.Empreinte, "width": r.Largeur, "height": r.Hauteur}
+
+        data_col = "ImageBin" if with_data else "NULL"
+        cursor.execute(
+            f"SELECT {data_col} AS ImageBin, DATALENGTH(ImageBin) AS Taille FROM Annonce WHERE AnnonceID = ? AND ImageBin IS NOT NULL",
+            (annonce_id,)
+        )
+        r = cursor.fetchone()
+        if r:
+            return {"data": r.ImageBin, "type": None, "etag": f"orig-{annonce_id}-{r.Taille}", "width": None, "height": None}
+        return None
+
+    @read_isolation('SNAPSHOT')
     def get_formateur_history_mixed(self, formateur_id):
         """
         Fetches BOTH TPs and Announcements, sorts them by date, and labels them.
@@ -718,17 +1345,179 @@ class SchoolDB:
         ]
         
         
+    # --- TIMELINE FEEDS (cursor pagination) ---
+    # Pages are ordered by date (deadline / publication) and paged with `before`.
+    # "New since last seen" (`after`) cannot use that order: a TP published now may
+    # have an earlier deadline than the top card. It is keyed on the IDENTITY ids
+    # instead, which only grow: top_cursor holds the highest ids the client has seen.
+
+    @read_isolation('SNAPSHOT')
+    def get_student_feed(self, groupe_id, before=None, after=None, limit=None):
+        """
+        One page of the student's TP timeline (deadline DESC).
+        before = cursor -> older items (lazy-load), after = top_cursor -> TPs published since (new since last seen).
+        Returns {"items": [...], "next_cursor": ..., "top_cursor": ...}.
+        """
+        limit = limit or get_settings().feed_page_size
+        cursor = self.conn.cursor()
+        columns = "TP.TPID, TP.Titre, TP.Description, TP.DateLimite, M.NomModule"
+
+        seen = decode_since_cursor(after, 1)
+        if after and seen:
+            cursor.execute(f"""
+            SELECT TOP (?) {columns}
+            FROM TP JOIN Module M ON TP.ModuleID = M.ModuleID
+            WHERE TP.GroupeID = ? AND TP.TPID > ?
+            ORDER BY TP.TPID
+            """, (limit, groupe_id, seen[0]))
+            rows = cursor.fetchall()
+            top = (max([seen[0]] + [r.TPID for r in rows]),)
+            rows.sort(key=lambda r: (r.DateLimite is not None, r.DateLimite or datetime.min, r.TPID), reverse=True)
+            return self._feed_page(self._student_items(rows), limit, newer=True, top=top)
+
+        where_sql, params = "", ()
+        cursor_key = decode_feed_cursor(before)
+        if cursor_key:
+            where_sql, params = _keyset_clause("TP.DateLimite", 'TP', "TP.TPID", cursor_key)
+            where_sql = "AND " + where_sql
+        cursor.execute(f"""
+        SELECT TOP (?) {columns}
+        FROM TP JOIN Module M ON TP.ModuleID = M.ModuleID
+        WHERE TP.GroupeID = ? {where_sql}
+        ORDER BY TP.DateLimite DESC, TP.TPID DESC
+        """, (limit, groupe_id) + params)
+        rows = cursor.fetchall()
+
+        top = None
+        if not before:
+            cursor.execute("SELECT ISNULL(MAX(TPID), 0) FROM TP WHERE GroupeID = ?", (groupe_id,))
+            top = (cursor.fetchone()[0],)
+        return self._feed_page(self._student_items(rows), limit, newer=False, top=top)
+
+    @staticmethod
+    def _student_items(rows):
+        return [{"id": r.TPID, "titre": r.Titre, "description": r.Description, "deadline": str(r.DateLimite),
+                 "module": r.NomModule, "cursor": encode_feed_cursor(r.DateLimite, 'TP', r.TPID)} for r in rows]
+
+    @read_isolation('SNAPSHOT')
+    def get_formateur_feed(self, formateur_id, before=None, after=None, limit=None):
+        """
+        One page of the teacher's mixed TP + Announcement timeline.
+        Each UNION branch is cut to `limit` rows by its own index seek, so only 2*limit rows get sorted.
+        after = top_cursor -> the TPs and announcements created since, each branch keyed on its own id.
+        """
+        limit = limit or get_settings().feed_page_size
+        cursor = self.conn.cursor()
+        tp_columns = """TP.TPID as ID, TP.Titre, TP.DateLimite as DateItem, 'TP' as Type, G.NomGroupe, M.NomModule,
+                       0 as HasImage
+                FROM TP
+                JOIN Groupe G ON TP.GroupeID = G.GroupeID
+                JOIN Module M ON TP.ModuleID = M.ModuleID"""
+        ann_columns = """A.AnnonceID as ID, A.Titre, A.DatePublication as DateItem, 'Annonce' as Type, G.NomGroupe, M.NomModule,
+                       CASE WHEN A.ImageBin IS NULL THEN 0 ELSE 1 END as HasImage
+                FROM Annonce A
+                JOIN Groupe G ON A.GroupeID = G.GroupeID
+                JOIN Module M ON A.ModuleID = M.ModuleID"""
+
+        seen = decode_since_cursor(after, 2)
+        if after and seen:
+            sql = f"""
+            SELECT * FROM (
+                SELECT TOP (?) {tp_columns}
+                WHERE TP.FormateurID = ? AND TP.TPID > ?
+                ORDER BY TP.TPID
+            ) T
+            UNION ALL
+            SELECT * FROM (
+                SELECT TOP (?) {ann_columns}
+                WHERE A.FormateurID = ? AND A.AnnonceID > ?
+                ORDER BY A.AnnonceID
+            ) N
+            """
+            cursor.execute(sql, (limit, formateur_id, seen[0], limit, formateur_id, seen[1]))
+            rows = cursor.fetchall()
+            top = (max([seen[0]] + [r.ID for r in rows if r.Type == 'TP']),
+                   max([seen[1]] + [r.ID for r in rows if r.Type == 'Annonce']))
+            rows.sort(key=lambda r: (r.DateItem is not None, r.DateItem or datetime.min, r.Type, r.ID), reverse=True)
+            return self._feed_page(self._formateur_items(rows), limit, newer=True, top=top)
+
+        tp_where, tp_params = "", ()
+        ann_where, ann_params = "", ()
+        cursor_key = decode_feed_cursor(before)
+        if cursor_key:
+            tp_where, tp_params = _keyset_clause("TP.DateLimite", 'TP', "TP.TPID", cursor_key)
+            ann_where, ann_params = _keyset_clause("A.DatePublication", 'Annonce', "A.AnnonceID", cursor_key)
+            tp_where, ann_where = "AND " + tp_where, "AND " + ann_where
+
+        sql = f"""
+        SELECT TOP (?) * FROM (
+            SELECT * FROM (
+                SELECT TOP (?) {tp_columns}
+                WHERE TP.FormateurID = ? {tp_where}
+                ORDER BY TP.DateLimite DESC, TP.TPID DESC
+            ) T
+            UNION ALL
+            SELECT * FROM (
+                SELECT TOP (?) {ann_columns}
+                WHERE A.FormateurID = ? {ann_where}
+                ORDER BY A.DatePublication DESC, A.AnnonceID DESC
+            ) N
+        ) Feed
+        ORDER BY DateItem DESC, Type DESC, ID DESC
+        """
+        params = (limit, limit, formateur_id) + tp_params + (limit, formateur_id) + ann_params
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+        top = None
+        if not before:
+            cursor.execute("""
+            SELECT (SELECT ISNULL(MAX(TPID), 0) FROM TP WHERE FormateurID = ?),
+                   (SELECT ISNULL(MAX(AnnonceID), 0) FROM Annonce WHERE FormateurID = ?)
+            """, (formateur_id, formateur_id))
+            top = tuple(cursor.fetchone())
+        return self._feed_page(self._formateur_items(rows), limit, newer=False, top=top)
+
+    @staticmethod
+    def _formateur_items(rows):
+        return [
+            {
+                "id": r.ID,
+                "title": r.Titre,
+                "date": str(r.DateItem)[:16],
+                "type": r.Type,
+                "group": r.NomGroupe,
+                "module": r.NomModule,
+                "thumb_url": f"/annonce_image/{r.ID}/thumb" if r.HasImage else None,
+                "cursor": encode_feed_cursor(r.DateItem, r.Type, r.ID)
+            }
+            for r in rows
+        ]
+
+    @staticmethod
+    def _feed_page(items, limit, newer, top=None):
+        # A full page of older items means there may be more below the last one
+        has_more = not newer and len(items) == limit
+        return {
+            "items": items,
+            "next_cursor": items[-1]["cursor"] if has_more else None,
+            "top_cursor": encode_since_cursor(*top) if top else None
+        }
+
+
     # --- GRADING SYSTEM ---
 
+    @read_isolation('SNAPSHOT')
     def get_submissions_for_tp(self, tp_id):
-        """ Returns list of students who submitted work for a specific TP """
+        """ Returns the latest attempt of each student who submitted work for a specific TP """
         cursor = self.conn.cursor()
+        # EstDerniere = 1 is served by the filtered index UX_Soumission_Derniere
         sql = """
-        SELECT S.SoumissionID, U.Nom, U.Prenom, S.DateSoumission, S.Note, S.FichierNom
+        SELECT S.SoumissionID, U.Nom, U.Prenom, S.DateSoumission, S.Note, S.FichierNom, S.Tentative
         FROM Soumission S
         JOIN Etudiant E ON S.EtudiantID = E.EtudiantID
         JOIN Utilisateur U ON E.EtudiantID = U.UserID
-        WHERE S.TPID = ?
+        WHERE S.TPID = ? AND S.EstDerniere = 1
         ORDER BY U.Nom
         """
         cursor.execute(sql, (tp_id,))
@@ -738,26 +1527,355 @@ class SchoolDB:
                 "student": f"{r.Nom} {r.Prenom}",
                 "date": r.DateSoumission.strftime("%d %b %H:%M"),
                 "grade": r.Note if r.Note is not None else "",
-                "file_name": r.FichierNom
+                "file_name": r.FichierNom,
+                "attempt": r.Tentative
             }
             for r in cursor.fetchall()
         ]
 
-    def get_submission_file(self, submission_id):
-        """ Downloads the student's report file """
+    def get_submission_file(self, submission_id, decoded=True):
+        """
+        Downloads the student's report file (from cold storage if the attempt was archived).
+        decoded=False: the bytes as stored, with their codec and original size (storage.py).
+        """
         cursor = self.conn.cursor()
-        cursor.execute("SELECT FichierData, FichierNom, FichierType FROM Soumission WHERE SoumissionID=?", (submission_id,))
+        sql = """
+        SELECT ISNULL(S.FichierData, A.FichierData) AS FichierData, S.FichierNom, S.FichierType, S.Codec, S.TailleOriginale
+        FROM Soumission S
+        LEFT JOIN SoumissionArchive A ON S.SoumissionID = A.SoumissionID
+        WHERE S.SoumissionID = ?
+        """
+        cursor.execute(sql, (submission_id,))
         row = cursor.fetchone()
         if row:
-            return {"data": row.FichierData, "name": row.FichierNom, "type": row.FichierType}
+            return {"data": storage.decode(row.FichierData, row.Codec) if decoded else row.FichierData,
+                    "name": row.FichierNom, "type": row.FichierType,
+                    "codec": None if decoded else row.Codec, "size": row.TailleOriginale}
         return None
 
+    def archive_old_attempts(self, batch_size=100):
+        """
+        Moves the BLOBs of superseded attempts (EstDerniere = 0) to SoumissionArchive,
+        one short transaction per batch. Safe to re-run: it resumes where it stopped.
+        Returns the number of attempts archived.
+        """
+        cursor = self.conn.cursor()
+        archived = 0
+        while True:
+            try:
+                cursor.execute(
+                    """SELECT TOP (?) SoumissionID FROM Soumission
+                       WHERE EstDerniere = 0 AND FichierData IS NOT NULL
+                       ORDER BY SoumissionID""",
+                    (batch_size,)
+                )
+                ids = [r[0] for r in cursor.fetchall()]
+                if not ids: break
+
+                marks = ", ".join("?" * len(ids))
+                cursor.execute(
+                    f"""INSERT INTO SoumissionArchive (SoumissionID, FichierData, DateArchivage)
+                        SELECT SoumissionID, FichierData, GETDATE() FROM Soumission WHERE SoumissionID IN ({marks})""",
+                    ids
+                )
+                cursor.execute(f"UPDATE Soumission SET FichierData = NULL WHERE SoumissionID IN ({marks})", ids)
+                self.conn.commit()
+                archived += len(ids)
+            except Exception as e:
+                print(f"❌ Error archiving attempts: {e}")
+                self.conn.rollback()
+                break
+        return archived
+
+    def get_submission_manifest(self, tp_id):
+        """ Metadata of the latest submission of each student (no BLOBs), for the ZIP export. """
+        cursor = self.conn.cursor()
+        sql = """
+        SELECT S.SoumissionID, U.Nom, U.Prenom, E.CNE, S.FichierNom, DATALENGTH(S.FichierData) AS Taille, S.Codec
+        FROM Soumission S
+        JOIN Etudiant E ON S.EtudiantID = E.EtudiantID
+        JOIN Utilisateur U ON E.EtudiantID = U.UserID
+        WHERE S.TPID = ? AND S.EstDerniere = 1 AND S.FichierData IS NOT NULL
+        ORDER BY U.Nom, U.Prenom, E.CNE, S.SoumissionID
+        """
+        cursor.execute(sql, (tp_id,))
+        return [
+            {"id": r.SoumissionID, "nom": r.Nom, "prenom": r.Prenom, "cne": r.CNE,
+             "file_name": r.FichierNom, "size": r.Taille or 0, "codec": r.Codec}
+            for r in cursor.fetchall()
+        ]
+
+    def iter_submission_file(self, submission_id, size, codec=None, chunk_size=1024 * 1024):
+        """
+        Yields a report file in chunks (SUBSTRING on the VARBINARY), so a large file
+        is never fully loaded in memory. size: stored size; codec: decompressed on the fly.
+        """
+        return storage.iter_decoded(self._iter_blob(submission_id, size, chunk_size), codec)
+
+    def _iter_blob(self, submission_id, size, chunk_size):
+        cursor = self.conn.cursor()
+        offset = 1  # SUBSTRING is 1-based
+        while offset <= size:
+            cursor.execute("SELECT SUBSTRING(FichierData, ?, ?) FROM Soumission WHERE SoumissionID = ?",
+                           (offset, chunk_size, submission_id))
+            row = cursor.fetchone()
+            if not row or not row[0]: break
+            yield bytes(row[0])
+            offset += chunk_size
+
+    # --- STORED FILE COMPRESSION (storage.py) ---
+    def get_storage_report(self):
+        """
+        Files, stored bytes and original bytes per table and codec ('none' = as uploaded),
+        archived attempts and archived years included.
+        """
+        cursor = self.conn.cursor()
+        sql = """
+        SELECT Tableau, ISNULL(Codec, 'none') AS Codec, COUNT(*) AS Fichiers,
+               SUM(CAST(DATALENGTH(Donnees) AS BIGINT)) AS Stocke,
+               SUM(ISNULL(TailleOriginale, CAST(DATALENGTH(Donnees) AS BIGINT))) AS Original
+        FROM (
+            SELECT 'TP' AS Tableau, Codec, TailleOriginale, FichierData AS Donnees FROM TP
+            UNION ALL
+            SELECT 'Soumission', S.Codec, S.TailleOriginale, ISNULL(S.FichierData, A.FichierData)
+            FROM Soumission S LEFT JOIN SoumissionArchive A ON S.SoumissionID = A.SoumissionID
+            UNION ALL
+            SELECT 'TPHist', Codec, TailleOriginale, FichierData FROM TPHist
+            UNION ALL
+            SELECT 'SoumissionHist', Codec, TailleOriginale, FichierData FROM SoumissionHist
+        ) F
+        WHERE Donnees IS NOT NULL
+        GROUP BY Tableau, Codec
+        ORDER BY Tableau, Codec
+        """
+        try:
+            cursor.execute(sql)
+            return [{"table": r.Tableau, "codec": r.Codec, "files": r.Fichiers, "stored_bytes": r.Stocke or 0,
+                     "original_bytes": r.Original or 0, "saved_bytes": (r.Original or 0) - (r.Stocke or 0)}
+                    for r in cursor.fetchall()]
+        except Exception as e:
+            print(f"❌ Error building storage report: {e}")
+            return []
+
+    def get_uncompressed_files(self, kind, after_id=0, limit=100):
+        """ [(id, name, type)] of the files of one kind ('tp' / 'submission') still stored as uploaded. """
+        table, id_col = ("TP", "TPID") if kind == 'tp' else ("Soumission", "SoumissionID")
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"""SELECT TOP (?) {id_col}, FichierNom, FichierType FROM {table}
+                WHERE Codec IS NULL AND FichierData IS NOT NULL AND {id_col} > ? ORDER BY {id_col}""",
+            (limit, after_id)
+        )
+        return [(r[0], r[1], r[2]) for r in cursor.fetchall()]
+
+    @write_transaction
+    def compress_stored_file(self, kind, item_id):
+        """
+        Rewrites one file stored as uploaded in compressed form, if its format compresses.
+        Returns (original bytes, stored bytes), or None if left as it is (or on error).
+        """
+        table, id_col = ("TP", "TPID") if kind == 'tp' else ("Soumission", "SoumissionID")
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f"""SELECT FichierData, FichierNom, FichierType FROM {table} WITH (UPDLOCK)
+                    WHERE {id_col} = ? AND Codec IS NULL""",
+                (item_id,)
+            )
+            row = cursor.fetchone()
+            if not row or row.FichierData is None:
+                self.conn.rollback()
+                return None
+            data = bytes(row.FichierData)
+            stored = storage.encode(data, row.FichierNom, row.FichierType)
+            if stored.codec is None:
+                self.conn.rollback()
+                return None
+            cursor.execute(
+                f"UPDATE {table} SET FichierData = ?, Codec = ?, TailleOriginale = ? WHERE {id_col} = ?",
+                (_pyodbc().Binary(stored.data), stored.codec, len(data), item_id)
+            )
+            self.conn.commit()
+            return len(data), len(stored.data)
+        except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
+            print(f"❌ Error compressing {kind} {item_id}: {e}")
+            return None
+
+    # --- ACADEMIC YEAR ARCHIVAL (archive.py) ---
+    # One batch of one step; every statement declares @n (batch size), @annee, @debut, @fin
+    _ARCHIVE_SQL = {
+        "presence": """
+            DELETE TOP (@n) P
+            OUTPUT deleted.PresenceID, deleted.SeanceID, deleted.EtudiantID, deleted.Etat, deleted.DateEnregistrement, @annee
+            INTO PresenceHist (PresenceID, SeanceID, EtudiantID, Etat, DateEnregistrement, Annee)
+            FROM Presence P JOIN Seance S ON P.SeanceID = S.SeanceID
+            WHERE S.DateDebut >= @debut AND S.DateDebut < @fin;
+            SELECT @@ROWCOUNT;""",
+        "seance": """
+            DELETE TOP (@n) FROM Seance
+            OUTPUT deleted.SeanceID, deleted.DateDebut, deleted.DateFin, deleted.Salle,
+                   deleted.ModuleID, deleted.FormateurID, deleted.GroupeID, @annee
+            INTO SeanceHist (SeanceID, DateDebut, DateFin, Salle, ModuleID, FormateurID, GroupeID, Annee)
+            WHERE DateDebut >= @debut AND DateDebut < @fin;
+            SELECT @@ROWCOUNT;""",
+        # Superseded attempts get their cold BLOB back; deleting the row cascades to SoumissionArchive
+        "soumission": """
+            DECLARE @ids TABLE (ID INT PRIMARY KEY);
+            INSERT INTO @ids
+            SELECT TOP (@n) S.SoumissionID FROM Soumission S JOIN TP T ON S.TPID = T.TPID
+            WHERE T.DateLimite >= @debut AND T.DateLimite < @fin;
+            INSERT INTO SoumissionHist (SoumissionID, TPID, EtudiantID, LienRapport, FichierData, FichierNom, FichierType,
+                                        DateSoumission, Note, Tentative, EstDerniere, Empreinte, NbPages,
+                                        Codec, TailleOriginale, Annee)
+            SELECT S.SoumissionID, S.TPID, S.EtudiantID, S.LienRapport, ISNULL(S.FichierData, A.FichierData),
+                   S.FichierNom, S.FichierType, S.DateSoumission, S.Note, S.Tentative, S.EstDerniere,
+                   S.Empreinte, S.NbPages, S.Codec, S.TailleOriginale, @annee
+            FROM Soumission S LEFT JOIN SoumissionArchive A ON A.SoumissionID = S.SoumissionID
+            WHERE S.SoumissionID IN (SELECT ID FROM @ids);
+            DELETE FROM Soumission WHERE SoumissionID IN (SELECT ID FROM @ids);
+            SELECT COUNT(*) FROM @ids;""",
+        "tp": """
+            DELETE TOP (@n) FROM TP
+            OUTPUT deleted.TPID, deleted.Titre, deleted.Description, deleted.FichierData, deleted.FichierNom,
+                   deleted.FichierType, deleted.DateLimite, deleted.ModuleID, deleted.FormateurID,
+                   deleted.GroupeID, deleted.Empreinte, deleted.NbPages, deleted.Codec, deleted.TailleOriginale, @annee
+            INTO TPHist (TPID, Titre, Description, FichierData, FichierNom, FichierType, DateLimite,
+                         ModuleID, FormateurID, GroupeID, Empreinte, NbPages, Codec, TailleOriginale, Annee)
+            WHERE DateLimite >= @debut AND DateLimite < @fin;
+            SELECT @@ROWCOUNT;""",
+    }
+    _ARCHIVE_CHANGES = {"presence": "presence", "seance": "presence", "soumission": "submissions", "tp": "tps"}
+
+    def get_archive_progress(self, annee=None):
+        """ ArchivageAnnee rows: [{year, step, moved, status, started, updated}], newest year first. """
+        cursor = self.conn.cursor()
+        sql = "SELECT Annee, Etape, Deplaces, Statut, DateDebut, DateMaj FROM ArchivageAnnee"
+        params = ()
+        if annee is not None:
+            sql += " WHERE Annee = ?"
+            params = (annee,)
+        try:
+            cursor.execute(sql + " ORDER BY Annee DESC, DateDebut", params)
+            return [{"year": r.Annee, "step": r.Etape, "moved": r.Deplaces, "status": r.Statut,
+                     "started": str(r.DateDebut)[:16], "updated": str(r.DateMaj)[:16]}
+                    for r in cursor.fetchall()]
+        except Exception as e:
+            print(f"❌ Error reading archive progress: {e}")
+            return []
+
+    @write_transaction
+    def _archive_batch(self, annee, step, batch_size):
+        """
+        Moves one batch of `step` for academic year `annee` and records it in ArchivageAnnee,
+        in the same transaction (a crash never loses or double-counts a batch).
+        Returns the number of rows moved (0 = step finished), or None on error.
+        """
+        cursor = self.conn.cursor()
+        debut, fin = archive.year_bounds(annee)
+        try:
+            cursor.execute(
+                "SET NOCOUNT ON; DECLARE @n INT = ?, @annee INT = ?, @debut DATETIME = ?, @fin DATETIME = ?;"
+                + self._ARCHIVE_SQL[step],
+                (batch_size, annee, debut, fin)
+            )
+            moved = cursor.fetchone()[0]
+            cursor.execute(
+                """UPDATE ArchivageAnnee
+                   SET Deplaces = Deplaces + ?, Statut = CASE WHEN ? = 0 THEN 'termine' ELSE Statut END, DateMaj = GETDATE()
+                   WHERE Annee = ? AND Etape = ?""",
+                (moved, moved, annee, step)
+            )
+            self._commit(**({self._ARCHIVE_CHANGES[step]: None} if moved else {}))
+            return moved
+        except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
+            print(f"❌ Error archiving {step} of {annee}: {e}")
+            return None
+
+    def archive_academic_year(self, annee, batch_size=1000, max_seconds=300):
+        """
+        Moves academic year `annee` (must be closed: archive.is_closed) to the *Hist tables,
+        step by step (archive.STEPS), one short transaction per batch.
+        Resumable: finished steps are skipped and a step restarts with what is left.
+        Stops after max_seconds; returns {"done": bool, "moved": {step: rows this run}, "error": bool}.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("SELECT Etape FROM ArchivageAnnee WHERE Annee = ? AND Statut = 'termine'", (annee,))
+            finished = {r[0] for r in cursor.fetchall()}
+        except Exception as e:
+            print(f"❌ Error reading archive progress: {e}")
+            return {"done": False, "moved": {}, "error": True}
+
+        started = time.monotonic()
+        moved = {}
+        for step in archive.STEPS:
+            if step in finished: continue
+            try:
+                cursor.execute(
+                    """IF NOT EXISTS (SELECT 1 FROM ArchivageAnnee WHERE Annee = ? AND Etape = ?)
+                       INSERT INTO ArchivageAnnee (Annee, Etape) VALUES (?, ?)""",
+                    (annee, step, annee, step)
+                )
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                print(f"❌ Error starting archive step {step}: {e}")
+                return {"done": False, "moved": moved, "error": True}
+
+            moved[step] = 0
+            while True:
+                n = self._archive_batch(annee, step, batch_size)
+                if n is None:
+                    return {"done": False, "moved": moved, "error": True}
+                moved[step] += n
+                if n == 0: break
+                if time.monotonic() - started > max_seconds:
+                    return {"done": False, "moved": moved, "error": False}
+        return {"done": True, "moved": moved, "error": False}
+
+    @write_transaction
+    def save_grades_bulk(self, grades, batch_size=500):
+        """
+        Applies many grades in ONE transaction with set-based UPDATEs.
+        grades = [(submission_id, grade), ...] (already validated); if an id is repeated the
+        last grade wins (one VALUES row per id, so the UPDATE is deterministic).
+        Returns the set of SoumissionIDs that were actually updated, or None on error.
+        """
+        grades = list(dict((int(sub_id), grade) for sub_id, grade in grades).items())
+        cursor = self.conn.cursor()
+        updated = set()
+        try:
+            # 2 params per row; stay well under SQL Server's 2100-parameter limit
+            for start in range(0, len(grades), batch_size):
+                batch = grades[start:start + batch_size]
+                values_sql = ", ".join(["(?, ?)"] * len(batch))
+                sql = f"""
+                UPDATE S SET S.Note = V.Note
+                OUTPUT inserted.SoumissionID
+                FROM Soumission S
+                JOIN (VALUES {values_sql}) AS V(SoumissionID, Note) ON S.SoumissionID = V.SoumissionID
+                """
+                params = [p for sub_id, grade in batch for p in (sub_id, grade)]
+                cursor.execute(sql, params)
+                updated.update(r[0] for r in cursor.fetchall())
+            self._commit(submissions=updated)
+            return updated
+        except Exception as e:
+            self.conn.rollback()
+            raise_if_retryable(self, e)
+            print(f"Error saving grades: {e}")
+            return None
+
     def save_grade(self, submission_id, grade):
         """ Updates the grade for a student submission """
         cursor = self.conn.cursor()
         try:
             cursor.execute("UPDATE Soumission SET Note = ? WHERE SoumissionID = ?", (grade, submission_id))
-            self.conn.commit()
+            self._commit(submissions=[submission_id])
             return True
         except Exception as e:
             print(f"Error saving grade: {e}")
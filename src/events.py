@@ -0,0 +1,113 @@
+import os
+import json
+import queue
+import threading
+import time
+
+try:
+    from settings import get_settings
+except ImportError:  # imported as src.* by the root-level scripts
+    from src.settings import get_settings
+
+
+def group_channel(groupe_id):
+    """ Channel name that students of one group listen on. """
+    return f"group-{groupe_id}"
+
+
+class EventBroker:
+    """
+    In-process pub/sub used to push 'new TP / new announcement' notifications
+    to the SSE streams. Each subscriber gets its own bounded queue.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subs = self._subscribers.get(channel)
+            if subs:
+                subs.discard(q)
+                if not subs: del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        self._dispatch(channel, event)
+
+    def _dispatch(self, channel, event):
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # Slow client: it will resync from the feed on reconnect
+                pass
+
+
+class FileEventBroker(EventBroker):
+    """
+    Stand-in for a real pub/sub when running several workers on one host:
+    publish() appends a JSON line to a shared spool file and every worker
+    tails that file and dispatches the lines to its own subscribers.
+    """
+
+    def __init__(self, path, poll_interval=0.5, max_queue=100):
+        super().__init__(max_queue)
+        self.path = path
+        self.poll_interval = poll_interval
+        self._tail_thread = None
+
+    def subscribe(self, channel):
+        self._ensure_tail()
+        return super().subscribe(channel)
+
+    def publish(self, channel, event):
+        line = json.dumps({"channel": channel, "event": event}) + "\n"
+        # O_APPEND keeps short lines from different workers from interleaving
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    def _ensure_tail(self):
+        with self._lock:
+            if self._tail_thread is None:
+                self._tail_thread = threading.Thread(target=self._tail, name="event-tail", daemon=True)
+                self._tail_thread.start()
+
+    def _tail(self):
+        open(self.path, 'ab').close()
+        with open(self.path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # Nothing new (or a line still being written): rewind and wait
+                    f.seek(-len(line), os.SEEK_CUR)
+                    time.sleep(self.poll_interval)
+                    continue
+                try:
+                    msg = json.loads(line.decode('utf-8'))
+                    self._dispatch(msg["channel"], msg["event"])
+                except (ValueError, KeyError):
+                    continue
+
+
+def _make_broker():
+    settings = get_settings()
+    if settings.event_broker == 'file':
+        return FileEventBroker(settings.event_spool_path)
+    return EventBroker()
+
+
+broker = _make_broker()
@@ -0,0 +1,192 @@
+import io
+import os
+import csv
+from decimal import Decimal
+from datetime import date, datetime
+
+try:
+    import archive
+except ImportError:  # imported as src.exports by export_data.py
+    from src import archive
+
+
+def _arrow():
+    """ (pyarrow, pyarrow.parquet), imported on the first Parquet/Arrow export; None if not installed. """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # optional: CSV export works without it
+        return None
+    return pa, pq
+
+
+def arrow_available():
+    return _arrow() is not None
+
+# Whole-year extracts for offline analysis.
+# Rows come from a forward-only cursor in fetchmany() batches and each batch
+# is written out before the next is fetched, so a year of data never sits in memory.
+# Table names are placeholders (archive.tables): closed years are only read with historical=True.
+
+DATASETS = {
+    "attendance": """
+        SELECT S.SeanceID, S.DateDebut, S.DateFin, F.NomFiliere, S.GroupeID, G.NomGroupe,
+               S.ModuleID, M.NomModule, S.FormateurID, P.EtudiantID, E.CNE, P.Etat, P.DateEnregistrement
+        FROM {Presence} P
+        JOIN {Seance} S ON P.SeanceID = S.SeanceID
+        JOIN Etudiant E ON P.EtudiantID = E.EtudiantID
+        JOIN Groupe G ON S.GroupeID = G.GroupeID
+        JOIN Filiere F ON G.FiliereID = F.FiliereID
+        JOIN Module M ON S.ModuleID = M.ModuleID
+        WHERE S.DateDebut >= ? AND S.DateDebut < ?
+        ORDER BY S.DateDebut, S.SeanceID
+    """,
+    "grades": """
+        SELECT T.TPID, T.Titre, T.DateLimite, T.ModuleID, M.NomModule, T.GroupeID, G.NomGroupe, T.FormateurID,
+               S.SoumissionID, S.EtudiantID, E.CNE, S.DateSoumission, S.Tentative, S.EstDerniere, S.Note
+        FROM {Soumission} S
+        JOIN {TP} T ON S.TPID = T.TPID
+        JOIN Etudiant E ON S.EtudiantID = E.EtudiantID
+        JOIN Groupe G ON T.GroupeID = G.GroupeID
+        JOIN Module M ON T.ModuleID = M.ModuleID
+        WHERE S.DateSoumission >= ? AND S.DateSoumission < ?
+        ORDER BY S.DateSoumission, S.SoumissionID
+    """,
+}
+
+FORMATS = ("csv", "parquet", "arrow")
+
+
+class Columns(list):
+    """ Column names of a batch; .types holds the Python type of each (pyodbc cursor.description). """
+
+    def __init__(self, description):
+        super().__init__(c[0] for c in description)
+        self.types = [c[1] for c in description]
+
+
+def iter_batches(conn, dataset, start, end, batch_size=5000, historical=False):
+    """
+    Yields (columns, rows) batches of one dataset for start <= date < end.
+    historical=True also reads the archived academic years.
+    """
+    cursor = conn.cursor()
+    cursor.execute(DATASETS[dataset].format(**archive.tables(historical)), (start, end))
+    columns = Columns(cursor.description)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows: break
+        yield columns, [tuple(r) for r in rows]
+
+
+def month_windows(start, end):
+    """ Splits [start, end) into calendar-month windows: [(label, from, to), ...]. """
+    windows = []
+    current = date(start.year, start.month, 1)
+    while current < end:
+        nxt = date(current.year + (current.month == 12), current.month % 12 + 1, 1)
+        windows.append((current.strftime("%Y-%m"), max(current, start), min(nxt, end)))
+        current = nxt
+    return windows
+
+
+def csv_chunks(batches):
+    """ Generator of CSV text chunks (header + one chunk per batch), for streaming responses. """
+    header_done = False
+    for columns, rows in batches:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        if not header_done:
+            writer.writerow(columns)
+            header_done = True
+        writer.writerows(rows)
+        yield out.getvalue()
+
+
+def write_file(batches, path, fmt):
+    """ Writes batches to a CSV / Parquet / Arrow IPC file, one batch at a time. Returns the row count. """
+    arrow = _arrow() if fmt != "csv" else None
+    if fmt != "csv" and arrow is None:
+        raise RuntimeError("pyarrow is required for Parquet/Arrow exports")
+
+    count = 0
+    if fmt == "csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for columns, rows in batches:
+                if count == 0: writer.writerow(columns)
+                writer.writerows(rows)
+                count += len(rows)
+        return count
+
+    pa, pq = arrow
+    writer, schema = None, None
+    try:
+        for columns, rows in batches:
+            if writer is None:
+                # From the column types, not the first batch: a column that is all NULL there
+                # (e.g. Note before grading) must not become a null-typed column
+                schema = arrow_schema(pa, columns)
+                writer = pq.ParquetWriter(path, schema) if fmt == "parquet" else pa.ipc.new_file(path, schema)
+            # Column-wise conversion of just this batch
+            arrays = {name: [_plain(r[i]) for r in rows] for i, name in enumerate(columns)}
+            writer.write_table(pa.table(arrays, schema=schema))
+            count += len(rows)
+    finally:
+        if writer is not None: writer.close()
+    return count
+
+
+def arrow_schema(pa, columns):
+    """ Arrow schema of a batch's columns (Columns); unknown or missing types are read as strings. """
+    arrow_types = {
+        bool: pa.bool_(), int: pa.int64(), float: pa.float64(), Decimal: pa.float64(),
+        str: pa.string(), datetime: pa.timestamp("ms"), date: pa.date32(),
+        bytes: pa.binary(), bytearray: pa.binary(),
+    }
+    types = getattr(columns, "types", None) or [None] * len(columns)
+    return pa.schema([pa.field(name, arrow_types.get(t, pa.string())) for name, t in zip(columns, types)])
+
+
+def _plain(value):
+    # pyodbc returns Decimal for NUMERIC columns; floats keep the Arrow schema simple
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def export_dataset(conn, dataset, start, end, fmt, out_dir, partition="month", batch_size=5000, historical=False):
+    """
+    Writes one file per partition (month, or a single file with partition=None)
+    into out_dir/<dataset>/. Returns [(path, rows), ...].
+    historical=True: windows before the current academic year also read the archived years.
+    """
+    target = os.path.join(out_dir, dataset)
+    os.makedirs(target, exist_ok=True)
+    windows = month_windows(start, end) if partition == "month" else [(f"{start}_{end}", start, end)]
+
+    written = []
+    ext = "arrow" if fmt == "arrow" else fmt
+    for label, w_start, w_end in windows:
+        path = os.path.join(target, f"{label}.{ext}")
+        # Months of the open year stay on the operational tables
+        window_history = historical and needs_history(w_start)
+        rows = write_file(iter_batches(conn, dataset, w_start, w_end, batch_size, window_history), path, fmt)
+        if rows == 0:
+            if os.path.exists(path): os.remove(path)
+            continue
+        written.append((path, rows))
+    return written
+
+
+def parse_date(text, default=None):
+    if not text: return default
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def academic_year_bounds(today=None):
+    """ Sept 1st -> Sept 1st of the current academic year. """
+    return archive.year_bounds(archive.year_of(today or date.today()))
+
+
+def needs_history(start, today=None):
+    """ True when [start, ...) reaches into a year that may have been archived. """
+    return start < academic_year_bounds(today)[0]
@@ -0,0 +1,115 @@
+import time
+import threading
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+import versions
+from settings import get_settings
+
+# Template fragment cache.
+#
+#   {% cache "admin_users", "users assignments" %} ... {% endcache %}
+#   {% cache "formateur_history", "tps annonces", session.user_id %} ... {% endcache %}
+#
+# First argument: fragment name. Second: the tables (see versions.TABLES) the
+# fragment is built from. Any further arguments vary the key (e.g. per user).
+# The rendered HTML is reused while those tables keep the same data version and
+# the entry is younger than FRAGMENT_CACHE_TTL seconds.
+#
+# Views pass their data as Lazy(...) values so a cache hit never runs the queries.
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_stats = {}
+
+
+class Lazy:
+    """ A value loaded on first use: iterate it, index it, test it or print it and it loads. """
+    __slots__ = ("_load", "_value", "_loaded")
+
+    def __init__(self, load):
+        self._load = load
+        self._loaded = False
+        self._value = None
+
+    def get(self):
+        if not self._loaded:
+            self._value = self._load()
+            self._loaded = True
+        return self._value
+
+    def then(self, fn):
+        """ Lazy view derived from this one (e.g. one key of a dict result). """
+        return Lazy(lambda: fn(self.get()))
+
+    def __iter__(self): return iter(self.get())
+    def __len__(self): return len(self.get())
+    def __bool__(self): return bool(self.get())
+    def __getitem__(self, key): return self.get()[key]
+    def __contains__(self, item): return item in self.get()
+    def __getattr__(self, name): return getattr(self.get(), name)
+    def __str__(self): return str(self.get())
+
+
+def _record(name, hit, render_ms=0.0):
+    s = _stats.setdefault(name, {"hits": 0, "misses": 0, "render_ms": 0.0})
+    s["hits" if hit else "misses"] += 1
+    s["render_ms"] += render_ms
+
+
+def render(name, tables, vary, caller):
+    settings = get_settings()
+    key = (name, tuple(tables), versions.get(*tables), tuple(str(v) for v in vary))
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and now - entry[1] < settings.fragment_cache_ttl:
+            _cache.move_to_end(key)
+            _record(name, True)
+            return Markup(entry[0])
+
+    started = time.perf_counter()
+    html = str(caller())
+    elapsed = (time.perf_counter() - started) * 1000
+    with _lock:
+        _cache[key] = (html, now)
+        _cache.move_to_end(key)
+        while len(_cache) > settings.fragment_cache_entries:
+            _cache.popitem(last=False)
+        _record(name, False, elapsed)
+    return Markup(html)
+
+
+class FragmentCacheExtension(Extension):
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, args, caller):
+        name, tables, *vary = args
+        return render(name, tables.split(), vary, caller)
+
+
+def stats():
+    """ Hits, misses, hit rate and average render time (of misses) per fragment. """
+    with _lock:
+        report = {}
+        for name, s in _stats.items():
+            total = s["hits"] + s["misses"]
+            report[name] = dict(s, render_ms=round(s["render_ms"], 1),
+                                hit_rate=round(s["hits"] * 100.0 / total, 1) if total else None,
+                                avg_render_ms=round(s["render_ms"] / s["misses"], 2) if s["misses"] else None)
+        return {"entries": len(_cache), "versions": versions.snapshot(), "fragments": report}
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
@@ -0,0 +1,197 @@
+import io
+import re
+import time
+import sqlite3
+import functools
+
+from settings import get_settings
+
+# Full-text search over TP subjects and submission reports.
+#
+# The 'file_metadata' job hashes every upload; index_file() then extracts the
+# PDF text once per content hash (a subject uploaded to five groups, or a report
+# resubmitted unchanged, is extracted once) and stores it in the configured index:
+#
+#   FULLTEXT_BACKEND=sqlite     FTS5 table in a local file (FULLTEXT_PATH), for development
+#   FULLTEXT_BACKEND=sqlserver  TexteDocument + SQL Server full-text index (migration 045)
+#
+# search() finds the matching hashes and SchoolDB.search_documents() maps them
+# back to the TPs / reports the user is allowed to see.
+
+MAX_CHARS = 1_000_000  # per document; the start of a long PDF is what people search for
+MAX_TERMS = 8
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def extract_text(data):
+    """
+    Text of a PDF ('' for a scan without a text layer), or None when it is not a
+    PDF or pypdf is not installed (the file is then retried by the backfill job).
+    """
+    if not data or not bytes(data[:5]).startswith(b"%PDF"):
+        return None
+    try:
+        from pypdf import PdfReader
+    except ImportError:  # optional dependency
+        return None
+    parts, size = [], 0
+    try:
+        for page in PdfReader(io.BytesIO(bytes(data))).pages:
+            text = page.extract_text() or ""
+            parts.append(text)
+            size += len(text)
+            if size >= MAX_CHARS:
+                break
+    except Exception as e:  # damaged PDF: keep what was read
+        print(f"⚠️ PDF text extraction stopped: {e}")
+    return re.sub(r"\s+", " ", " ".join(parts)).strip()[:MAX_CHARS]
+
+
+def _terms(text):
+    return _WORD.findall(text or "")[:MAX_TERMS]
+
+
+def fts5_query(text):
+    """ User input -> FTS5 MATCH expression: every word, as a prefix ("rése"* "tcp"*). """
+    return " ".join(f'"{t}"*' for t in _terms(text))
+
+
+def contains_query(text):
+    """ User input -> SQL Server CONTAINS expression ("rése*" AND "tcp*"). """
+    return " AND ".join(f'"{t}*"' for t in _terms(text))
+
+
+class SqliteIndex:
+    """ FTS5 index in a local SQLite file; the rowid ties the text to its hash. """
+    backend = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS extracted (
+                id INTEGER PRIMARY KEY,
+                empreinte TEXT NOT NULL UNIQUE,
+                chars INTEGER NOT NULL,
+                extracted_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(contenu, tokenize = 'unicode61 remove_diacritics 2')")
+        return conn
+
+    def has(self, db, sha256):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM extracted WHERE empreinte = ?", (sha256,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def store(self, db, sha256, text):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute("INSERT OR IGNORE INTO extracted (empreinte, chars, extracted_at) VALUES (?,?,?)",
+                               (sha256, len(text), time.time()))
+            if cur.rowcount:
+                conn.execute("INSERT INTO documents (rowid, contenu) VALUES (?, ?)", (cur.lastrowid, text))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def match(self, text, limit, offset=0):
+        """ [(sha256, snippet)] best first, from the offset-th match. """
+        query = fts5_query(text)
+        if not query:
+            return []
+        conn = self._connect()
+        try:
+            return conn.execute("""
+                SELECT e.empreinte, snippet(documents, 0, '[', ']', '…', 16)
+                FROM documents JOIN extracted e ON e.id = documents.rowid
+                WHERE documents MATCH ?
+                ORDER BY rank LIMIT ? OFFSET ?
+            """, (query, limit, offset)).fetchall()
+        finally:
+            conn.close()
+
+    def stats(self):
+        conn = self._connect()
+        try:
+            count, chars = conn.execute("SELECT COUNT(*), COALESCE(SUM(chars), 0) FROM extracted").fetchone()
+        finally:
+            conn.close()
+        return {"backend": self.backend, "documents": count, "chars": chars}
+
+
+class SqlServerIndex:
+    """ TexteDocument table with a SQL Server full-text index (migration 045). """
+    backend = "sqlserver"
+
+    def has(self, db, sha256):
+        return db.has_document_text(sha256)
+
+    def store(self, db, sha256, text):
+        db.save_document_text(sha256, text)
+
+    def stats(self):
+        return {"backend": self.backend}
+
+
+@functools.lru_cache(maxsize=None)
+def get_index():
+    settings = get_settings()
+    if settings.fulltext_backend == "sqlserver":
+        return SqlServerIndex()
+    if settings.fulltext_backend != "sqlite":
+        raise ValueError(f"Unknown FULLTEXT_BACKEND '{settings.fulltext_backend}' (sqlite or sqlserver)")
+    return SqliteIndex(settings.fulltext_path)
+
+
+def index_file(db, sha256, data):
+    """ Extracts and stores the text of one file unless its hash is already indexed. True if it was added. """
+    index = get_index()
+    if index.has(db, sha256):
+        return False
+    text = extract_text(data)
+    if text is None:
+        return False
+    index.store(db, sha256, text)
+    return True
+
+
+def search(db, text, role, user_id, groupe_id=None, limit=20):
+    """ Files visible to this user whose text matches, best first, with a snippet of the match. """
+    index = get_index()
+    if index.backend == "sqlserver":
+        terms = _terms(text)
+        query = contains_query(text)
+        return db.search_documents(role, user_id, groupe_id, contains=query, snippet_term=terms[0] if terms else None,
+                                   limit=limit) if query else []
+
+    # The index knows nothing of scopes: read the matches page by page (pages growing,
+    # as most of them may belong to files outside this user's scope) until `limit`
+    # visible files are found or the matches run out
+    found, offset, page = [], 0, limit * 5
+    while len(found) < limit:
+        hits = index.match(text, page, offset)
+        if not hits:
+            break
+        snippets = {sha: snippet for sha, snippet in hits}
+        order = {sha: i for i, (sha, _) in enumerate(hits)}
+        visible = db.search_documents(role, user_id, groupe_id, hashes=list(snippets))
+        visible.sort(key=lambda d: order[d["sha256"]])
+        for doc in visible:
+            doc["snippet"] = snippets[doc["sha256"]]
+        found.extend(visible)
+        if len(hits) < page:
+            break
+        offset += page
+        page *= 2
+    return found[:limit]
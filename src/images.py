@@ -0,0 +1,56 @@
+import io
+import hashlib
+
+
+# Variant name -> bounding box. Images are only ever shrunk, never upscaled.
+VARIANTS = {
+    "thumb": (320, 320),
+    "display": (1280, 1280),
+}
+JPEG_QUALITY = 82
+
+
+def build_variants(image_bytes):
+    """
+    Produces the downscaled, recompressed variants of an uploaded announcement image.
+    Returns {name: {"data", "width", "height", "type", "etag"}}, or {} when Pillow
+    is missing or the bytes are not a readable image.
+    """
+    try:
+        # Imported here so web workers that never resize images do not load Pillow
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow is optional: without it announcements keep only the original image
+        return {}
+    if not image_bytes:
+        return {}
+
+    try:
+        source = Image.open(io.BytesIO(image_bytes))
+        # Phone photos carry their rotation in EXIF; bake it in before resizing
+        source = ImageOps.exif_transpose(source)
+        if source.mode in ("RGBA", "LA", "P"):
+            source = source.convert("RGBA")
+            flat = Image.new("RGB", source.size, (255, 255, 255))
+            flat.paste(source, mask=source.split()[-1])
+            source = flat
+        elif source.mode != "RGB":
+            source = source.convert("RGB")
+    except Exception as e:
+        print(f"⚠️ Could not decode announcement image: {e}")
+        return {}
+
+    variants = {}
+    for name, box in VARIANTS.items():
+        img = source.copy()
+        img.thumbnail(box, Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        data = out.getvalue()
+        variants[name] = {
+            "data": data,
+            "width": img.width,
+            "height": img.height,
+            "type": "image/jpeg",
+            "etag": hashlib.sha1(data).hexdigest(),
+        }
+    return variants
@@ -0,0 +1,191 @@
+import re
+import time
+import random
+import sqlite3
+import functools
+import threading
+
+try:
+    from settings import get_settings
+except ImportError:  # imported as src.* by the root-level scripts
+    from src.settings import get_settings
+
+# Per-method transaction settings for SchoolDB.
+#
+# Reads (@read_isolation) run under SNAPSHOT: they see the last committed data
+# and never wait on the row locks taken by presence saves or uploads. If the
+# database does not allow snapshot isolation they fall back to READ COMMITTED,
+# which is also non-blocking once READ_COMMITTED_SNAPSHOT is on (migration 038).
+#
+# Writes (@write_transaction) are kept short: a LOCK_TIMEOUT bounds how long they
+# queue behind another writer, and deadlock victims / lock timeouts are retried
+# with jittered backoff.
+#
+#   DB_LOCK_TIMEOUT_MS     max wait for a lock in write methods (default 5000)
+#   DB_WRITE_RETRIES       extra attempts after a deadlock or lock timeout (default 3)
+#   DB_SLOW_READ_MS        reads slower than this are counted as slow (default 500)
+#   DB_TRACK_LOCK_WAITS    sample the session's lock waits around each read (default 1)
+
+DEADLOCK, LOCK_TIMEOUT, SNAPSHOT_CONFLICT = 1205, 1222, 3960
+RETRYABLE = {DEADLOCK, LOCK_TIMEOUT, SNAPSHOT_CONFLICT}
+
+stats = {
+    "reads": 0, "slow_reads": 0, "reads_waited": 0, "read_lock_waits": 0, "read_lock_wait_ms": 0,
+    "reads_ended_open_tx": 0, "reads_in_write": 0,
+    "writes": 0, "deadlocks": 0, "lock_timeouts": 0, "snapshot_conflicts": 0, "retries": 0, "gave_up": 0,
+}
+_stats_lock = threading.Lock()
+_snapshot = {"allowed": None}
+_lock_waits_off = threading.Event()  # set when the DMV is not readable
+
+_ERROR_NUMBER = re.compile(r"\((\d{4,5})\)")
+
+# Cumulative lock waits (LCK_M_*) of the current session; own-session rows need no extra permission
+_LOCK_WAITS_SQL = """
+SELECT ISNULL(SUM(waiting_tasks_count), 0), ISNULL(SUM(wait_time_ms), 0)
+FROM sys.dm_exec_session_wait_stats
+WHERE session_id = @@SPID AND wait_type LIKE 'LCK[_]M[_]%'
+"""
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            stats[key] += value
+
+
+def sql_error_number(exc):
+    """ Native SQL Server error number of a pyodbc error ('... (1205) (SQLExecDirectW)'), or None. """
+    for arg in getattr(exc, 'args', ()):
+        for match in _ERROR_NUMBER.findall(str(arg)):
+            if int(match) in RETRYABLE:
+                return int(match)
+    return None
+
+
+def is_retryable(exc):
+    return sql_error_number(exc) is not None
+
+
+def raise_if_retryable(db, exc):
+    """
+    Called from a write method's except block, after its rollback: lets a deadlock or
+    lock timeout reach @write_transaction for another attempt. On the last attempt the
+    method reports the error the usual way.
+    """
+    if is_retryable(exc):
+        if getattr(db, '_retries_left', 0) > 0:
+            raise exc
+        _count(gave_up=1)
+
+
+def _is_sql_server(conn):
+    # The local sqlite replica (replica.py) has no isolation levels to set
+    return conn is not None and not isinstance(conn, sqlite3.Connection)
+
+
+def _snapshot_allowed(cursor):
+    if _snapshot["allowed"] is None:
+        cursor.execute("SELECT snapshot_isolation_state FROM sys.databases WHERE name = DB_NAME()")
+        row = cursor.fetchone()
+        _snapshot["allowed"] = bool(row and row[0] == 1)
+    return _snapshot["allowed"]
+
+
+def _lock_waits(cursor):
+    try:
+        cursor.execute(_LOCK_WAITS_SQL)
+        row = cursor.fetchone()
+        return int(row[0]), int(row[1])
+    except Exception as e:
+        print(f"⚠️ Lock wait tracking disabled: {e}")
+        _lock_waits_off.set()
+        return None
+
+
+def read_isolation(level='SNAPSHOT'):
+    """
+    Runs a SchoolDB read method in its own transaction at the given isolation level,
+    then ends it and restores READ COMMITTED.
+    With autocommit off any earlier statement leaves a transaction open, and the level
+    cannot change inside one: that transaction is committed first (SchoolDB write
+    methods commit or roll back before returning, so it only holds reads). Inside a
+    @write_transaction method the read runs as is, in the write's transaction.
+    Both cases are counted in stats (reads_ended_open_tx, reads_in_write).
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapped(self, *args, **kwargs):
+            if not _is_sql_server(self.conn):
+                return method(self, *args, **kwargs)
+
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT @@TRANCOUNT")
+            if cursor.fetchone()[0] > 0:
+                if getattr(self, '_in_write', False):
+                    _count(reads_in_write=1)
+                    return method(self, *args, **kwargs)
+                self.conn.commit()
+                _count(reads_ended_open_tx=1)
+
+            use = level if level != 'SNAPSHOT' or _snapshot_allowed(cursor) else 'READ COMMITTED'
+            cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {use}")
+            track = get_settings().track_lock_waits and not _lock_waits_off.is_set()
+            waits_before = _lock_waits(cursor) if track else None
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                waits_after = _lock_waits(cursor) if waits_before else None
+                self.conn.commit()
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL READ COMMITTED")
+
+                waited, wait_ms = 0, 0
+                if waits_after:
+                    waited = waits_after[0] - waits_before[0]
+                    wait_ms = waits_after[1] - waits_before[1]
+                _count(reads=1, slow_reads=int(elapsed_ms > get_settings().slow_read_ms), reads_waited=int(waited > 0),
+                       read_lock_waits=waited, read_lock_wait_ms=wait_ms)
+        return wrapped
+    return decorator
+
+
+def write_transaction(method=None, retries=None, lock_timeout_ms=None):
+    """
+    Bounds lock waits for a SchoolDB write method and retries it on deadlock / lock
+    timeout with jittered exponential backoff (~50ms, 100ms, 200ms...).
+    The method must call raise_if_retryable(self, e) in its except block.
+    """
+    if method is None:
+        return lambda m: write_transaction(m, retries=retries, lock_timeout_ms=lock_timeout_ms)
+
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        if not _is_sql_server(self.conn):
+            return method(self, *args, **kwargs)
+
+        max_retries = get_settings().write_retries if retries is None else retries
+        timeout = get_settings().lock_timeout_ms if lock_timeout_ms is None else lock_timeout_ms
+        cursor = self.conn.cursor()
+        outer_write = getattr(self, '_in_write', False)  # a write method called from another one
+        _count(writes=1)
+        for attempt in range(max_retries + 1):
+            self._retries_left = max_retries - attempt
+            self._in_write = True
+            cursor.execute(f"SET LOCK_TIMEOUT {int(timeout)}")
+            try:
+                return method(self, *args, **kwargs)
+            except Exception as e:
+                number = sql_error_number(e)
+                if number is None:
+                    raise
+                _count(deadlocks=int(number == DEADLOCK), lock_timeouts=int(number == LOCK_TIMEOUT),
+                       snapshot_conflicts=int(number == SNAPSHOT_CONFLICT), retries=1)
+                print(f"⚠️ {method.__name__}: error {number}, retry {attempt + 1}/{max_retries}")
+                time.sleep(0.05 * (2 ** attempt) * random.uniform(0.5, 1.5))
+            finally:
+                self._retries_left = 0
+                self._in_write = outer_write
+                cursor.execute("SET LOCK_TIMEOUT -1")
+    return wrapped
@@ -0,0 +1,262 @@
+import json
+import time
+import random
+import sqlite3
+import threading
+
+from settings import get_settings
+
+# Persistent background job queue.
+# Jobs live in a local SQLite file so they survive a restart; a small pool of
+# daemon threads claims them one at a time, retries failures with backoff and
+# records the final status / result for the status API.
+
+_handlers = {}
+_scrubbed = set()  # kinds whose payload holds secrets: emptied once the job is over
+_on_failure = {}   # kind -> fn(payload, error) run when a job of that kind fails for good
+_workers = []
+_start_lock = threading.Lock()
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+def handler(kind, scrub_payload=False, on_failure=None):
+    """
+    Registers the function that runs jobs of this kind: fn(payload) -> JSON-able result.
+    scrub_payload=True: the payload (e.g. plaintext passwords) is erased when the job is over.
+    on_failure: fn(payload, error) called once the last attempt has failed.
+    """
+    def decorator(fn):
+        _handlers[kind] = fn
+        if scrub_payload:
+            _scrubbed.add(kind)
+        if on_failure is not None:
+            _on_failure[kind] = on_failure
+        return fn
+    return decorator
+
+
+def _db_path():
+    return get_settings().job_queue_path
+
+
+def _connect():
+    conn = sqlite3.connect(_db_path(), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Erased payloads are overwritten on disk, not just unlinked from the b-tree
+    conn.execute("PRAGMA secure_delete=ON")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL,
+            run_after REAL NOT NULL,
+            result TEXT,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            owner INTEGER
+        )
+    """)
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+    if "owner" not in columns:  # queue files created before job ownership
+        conn.execute("ALTER TABLE jobs ADD COLUMN owner INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_pending ON jobs (status, run_after)")
+    return conn
+
+
+def enqueue(kind, payload=None, max_attempts=3, delay=0, owner=None):
+    """
+    Persists a job and returns its id. The caller never waits for it to run.
+    owner: id of the user who asked for it (the only non-admin allowed to read its status).
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        cur = conn.execute(
+            "INSERT INTO jobs (kind, payload, status, max_attempts, run_after, created_at, updated_at, owner) VALUES (?,?,?,?,?,?,?,?)",
+            (kind, json.dumps(payload or {}), QUEUED, max_attempts, now + delay, now, now, owner)
+        )
+        return cur.lastrowid
+    finally:
+        conn.close()
+
+
+def enqueue_missing(kind, payloads, max_attempts=3):
+    """
+    Queues a job for each payload that has no queued or running job of this kind yet.
+    Check and insert share one write transaction, so processes doing this at the same
+    time never queue the same payload twice. Returns how many jobs were added.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = {r["payload"] for r in conn.execute(
+                "SELECT payload FROM jobs WHERE kind = ? AND status IN (?, ?)", (kind, QUEUED, RUNNING))}
+            pending = {json.dumps(json.loads(p), sort_keys=True) for p in pending}
+            added = 0
+            for payload in payloads:
+                key = json.dumps(payload, sort_keys=True)
+                if key in pending: continue
+                conn.execute(
+                    "INSERT INTO jobs (kind, payload, status, max_attempts, run_after, created_at, updated_at) VALUES (?,?,?,?,?,?,?)",
+                    (kind, json.dumps(payload), QUEUED, max_attempts, now, now, now)
+                )
+                pending.add(key)
+                added += 1
+            conn.execute("COMMIT")
+            return added
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def get_job(job_id):
+    """ Status view of one job, or None. """
+    conn = _connect()
+    try:
+        r = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    if not r: return None
+    return {
+        "id": r["id"],
+        "kind": r["kind"],
+        "status": r["status"],
+        "attempts": r["attempts"],
+        "result": json.loads(r["result"]) if r["result"] else None,
+        "error": r["last_error"],
+        "owner": r["owner"],
+    }
+
+
+def _reclaim(conn):
+    """
+    Puts back in the queue the running jobs whose heartbeat has lapsed (their worker
+    died with its process). A live worker refreshes updated_at well within
+    JOB_STALE_SECONDS, however long its handler runs.
+    """
+    stale_before = time.time() - get_settings().job_stale_seconds
+    return conn.execute("UPDATE jobs SET status = ? WHERE status = ? AND updated_at < ?",
+                        (QUEUED, RUNNING, stale_before)).rowcount
+
+
+def _claim(conn):
+    """ Atomically moves the oldest due job to 'running' (after reclaiming abandoned ones). """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _reclaim(conn)
+        r = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? AND run_after <= ? ORDER BY id LIMIT 1",
+            (QUEUED, time.time())
+        ).fetchone()
+        if r:
+            conn.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                         (RUNNING, time.time(), r["id"]))
+        conn.execute("COMMIT")
+        return r
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _heartbeat(job_id, stop):
+    """ Refreshes updated_at of a running job until stop is set (own connection: this is another thread). """
+    interval = max(get_settings().job_stale_seconds / 3, 0.05)
+    conn = _connect()
+    try:
+        while not stop.wait(interval):
+            try:
+                conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                             (time.time(), job_id, RUNNING))
+            except sqlite3.OperationalError as e:  # busy: the next beat still has time
+                print(f"⚠️ Heartbeat of job {job_id} failed: {e}")
+    finally:
+        conn.close()
+
+
+def _run_handler(fn, job):
+    """ Runs the handler while a heartbeat thread keeps the job's claim alive. """
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job["id"], stop), name=f"job-heartbeat-{job['id']}", daemon=True)
+    beat.start()
+    try:
+        return fn(json.loads(job["payload"]))
+    finally:
+        stop.set()
+        beat.join()
+
+
+def _run_one(conn, job):
+    fn = _handlers.get(job["kind"])
+    attempts = job["attempts"] + 1
+    try:
+        if fn is None:
+            raise LookupError(f"No handler for job kind '{job['kind']}'")
+        result = _run_handler(fn, job)
+        conn.execute("UPDATE jobs SET status = ?, result = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                     (DONE, json.dumps(result), time.time(), job["id"]))
+        _scrub(conn, job)
+    except Exception as e:
+        print(f"❌ Job {job['id']} ({job['kind']}) failed, attempt {attempts}: {e}")
+        if attempts < job["max_attempts"]:
+            # Exponential backoff with jitter: ~2s, 4s, 8s...
+            backoff = (2 ** attempts) * random.uniform(0.5, 1.5)
+            conn.execute("UPDATE jobs SET status = ?, run_after = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                         (QUEUED, time.time() + backoff, str(e), time.time(), job["id"]))
+        else:
+            conn.execute("UPDATE jobs SET status = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                         (FAILED, str(e), time.time(), job["id"]))
+            hook = _on_failure.get(job["kind"])
+            if hook is not None:
+                try:
+                    hook(json.loads(job["payload"]), str(e))
+                except Exception as hook_error:
+                    print(f"❌ Failure hook of job {job['id']} ({job['kind']}) failed: {hook_error}")
+            _scrub(conn, job)
+
+
+def _scrub(conn, job):
+    if job["kind"] in _scrubbed:
+        conn.execute("UPDATE jobs SET payload = '{}' WHERE id = ?", (job["id"],))
+
+
+def _worker_loop(poll_interval):
+    conn = _connect()
+    while True:
+        try:
+            job = _claim(conn)
+        except sqlite3.OperationalError:
+            job = None
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        _run_one(conn, job)
+
+
+def start_workers(count=None, poll_interval=1.0):
+    """
+    Starts the worker pool once per process (JOB_WORKERS threads, 0 disables).
+    Running jobs without a heartbeat for JOB_STALE_SECONDS (a crashed process)
+    are put back in the queue, here and before every claim.
+    """
+    count = get_settings().job_workers if count is None else count
+    with _start_lock:
+        if _workers or count <= 0: return
+        conn = _connect()
+        try:
+            _reclaim(conn)
+        finally:
+            conn.close()
+        for i in range(count):
+            t = threading.Thread(target=_worker_loop, args=(poll_interval,), name=f"job-worker-{i}", daemon=True)
+            t.start()
+            _workers.append(t)
@@ -0,0 +1,93 @@
+import time
+import threading
+from collections import deque
+
+try:
+    from settings import get_settings
+except ImportError:  # imported as src.* by the root-level scripts
+    from src.settings import get_settings
+
+# Process-wide pool of primary connections for SchoolDB.
+# A pooled connection keeps its cursors between requests, one per registered
+# statement (see statements.py), so a statement is prepared once per connection
+# and re-executed afterwards instead of being re-sent and re-compiled.
+#
+#   DB_POOL_SIZE        idle connections kept per connection string (default 5, 0 disables)
+#   DB_POOL_MAX_IDLE    seconds after which an idle connection is closed instead of reused (default 300)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursors = {}  # statement name -> cursor holding its prepared handle
+        self.last_used = time.time()
+
+    def close(self):
+        self.cursors.clear()
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, size, max_idle):
+        self._connect = connect
+        self.size = size
+        self.max_idle = max_idle
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "expired": 0, "discarded": 0}
+
+    def acquire(self):
+        now = time.time()
+        with self._lock:
+            while self._idle:
+                pooled = self._idle.pop()
+                if now - pooled.last_used < self.max_idle:
+                    self.stats["reused"] += 1
+                    return pooled
+                self.stats["expired"] += 1
+                pooled.close()
+            self.stats["opened"] += 1
+        return PooledConnection(self._connect())
+
+    def release(self, pooled):
+        """ Hands a connection back; anything left uncommitted is rolled back first. """
+        try:
+            pooled.conn.rollback()
+        except Exception:
+            # Broken link (server restart, network drop): never hand it out again
+            with self._lock:
+                self.stats["discarded"] += 1
+            pooled.close()
+            return
+        pooled.last_used = time.time()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(pooled)
+                return
+        pooled.close()
+
+
+def get_pool(conn_str, connect):
+    """ The pool for this connection string, created on first use. connect(conn_str) opens a connection. """
+    with _pools_lock:
+        pool = _pools.get(conn_str)
+        if pool is None:
+            settings = get_settings()
+            pool = _pools[conn_str] = ConnectionPool(lambda: connect(conn_str), settings.pool_size, settings.pool_max_idle)
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = list(_pools.values())
+    totals = {"idle": sum(len(p._idle) for p in pools)}
+    for p in pools:
+        for key, value in p.stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
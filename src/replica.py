@@ -0,0 +1,126 @@
+import time
+import sqlite3
+import functools
+import threading
+
+try:
+    from settings import get_settings
+except ImportError:  # imported as src.* by the root-level scripts
+    from src.settings import get_settings
+
+# Read-replica routing for reporting queries.
+# SchoolDB methods decorated with @reads_from_replica run against a read-only
+# replica when one is configured, healthy and fresh enough; anything else
+# (not configured, too stale, connection or query error) falls back to the primary.
+#
+#   DB_REPLICA_URL        ODBC connection string, or sqlite:///path/to/file.db for local testing
+#   DB_REPLICA_MAX_LAG    staleness tolerance in seconds (default 30)
+#   DB_REPLICA_RETRY      seconds to wait before retrying a replica that failed (default 60)
+
+# Lag computed by the replica from its own clock: the heartbeat is written in UTC
+# (migration 037_replica_heartbeat_utc), so the app server's clock does not matter
+LAG_SQL = "SELECT DATEDIFF_BIG(MILLISECOND, MAX(Battement), SYSUTCDATETIME()) / 1000.0 FROM ReplicaHeartbeat"
+# Local sqlite replica: Battement is UTC ISO text, and 'now' is UTC there too
+SQLITE_LAG_SQL = "SELECT (julianday('now') - julianday(MAX(Battement))) * 86400.0 FROM ReplicaHeartbeat"
+LAG_CHECK_INTERVAL = 5
+
+stats = {"replica_reads": 0, "primary_reads": 0, "fallbacks": 0, "stale_skips": 0}
+
+_state = {"down_until": 0.0, "lag": None, "lag_checked": 0.0}
+_lock = threading.Lock()
+
+
+class _SqliteRow(tuple):
+    """ sqlite3 row with pyodbc-style attribute access (row.Nom). """
+    _index = {}
+
+    def __getattr__(self, name):
+        try:
+            return self[self._index[name]]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _sqlite_row_factory(cursor, row):
+    index = {c[0]: i for i, c in enumerate(cursor.description)}
+    r = _SqliteRow(row)
+    r._index = index
+    return r
+
+
+def replica_url():
+    return get_settings().replica_url
+
+
+def connect_replica():
+    """ Opens a read-only connection to the configured replica (or returns None). """
+    url = replica_url()
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = _sqlite_row_factory
+        return conn
+    import pyodbc
+    # ApplicationIntent=ReadOnly lets an Always On listener route to a secondary
+    conn_str = url if 'ApplicationIntent' in url else url.rstrip(';') + ';ApplicationIntent=ReadOnly;'
+    return pyodbc.connect(conn_str, readonly=True)
+
+
+def replica_lag(conn):
+    """ Seconds the replica is behind, from the heartbeat row the primary keeps updating. """
+    now = time.time()
+    with _lock:
+        if now - _state["lag_checked"] < LAG_CHECK_INTERVAL:
+            return _state["lag"]
+    cursor = conn.cursor()
+    cursor.execute(SQLITE_LAG_SQL if isinstance(conn, sqlite3.Connection) else LAG_SQL)
+    row = cursor.fetchone()
+    lag = float(row[0]) if row and row[0] is not None else None
+    with _lock:
+        _state.update(lag=lag, lag_checked=now)
+    return lag
+
+
+def mark_down():
+    with _lock:
+        _state["down_until"] = time.time() + get_settings().replica_retry
+        _state["lag_checked"] = 0.0
+
+
+def is_down():
+    return time.time() < _state["down_until"]
+
+
+def reads_from_replica(method=None, max_lag=None):
+    """
+    Decorator for SchoolDB reporting methods. Usable bare or with a per-method
+    staleness tolerance: @reads_from_replica(max_lag=300).
+    """
+    if method is None:
+        return lambda m: reads_from_replica(m, max_lag=max_lag)
+
+    @functools.wraps(method)
+    def wrapped(self, *args, **kwargs):
+        replica = self.replica_conn(max_lag)
+        if replica is None:
+            stats["primary_reads"] += 1
+            return method(self, *args, **kwargs)
+
+        primary = self.conn
+        self.conn = replica
+        try:
+            result = method(self, *args, **kwargs)
+            stats["replica_reads"] += 1
+            return result
+        except Exception as e:
+            print(f"⚠️ Replica read failed in {method.__name__}, falling back to primary: {e}")
+            stats["fallbacks"] += 1
+            self.drop_replica()
+            mark_down()
+            self.conn = primary
+            return method(self, *args, **kwargs)
+        finally:
+            self.conn = primary
+    return wrapped
@@ -0,0 +1,118 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+# Compact row records and fast JSON for large listings.
+#
+# A record type is a namedtuple (tuple storage, no per-row __dict__, field names
+# stored once on the class) that also answers row['field'], so templates and
+# callers written against the old per-row dicts keep working.
+# dumps() uses orjson when installed; iter_json() encodes a document piece by
+# piece so a list of 50k rows is never turned into one giant string.
+
+
+class Record:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self._fields
+
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+
+def record(typename, fields):
+    """ Declares a record type: record("UserRow", "id name email") -> class with _make(row). """
+    return type(typename, (Record, namedtuple(typename, fields)), {"__slots__": ()})
+
+
+def map_rows(cursor, factory, batch_size=1000):
+    """ Yields factory records for the cursor's rows, fetching batch_size rows at a time. """
+    make = factory._make
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows: break
+        for r in rows:
+            yield make(r)
+
+
+def _default(o):
+    if isinstance(o, Record):
+        return o.to_dict()
+    # Same text as the str() conversions the listings used to do
+    if isinstance(o, (datetime, date)):
+        return str(o)
+    if isinstance(o, Decimal):
+        return str(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+def _plain(value):
+    # The stdlib encoder writes tuples (records) as arrays without asking default()
+    return value.to_dict() if isinstance(value, Record) else value
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(obj):
+        return orjson.dumps(_plain(obj), default=_default, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+    def _records_as_dicts(value):
+        # Nested records too (e.g. {"users": [UserRow, ...]}), not just the top-level value
+        if isinstance(value, Record):
+            return {k: _records_as_dicts(v) for k, v in zip(value._fields, value)}
+        if isinstance(value, dict):
+            return {k: _records_as_dicts(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [_records_as_dicts(v) for v in value]
+        return value
+
+    def dumps(obj):
+        return _encoder.encode(_records_as_dicts(obj))
+
+
+def iter_json(obj, chunk_rows=500):
+    """
+    Yields the JSON text of obj in pieces. Dicts are walked key by key; lists and
+    generators are encoded chunk_rows items at a time; everything else in one go.
+    """
+    if isinstance(obj, dict):
+        yield '{'
+        for i, (key, value) in enumerate(obj.items()):
+            yield (',' if i else '') + dumps(str(key)) + ':'
+            yield from iter_json(value, chunk_rows)
+        yield '}'
+    elif isinstance(obj, list) or hasattr(obj, '__next__'):
+        # One encoder call per chunk; [1:-1] drops the chunk's own brackets
+        yield '['
+        chunk, first = [], True
+        for item in obj:
+            chunk.append(_plain(item))
+            if len(chunk) >= chunk_rows:
+                yield ('' if first else ',') + dumps(chunk)[1:-1]
+                chunk, first = [], False
+        if chunk:
+            yield ('' if first else ',') + dumps(chunk)[1:-1]
+        yield ']'
+    else:
+        yield dumps(obj)
@@ -0,0 +1,228 @@
+import re
+import time
+import heapq
+import bisect
+import threading
+import unicodedata
+
+import versions
+from db_manager import SchoolDB
+
+# In-memory search index for the admin autocomplete (users, TPs, announcements).
+#
+# - Text is folded to lowercase ASCII ("Élodie" -> "elodie") and split into words.
+# - _postings maps each word to the documents containing it (with the weight of
+#   the best field it appears in); _terms keeps the words sorted, so every word
+#   starting with a typed prefix is one bisect range away.
+# - Every query word must match (AND); exact words score above prefixes, names
+#   and titles above emails, emails above group/module names.
+# - build() loads everything at startup; afterwards the change feed reports the
+#   rows changed by any worker or script (changefeed.py -> versions.py) and only
+#   those rows are reloaded.
+#
+# The index lives in this process, like the other caches.
+
+# kind -> data-version table its rows come from
+KINDS = {"user": "users", "tp": "tps", "annonce": "annonces"}
+
+FIELD_WEIGHTS = {
+    "name": 3.0, "title": 3.0, "cne": 3.0, "matricule": 3.0,
+    "email": 2.0,
+    "role": 0.5, "group": 1.0, "module": 1.0,
+}
+DEFAULT_LIMIT = 10
+MIN_PREFIX = 2
+# Candidate count under which further query words are checked per document
+NARROW_BELOW = 300
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+_lock = threading.Lock()
+_docs = {}      # (kind, id) -> (label, detail, {word: weight})
+_postings = {}  # word -> {(kind, id): weight}
+_terms = []     # sorted words of _postings
+_stats = {"ready": False, "build_ms": None, "queries": 0, "query_ms": 0.0, "updates": 0}
+
+
+def fold(text):
+    """ Lowercase, accent-free form used for both indexing and queries. """
+    text = unicodedata.normalize("NFKD", str(text))
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+def words(text):
+    return _WORD.findall(fold(text)) if text else []
+
+
+def _document(kind, row):
+    """ (label, detail, {word: weight}) for a row of SchoolDB.get_search_documents(kind). """
+    if kind == "user":
+        label, detail = row.name, f"{row.role} · {row.email}"
+        fields = {"name": row.name, "email": row.email, "cne": row.cne, "matricule": row.matricule,
+                  "role": row.role, "group": row.group}
+    else:
+        label, detail = row.title, " · ".join(x for x in (row.group, row.module) if x)
+        fields = {"title": row.title, "group": row.group, "module": row.module}
+    weights = {}
+    for field, value in fields.items():
+        w = FIELD_WEIGHTS[field]
+        for word in words(value):
+            if w > weights.get(word, 0):
+                weights[word] = w
+    return label, detail, weights
+
+
+def _add(key, doc):
+    # caller holds _lock
+    _docs[key] = doc
+    for word, w in doc[2].items():
+        posting = _postings.get(word)
+        if posting is None:
+            posting = _postings[word] = {}
+            bisect.insort(_terms, word)
+        posting[key] = w
+
+
+def _remove(key):
+    # caller holds _lock
+    doc = _docs.pop(key, None)
+    if doc is None:
+        return
+    for word in doc[2]:
+        posting = _postings.get(word)
+        if posting is None:
+            continue
+        posting.pop(key, None)
+        if not posting:
+            del _postings[word]
+            i = bisect.bisect_left(_terms, word)
+            if i < len(_terms) and _terms[i] == word:
+                del _terms[i]
+
+
+def _load(db, kind, ids=None):
+    return [((kind, row.id), _document(kind, row)) for row in db.get_search_documents(kind, ids)]
+
+
+def build():
+    """ (Re)builds the whole index from the database. """
+    global _docs, _postings, _terms
+    started = time.perf_counter()
+    with SchoolDB() as db:
+        loaded = [item for kind in KINDS for item in _load(db, kind)]
+
+    docs, postings = {}, {}
+    for key, doc in loaded:
+        docs[key] = doc
+        for word, w in doc[2].items():
+            postings.setdefault(word, {})[key] = w
+    terms = sorted(postings)
+    with _lock:
+        _docs, _postings, _terms = docs, postings, terms
+        _stats["ready"] = True
+        _stats["build_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🔎 Search index: {len(docs)} documents, {len(terms)} words in {_stats['build_ms']} ms")
+
+
+def refresh(kind, ids=None):
+    """ Reloads the given rows of one kind (all of them if ids is None); deleted rows drop out. """
+    with SchoolDB() as db:
+        loaded = _load(db, kind, ids)
+    with _lock:
+        if ids is None:
+            stale = [key for key in _docs if key[0] == kind]
+        else:
+            stale = [(kind, int(i)) for i in ids]
+        for key in stale:
+            _remove(key)
+        for key, doc in loaded:
+            _add(key, doc)
+        _stats["updates"] += 1
+
+
+def _on_change(tables, ids):
+    for kind, table in KINDS.items():
+        if table in tables:
+            refresh(kind, ids)
+
+
+def _closeness(word, term):
+    # exact word: full weight x2; longer words: less the more they extend the prefix
+    return 2.0 if term == word else 1.0 + len(word) / len(term)
+
+
+def _matches(word):
+    """ {key: score} of the documents with a word starting with `word`. """
+    found = {}
+    start = bisect.bisect_left(_terms, word)
+    end = bisect.bisect_left(_terms, word + "\uffff", start)
+    for term in _terms[start:end]:
+        closeness = _closeness(word, term)
+        for key, w in _postings[term].items():
+            score = w * closeness
+            if score > found.get(key, 0):
+                found[key] = score
+    return found
+
+
+def _narrow(scores, word):
+    """ Keeps the candidates that also have a word starting with `word`, adding its score. """
+    narrowed = {}
+    for key, s in scores.items():
+        best = 0
+        for term, w in _docs[key][2].items():
+            if term.startswith(word):
+                best = max(best, w * _closeness(word, term))
+        if best:
+            narrowed[key] = s + best
+    return narrowed
+
+
+def query(text, kinds=None, limit=DEFAULT_LIMIT):
+    """
+    Ranked matches for a typed query: a list of {kind, id, label, detail, score}.
+    kinds restricts the result to some of KINDS.
+    """
+    started = time.perf_counter()
+    needles = sorted(set(words(text)), key=len, reverse=True)  # longest (most selective) first
+    results = []
+    # A lone letter would match most of the school; it only narrows longer words
+    if needles and len(needles[0]) >= MIN_PREFIX:
+        with _lock:
+            scores = _matches(needles[0])
+            for word in needles[1:]:
+                if len(scores) <= NARROW_BELOW:
+                    # Few candidates left: check their own words instead of scanning postings
+                    scores = _narrow(scores, word)
+                else:
+                    more = _matches(word)
+                    scores = {key: s + more[key] for key, s in scores.items() if key in more}
+            if kinds:
+                scores = {key: s for key, s in scores.items() if key[0] in kinds}
+            best = heapq.nlargest(limit, scores.items(), key=lambda kv: (kv[1], -len(_docs[kv[0]][0])))
+            results = [{"kind": key[0], "id": key[1], "label": _docs[key][0], "detail": _docs[key][1],
+                        "score": round(score, 2)} for key, score in best]
+    elapsed = (time.perf_counter() - started) * 1000
+    with _lock:
+        _stats["queries"] += 1
+        _stats["query_ms"] += elapsed
+    return results
+
+
+def stats():
+    with _lock:
+        return dict(_stats, documents=len(_docs), words=len(_terms), query_ms=round(_stats["query_ms"], 1),
+                    avg_query_ms=round(_stats["query_ms"] / _stats["queries"], 3) if _stats["queries"] else None)
+
+
+def start():
+    """ Builds the index in the background and keeps it in sync with SchoolDB writes. """
+    versions.on_change(_on_change)
+
+    def run():
+        try:
+            build()
+        except Exception as e:
+            print(f"❌ Search index build failed: {e}")
+
+    threading.Thread(target=run, name="search-index", daemon=True).start()
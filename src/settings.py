@@ -0,0 +1,141 @@
+import os
+import functools
+from dataclasses import dataclass
+
+# Application configuration, read from the environment (and .env) ONCE per process.
+# Modules call get_settings() when they need a value instead of os.getenv(), so a
+# SchoolDB() or a request never re-parses the environment.
+
+
+@dataclass(frozen=True)
+class Settings:
+    # SQL Server (primary)
+    db_driver: str = '{ODBC Driver 17 for SQL Server}'
+    db_server: str = 'localhost'
+    db_database: str = 'SchoolManagementDB'
+    db_trusted_connection: str = 'yes'
+    db_trust_cert: str = 'yes'
+    # Connection pool / statement reuse (pool.py)
+    pool_size: int = 5
+    pool_max_idle: int = 300
+    # Transactions (isolation.py)
+    lock_timeout_ms: int = 5000
+    write_retries: int = 3
+    slow_read_ms: int = 500
+    track_lock_waits: bool = True
+    # Read replica (replica.py)
+    replica_url: str = ''
+    replica_max_lag: int = 30
+    replica_retry: int = 60
+    # Web app
+    secret_key: str = 'dev_key_change_in_prod'
+    feed_page_size: int = 20
+    profile_cache_entries: int = 10000
+    # Response compression (compression.py)
+    compress_min_size: int = 1024
+    compress_cache_entries: int = 256
+    compress_cache_bytes: int = 32 * 1024 * 1024
+    # Template fragment cache (fragments.py)
+    fragment_cache_ttl: int = 60
+    fragment_cache_entries: int = 512
+    # Change feed (changefeed.py)
+    change_poll_interval: int = 2
+    change_log_retention_days: int = 7
+    # Document full-text search (fulltext.py): 'sqlite' (FTS5 file) or 'sqlserver'
+    fulltext_backend: str = 'sqlite'
+    fulltext_path: str = 'fulltext.sqlite3'
+    # Upload admission control / spool (admission.py)
+    upload_concurrency: int = 4
+    upload_queue_max: int = 200
+    upload_queue_timeout: int = 30
+    upload_spool_path: str = 'spool'
+    # Resumable uploads (uploads.py)
+    upload_chunk_size: int = 5 * 1024 * 1024
+    upload_max_size: int = 200 * 1024 * 1024
+    upload_session_ttl: int = 24 * 3600
+    # Stored file BLOBs (storage.py): 'zstd' (zlib if zstandard is missing), 'zlib' or 'off'
+    blob_compression: str = 'zstd'
+    # Background jobs (jobs.py)
+    job_workers: int = 2
+    job_queue_path: str = 'jobs.sqlite3'
+    job_stale_seconds: int = 900
+    # Live notifications (events.py)
+    event_broker: str = 'memory'
+    event_spool_path: str = 'events.jsonl'
+
+    @property
+    def conn_str(self):
+        return (
+            f"DRIVER={self.db_driver};SERVER={self.db_server};DATABASE={self.db_database};"
+            f"Trusted_Connection={self.db_trusted_connection};TrustServerCertificate={self.db_trust_cert};"
+        )
+
+
+# Field -> environment variable
+_ENV = {
+    'db_driver': 'DB_DRIVER',
+    'db_server': 'DB_SERVER',
+    'db_database': 'DB_DATABASE',
+    'db_trusted_connection': 'DB_TRUSTED_CONNECTION',
+    'db_trust_cert': 'DB_TRUST_CERT',
+    'pool_size': 'DB_POOL_SIZE',
+    'pool_max_idle': 'DB_POOL_MAX_IDLE',
+    'lock_timeout_ms': 'DB_LOCK_TIMEOUT_MS',
+    'write_retries': 'DB_WRITE_RETRIES',
+    'slow_read_ms': 'DB_SLOW_READ_MS',
+    'track_lock_waits': 'DB_TRACK_LOCK_WAITS',
+    'replica_url': 'DB_REPLICA_URL',
+    'replica_max_lag': 'DB_REPLICA_MAX_LAG',
+    'replica_retry': 'DB_REPLICA_RETRY',
+    'secret_key': 'FLASK_SECRET_KEY',
+    'feed_page_size': 'FEED_PAGE_SIZE',
+    'profile_cache_entries': 'PROFILE_CACHE_ENTRIES',
+    'compress_min_size': 'COMPRESS_MIN_SIZE',
+    'compress_cache_entries': 'COMPRESS_CACHE_ENTRIES',
+    'compress_cache_bytes': 'COMPRESS_CACHE_BYTES',
+    'fragment_cache_ttl': 'FRAGMENT_CACHE_TTL',
+    'fragment_cache_entries': 'FRAGMENT_CACHE_ENTRIES',
+    'change_poll_interval': 'CHANGE_POLL_INTERVAL',
+    'change_log_retention_days': 'CHANGE_LOG_RETENTION_DAYS',
+    'fulltext_backend': 'FULLTEXT_BACKEND',
+    'fulltext_path': 'FULLTEXT_PATH',
+    'upload_concurrency': 'UPLOAD_CONCURRENCY',
+    'upload_queue_max': 'UPLOAD_QUEUE_MAX',
+    'upload_queue_timeout': 'UPLOAD_QUEUE_TIMEOUT',
+    'upload_spool_path': 'UPLOAD_SPOOL_PATH',
+    'upload_chunk_size': 'UPLOAD_CHUNK_SIZE',
+    'upload_max_size': 'UPLOAD_MAX_SIZE',
+    'upload_session_ttl': 'UPLOAD_SESSION_TTL',
+    'blob_compression': 'BLOB_COMPRESSION',
+    'job_workers': 'JOB_WORKERS',
+    'job_queue_path': 'JOB_QUEUE_PATH',
+    'job_stale_seconds': 'JOB_STALE_SECONDS',
+    'event_broker': 'EVENT_BROKER',
+    'event_spool_path': 'EVENT_SPOOL_PATH',
+}
+
+
+def _convert(value, default):
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    if isinstance(default, int):
+        return int(value)
+    return value
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    """ The process-wide Settings, built on first call. """
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:  # plain environment variables still work
+        pass
+
+    defaults = Settings()
+    values = {}
+    for field, var in _ENV.items():
+        raw = os.environ.get(var)
+        if raw is not None and raw != '':
+            values[field] = _convert(raw, getattr(defaults, field))
+    return Settings(**values)
@@ -0,0 +1,143 @@
+import sys
+
+from settings import get_settings
+
+# `python app.py --check`: validates drivers, configuration and the database the
+# way utils/check_drivers.py does, then exits without serving traffic.
+# Exit code 0 when everything needed to serve requests is in place, 1 otherwise.
+
+# Tables created by database/migrations; a missing one means a migration was not applied
+MIGRATION_TABLES = ["AnnonceImage", "SoumissionArchive", "AttendanceCube", "ReplicaHeartbeat", "TexteDocument", "ArchivageAnnee", "ChangeLog"]
+
+
+def _ok(msg): print(f"✅ {msg}")
+def _warn(msg): print(f"⚠️ {msg}")
+def _fail(msg): print(f"❌ {msg}")
+
+
+def check_drivers(settings):
+    try:
+        import pyodbc
+    except ImportError:
+        _fail("pyodbc is not installed (pip install -r requirements.txt)")
+        return False
+
+    drivers = [d for d in pyodbc.drivers() if 'SQL' in d]
+    if not drivers:
+        _fail("No SQL Server ODBC drivers found. Install the 'ODBC Driver for SQL Server' from Microsoft.")
+        return False
+    wanted = settings.db_driver.strip('{}')
+    if wanted not in drivers:
+        _fail(f"DB_DRIVER '{wanted}' is not installed. Found: {', '.join(drivers)}")
+        return False
+    _ok(f"ODBC driver '{wanted}' installed")
+    return True
+
+
+def check_database(settings):
+    import pyodbc
+    try:
+        conn = pyodbc.connect(settings.conn_str, timeout=5)
+    except Exception as e:
+        _fail(f"Cannot connect to {settings.db_server}/{settings.db_database}: {e}")
+        return False
+
+    passed = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT SERVERPROPERTY('ProductVersion'), DB_NAME()")
+        version, name = cursor.fetchone()
+        _ok(f"Connected to {settings.db_server}/{name} (SQL Server {version})")
+
+        marks = ", ".join("?" * len(MIGRATION_TABLES))
+        cursor.execute(f"SELECT name FROM sys.tables WHERE name IN ({marks})", MIGRATION_TABLES)
+        present = {r[0] for r in cursor.fetchall()}
+        missing = [t for t in MIGRATION_TABLES if t not in present]
+        if missing:
+            _fail(f"Missing tables (apply database/migrations): {', '.join(missing)}")
+            passed = False
+        else:
+            _ok("Migration tables present")
+
+        cursor.execute("SELECT snapshot_isolation_state, is_read_committed_snapshot_on FROM sys.databases WHERE name = DB_NAME()")
+        snapshot, rcsi = cursor.fetchone()
+        if snapshot == 1 and rcsi:
+            _ok("Snapshot isolation enabled")
+        else:
+            _warn("Snapshot isolation is off: dashboard reads will wait on writers (migration 038)")
+    except Exception as e:
+        _fail(f"Database check failed: {e}")
+        passed = False
+    finally:
+        conn.close()
+    return passed
+
+
+def check_replica(settings):
+    if not settings.replica_url:
+        return True
+    import replica
+    try:
+        conn = replica.connect_replica()
+        lag = replica.replica_lag(conn)
+        conn.close()
+    except Exception as e:
+        _warn(f"Read replica unreachable, reports will use the primary: {e}")
+        return True
+    if lag is None or lag > settings.replica_max_lag:
+        _warn(f"Read replica lag {lag}s exceeds DB_REPLICA_MAX_LAG ({settings.replica_max_lag}s)")
+    else:
+        _ok(f"Read replica reachable, {lag:.0f}s behind")
+    return True
+
+
+def check_job_queue(settings):
+    import jobs
+    try:
+        jobs._connect().close()
+    except Exception as e:
+        _fail(f"Job queue '{settings.job_queue_path}' is not writable: {e}")
+        return False
+    _ok(f"Job queue at {settings.job_queue_path}")
+    return True
+
+
+def check_fulltext(settings):
+    import fulltext
+    try:
+        index = fulltext.get_index()
+        stats = index.stats() if index.backend == "sqlite" else None
+    except Exception as e:
+        _fail(f"Full-text index ({settings.fulltext_backend}) unusable: {e}")
+        return False
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        _warn("pypdf is not installed: PDF text will not be indexed until it is")
+    if stats is not None:
+        _ok(f"Full-text index at {settings.fulltext_path} ({stats['documents']} documents)")
+    else:
+        _ok("Full-text search uses SQL Server (migration 045)")
+    return True
+
+
+def run_checks():
+    """ Runs every check and returns the process exit code. """
+    print("--- Startup check ---\n")
+    settings = get_settings()
+    if settings.secret_key == 'dev_key_change_in_prod':
+        _warn("FLASK_SECRET_KEY is not set (development key in use)")
+
+    passed = check_drivers(settings)
+    if passed:
+        passed = check_database(settings)
+    passed = check_replica(settings) and passed
+    passed = check_job_queue(settings) and passed
+    passed = check_fulltext(settings) and passed
+
+    print("\nReady to serve." if passed else "\nNot ready: fix the errors above.")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(run_checks())
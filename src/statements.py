@@ -0,0 +1,141 @@
+import time
+import threading
+
+# Central registry of parameterized statements.
+# Each query variant has ONE fixed SQL text (no f-string splicing), so SQL Server
+# keeps a single cached plan per variant and pyodbc can re-execute the statement
+# already prepared on a pooled connection. The leading /* stmt:name */ comment
+# makes every variant easy to find in sys.dm_exec_query_stats.
+
+STATEMENTS = {}
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def register(name, sql):
+    STATEMENTS[name] = f"/* stmt:{name} */\n{sql.strip()}"
+
+
+def sql_for(name):
+    return STATEMENTS[name]
+
+
+register("presence_stats.all", """
+SELECT CAST(S.DateDebut AS DATE) AS SessionDate, G.NomGroupe, M.NomModule,
+       COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) AS TotalPresent,
+       COUNT(P.PresenceID) AS TotalStudents,
+       CAST(ISNULL(ROUND(COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) * 100.0
+                         / NULLIF(COUNT(P.PresenceID), 0), 1), 0) AS FLOAT) AS Rate
+FROM Seance S
+JOIN Groupe G ON S.GroupeID = G.GroupeID
+JOIN Module M ON S.ModuleID = M.ModuleID
+LEFT JOIN Presence P ON S.SeanceID = P.SeanceID
+GROUP BY CAST(S.DateDebut AS DATE), G.NomGroupe, M.NomModule
+ORDER BY SessionDate ASC
+""")
+
+register("presence_stats.by_formateur", """
+SELECT CAST(S.DateDebut AS DATE) AS SessionDate, G.NomGroupe, M.NomModule,
+       COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) AS TotalPresent,
+       COUNT(P.PresenceID) AS TotalStudents,
+       CAST(ISNULL(ROUND(COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) * 100.0
+                         / NULLIF(COUNT(P.PresenceID), 0), 1), 0) AS FLOAT) AS Rate
+FROM Seance S
+JOIN Groupe G ON S.GroupeID = G.GroupeID
+JOIN Module M ON S.ModuleID = M.ModuleID
+LEFT JOIN Presence P ON S.SeanceID = P.SeanceID
+WHERE S.FormateurID = ?
+GROUP BY CAST(S.DateDebut AS DATE), G.NomGroupe, M.NomModule
+ORDER BY SessionDate ASC
+""")
+
+# Both KPIs in one round trip; NULLIF keeps an empty Presence table from dividing by zero
+register("kpis.all", """
+SELECT (SELECT COUNT(*) FROM Seance) AS TotalSessions,
+       ISNULL((SELECT COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) * 100.0 / NULLIF(COUNT(*), 0)
+               FROM Presence P), 0) AS AvgRate
+""")
+
+register("kpis.by_formateur", """
+SELECT (SELECT COUNT(*) FROM Seance WHERE FormateurID = ?) AS TotalSessions,
+       ISNULL((SELECT COUNT(CASE WHEN P.Etat = 'Present' THEN 1 END) * 100.0 / NULLIF(COUNT(*), 0)
+               FROM Presence P JOIN Seance S ON P.SeanceID = S.SeanceID
+               WHERE S.FormateurID = ?), 0) AS AvgRate
+""")
+
+register("absent_report.all", """
+SELECT U.Nom, U.Prenom, E.CNE, G.NomGroupe, M.NomModule, S.DateDebut
+FROM Presence P
+JOIN Seance S ON P.SeanceID = S.SeanceID
+JOIN Etudiant E ON P.EtudiantID = E.EtudiantID
+JOIN Utilisateur U ON E.EtudiantID = U.UserID
+JOIN Groupe G ON S.GroupeID = G.GroupeID
+JOIN Module M ON S.ModuleID = M.ModuleID
+WHERE P.Etat = 'Absent'
+ORDER BY U.Nom, M.NomModule, S.DateDebut DESC
+""")
+
+register("absent_report.by_formateur", """
+SELECT U.Nom, U.Prenom, E.CNE, G.NomGroupe, M.NomModule, S.DateDebut
+FROM Presence P
+JOIN Seance S ON P.SeanceID = S.SeanceID
+JOIN Etudiant E ON P.EtudiantID = E.EtudiantID
+JOIN Utilisateur U ON E.EtudiantID = U.UserID
+JOIN Groupe G ON S.GroupeID = G.GroupeID
+JOIN Module M ON S.ModuleID = M.ModuleID
+WHERE P.Etat = 'Absent' AND S.FormateurID = ?
+ORDER BY U.Nom, M.NomModule, S.DateDebut DESC
+""")
+
+register("login.by_email", """
+SELECT UserID, Nom, Prenom, Role, MotDePasse FROM Utilisateur WHERE Email = ?
+""")
+
+
+def execute(db, name, params=()):
+    """
+    Runs a registered statement on db.conn and returns the cursor holding its results.
+    On a pooled primary connection the cursor is kept per statement name, so the
+    statement pyodbc prepared last time is re-executed as is.
+    """
+    sql = STATEMENTS[name]
+    pooled = getattr(db, 'pooled', None)
+    if pooled is not None and pooled.conn is db.conn:
+        cursor = pooled.cursors.get(name)
+        reused = cursor is not None
+        if not reused:
+            cursor = pooled.cursors[name] = db.conn.cursor()
+    else:
+        # Replica or unpooled connection: plain cursor, the server plan is still shared
+        cursor, reused = db.conn.cursor(), False
+
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        if pooled is not None:
+            pooled.cursors.pop(name, None)
+        raise
+    finally:
+        _record(name, reused, time.perf_counter() - started)
+    return cursor
+
+
+def _record(name, reused, elapsed):
+    with _lock:
+        s = _stats.setdefault(name, {"executions": 0, "reused": 0, "prepared": 0, "total_ms": 0.0})
+        s["executions"] += 1
+        s["reused" if reused else "prepared"] += 1
+        s["total_ms"] += elapsed * 1000
+
+
+def stats():
+    """ Per-statement counters: executions, cursor/prepared-handle reuse and time spent executing. """
+    with _lock:
+        report = {}
+        for name, s in _stats.items():
+            report[name] = dict(s, total_ms=round(s["total_ms"], 1),
+                                avg_ms=round(s["total_ms"] / s["executions"], 2),
+                                reuse_rate=round(s["reused"] * 100.0 / s["executions"], 1))
+        return {"distinct_statements": len(STATEMENTS), "statements": report}
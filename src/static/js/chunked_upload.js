@@ -0,0 +1,50 @@
+// Resumable upload client for /api/uploads (see uploads.py).
+// chunkedUpload(file, {kind: 'report', tp_id: 3}, pct => ...) resolves with the
+// finalize response (same JSON as /submit_rapport or /publish_tp).
+// A failed chunk is retried from the offset the server reports, so a flaky
+// connection only re-sends the chunk that was cut.
+
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+
+async function sha256Hex(buffer) {
+    if (!window.crypto || !crypto.subtle) return null;  // plain-HTTP pages: the server skips the check
+    const hash = await crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function chunkedUpload(file, fields, onProgress, maxRetries = 5) {
+    const open = await fetch('/api/uploads', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify(Object.assign({size: file.size, filename: file.name, filetype: file.type}, fields))
+    });
+    const session = await open.json();
+    if (!open.ok) throw new Error(session.message);
+
+    let offset = session.received, retries = 0;
+    while (offset < file.size) {
+        const chunk = await file.slice(offset, offset + session.chunk_size).arrayBuffer();
+        const headers = {'Content-Type': 'application/octet-stream'};
+        const checksum = await sha256Hex(chunk);
+        if (checksum) headers['X-Chunk-SHA256'] = checksum;
+        try {
+            const res = await fetch(`/api/uploads/${session.upload_id}?offset=${offset}`, {method: 'PUT', headers, body: chunk});
+            const state = await res.json();
+            if (res.ok) { offset = state.received; retries = 0; }
+            else if (state.received !== undefined && res.status !== 413) { offset = state.received; retries++; }
+            else throw new Error(state.message);
+        } catch (err) {
+            retries++;
+            if (retries > maxRetries) throw err;
+            await new Promise(r => setTimeout(r, 1000 * retries));
+            // Ask the server where to resume
+            const res = await fetch(`/api/uploads/${session.upload_id}`);
+            if (res.ok) offset = (await res.json()).received;
+        }
+        if (retries > maxRetries) throw new Error('Upload failed, please retry.');
+        if (onProgress) onProgress(Math.round(offset * 100 / file.size));
+    }
+
+    const done = await fetch(`/api/uploads/${session.upload_id}/finalize`, {method: 'POST'});
+    return done.json();
+}
@@ -0,0 +1,232 @@
+import os
+import time
+import zlib
+import functools
+import threading
+
+from werkzeug.http import parse_accept_header
+
+try:
+    from settings import get_settings
+except ImportError:  # imported as src.* by the root-level scripts
+    from src.settings import get_settings
+
+# Transparent compression of the stored file BLOBs (TP.FichierData, Soumission.FichierData).
+#
+# - BLOB_COMPRESSION = 'zstd' (needs the optional `zstandard` package, zlib otherwise),
+#   'zlib' or 'off'. The codec and the original size are stored next to the BLOB
+#   (Codec, TailleOriginale; migration 050). Codec NULL = stored as uploaded.
+# - Formats that are already compressed (PDF, images, audio/video, ZIP and the
+#   Office/OpenDocument ZIP containers, archives) are stored as they are. For the
+#   others the first chunk is compressed as a sample; if it does not shrink enough
+#   the whole file is stored as it is.
+# - Reads: decode() for the callers that need the whole file (hashing, text
+#   extraction, base64 routes); iter_decoded() decompresses chunk by chunk for
+#   downloads, and a client that accepts the codec (deflate / zstd) gets the
+#   stored bytes as they are, with Content-Encoding.
+# - stats(): bytes written/read by this process, stored vs original.
+
+CHUNK_SIZE = 1024 * 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# Stored compressed only if the sample shrinks below this ratio
+MIN_GAIN = 0.9
+
+PASSTHROUGH_TYPES = ("image/", "video/", "audio/", "application/pdf", "application/zip",
+                     "application/x-7z", "application/x-rar", "application/gzip", "application/x-gzip",
+                     "application/vnd.openxmlformats-officedocument.", "application/vnd.oasis.opendocument.",
+                     "application/epub+zip", "application/java-archive")
+PASSTHROUGH_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic", ".mp3", ".mp4", ".mov",
+                          ".zip", ".7z", ".rar", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".jar", ".apk",
+                          ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub")
+
+# Codec -> HTTP content coding of the same bytes (zlib streams are HTTP 'deflate')
+CONTENT_CODINGS = {"zlib": "deflate", "zstd": "zstd"}
+
+_stats = {"written": 0, "stored": 0, "passthrough": 0, "read": 0, "served": 0, "sent_encoded": 0, "decode_ms": 0.0}
+_stats_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:  # optional: zlib is used instead
+        return None
+    return zstandard
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+
+
+def configured_codec():
+    """ Codec new files are compressed with, or None when compression is off. """
+    wanted = get_settings().blob_compression.lower()
+    if wanted in ("off", "none", ""):
+        return None
+    if wanted == "zstd" and _zstd() is None:
+        return "zlib"
+    return wanted
+
+
+def is_passthrough(filename, filetype):
+    """ True for formats that are compressed already. """
+    filetype = (filetype or "").split(";")[0].strip().lower()
+    if filetype.startswith(PASSTHROUGH_TYPES):
+        return True
+    return os.path.splitext(filename or "")[1].lower() in PASSTHROUGH_EXTENSIONS
+
+
+def _compressor(codec):
+    if codec == "zstd":
+        return _zstd().ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(ZLIB_LEVEL)
+
+
+def _decompressor(codec):
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("This file is zstd-compressed: install the 'zstandard' package")
+        return zstd.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+class _Compressed:
+    """ Re-iterable compressed view of a re-iterable of chunks (what SchoolDB streams into a BLOB). """
+
+    def __init__(self, chunks, codec):
+        self.chunks = chunks
+        self.codec = codec
+
+    def __iter__(self):
+        comp = _compressor(self.codec)
+        written = stored = 0
+        for chunk in self.chunks:
+            written += len(chunk)
+            out = comp.compress(chunk)
+            if out:
+                stored += len(out)
+                yield out
+        tail = comp.flush()
+        stored += len(tail)
+        if tail:
+            yield tail
+        _count(written=written, stored=stored)
+
+
+class Encoded:
+    """ What to store: data (bytes or re-iterable of chunks), codec (None = as uploaded), original size. """
+    __slots__ = ("data", "codec", "size")
+
+    def __init__(self, data, codec, size):
+        self.data = data
+        self.codec = codec
+        self.size = size
+
+
+def _size_of(file_bytes):
+    if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+        return len(file_bytes)
+    path = getattr(file_bytes, "path", None)  # admission.SpooledFile
+    return os.path.getsize(path) if path else None
+
+
+def encode(file_bytes, filename, filetype):
+    """ file_bytes: bytes or a re-iterable of chunks. Returns the Encoded form to store. """
+    size = _size_of(file_bytes)
+    codec = configured_codec()
+    if codec is None or is_passthrough(filename, filetype):
+        if size: _count(written=size, stored=size, passthrough=1)
+        return Encoded(file_bytes, None, size)
+
+    if isinstance(file_bytes, (bytes, bytearray, memoryview)):
+        comp = _compressor(codec)
+        packed = comp.compress(bytes(file_bytes)) + comp.flush()
+        if len(packed) >= len(file_bytes) * MIN_GAIN:
+            _count(written=size, stored=size, passthrough=1)
+            return Encoded(file_bytes, None, size)
+        _count(written=size, stored=len(packed))
+        return Encoded(packed, codec, size)
+
+    # Stream: judge on the first chunk
+    sample = next(iter(file_bytes), b"")
+    comp = _compressor(codec)
+    if sample and len(comp.compress(sample) + comp.flush()) >= len(sample) * MIN_GAIN:
+        if size: _count(written=size, stored=size, passthrough=1)
+        return Encoded(file_bytes, None, size)
+    return Encoded(_Compressed(file_bytes, codec), codec, size)
+
+
+def decode(data, codec):
+    """ The original bytes of a stored BLOB. """
+    if data is None or not codec:
+        return data
+    started = time.perf_counter()
+    d = _decompressor(codec)
+    plain = d.decompress(bytes(data))
+    if codec == "zlib":
+        plain += d.flush()
+    _count(read=len(data), served=len(plain), decode_ms=(time.perf_counter() - started) * 1000)
+    return plain
+
+
+def iter_decoded(chunks, codec, chunk_size=CHUNK_SIZE):
+    """
+    Original bytes of a stored BLOB given as chunks (or as one bytes value), decompressed
+    piece by piece: only the expansion of one stored chunk is held at a time.
+    """
+    if isinstance(chunks, (bytes, bytearray, memoryview)):
+        data = bytes(chunks)
+        chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    if not codec:
+        yield from chunks
+        return
+    d = _decompressor(codec)
+    read = served = 0
+    cpu = 0.0
+    for chunk in chunks:
+        read += len(chunk)
+        started = time.perf_counter()
+        out = d.decompress(chunk)
+        cpu += time.perf_counter() - started
+        if out:
+            served += len(out)
+            yield out
+    if codec == "zlib":
+        tail = d.flush()
+        if tail:
+            served += len(tail)
+            yield tail
+    _count(read=read, served=served, decode_ms=cpu * 1000)
+
+
+def coding_quality(coding, accept_encoding):
+    """
+    q-value an Accept-Encoding header gives a content coding (0 = refused). Tokens are
+    parsed with their q-values: "deflate;q=0" refuses deflate, "*" covers anything not listed.
+    """
+    return parse_accept_header(accept_encoding or "").quality(coding)
+
+
+def accepted_coding(codec, accept_encoding):
+    """ The Content-Encoding to send the stored bytes with, if the client accepts it (else None). """
+    coding = CONTENT_CODINGS.get(codec)
+    if coding and coding_quality(coding, accept_encoding) > 0:
+        return coding
+    return None
+
+
+def count_sent_encoded(stored_size, original_size):
+    _count(read=stored_size, sent_encoded=1, served=original_size or 0)
+
+
+def stats():
+    with _stats_lock:
+        written, stored = _stats["written"], _stats["stored"]
+        return dict(_stats, decode_ms=round(_stats["decode_ms"], 1),
+                    saved_bytes=written - stored, ratio=round(stored / written, 3) if written else None,
+                    codec=configured_codec(), zstd_available=_zstd() is not None)
@@ -0,0 +1,185 @@
+import io
+import re
+import hashlib
+
+import archive
+import storage
+import fulltext
+import admission
+from db_manager import SchoolDB
+from images import build_variants
+from jobs import handler, enqueue, enqueue_missing
+
+
+# Background jobs: everything slow that used to run inside the upload / admin requests.
+
+
+def count_pdf_pages(data):
+    """ Page count of a PDF, or None for other file types. """
+    if not data or not data.startswith(b"%PDF"):
+        return None
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(io.BytesIO(data)).pages)
+    except Exception:  # pypdf missing (optional) or unreadable file: count page objects instead
+        pass
+    return len(re.findall(rb"/Type\s*/Page(?![a-zA-Z])", data)) or None
+
+
+@handler('annonce_variants')
+def annonce_variants(payload):
+    """ Thumbnail + display size for a freshly published announcement image. """
+    with SchoolDB() as db:
+        original = db.get_annonce_original_image(payload['annonce_id'])
+        if not original:
+            return {"variants": 0}
+        variants = build_variants(original)
+        db.save_annonce_variants(payload['annonce_id'], variants)
+    return {"variants": len(variants)}
+
+
+@handler('file_metadata')
+def file_metadata(payload):
+    """ SHA-256 + PDF page count of an uploaded TP subject or student report, then its text (once per hash). """
+    kind, item_id = payload['kind'], payload['id']
+    with SchoolDB() as db:
+        info = db.get_tp_file_content(item_id) if kind == 'tp' else db.get_submission_file(item_id)
+        if not info or not info['data']:
+            return {"skipped": True}
+        data = bytes(info['data'])
+        sha256 = hashlib.sha256(data).hexdigest()
+        pages = count_pdf_pages(data)
+        db.save_file_metadata(kind, item_id, sha256, pages)
+        indexed = fulltext.index_file(db, sha256, data)
+    return {"sha256": sha256, "pages": pages, "text_indexed": indexed}
+
+
+@handler('fulltext_backfill')
+def fulltext_backfill(payload):
+    """ Indexes the text of files uploaded before full-text search existed (or while pypdf was missing). """
+    index = fulltext.get_index()
+    indexed = hashed = 0
+    with SchoolDB() as db:
+        for kind, item_id, sha256 in db.get_files_to_index():
+            if sha256 is None:
+                # Never hashed: the metadata job does both
+                file_metadata({'kind': kind, 'id': item_id})
+                hashed += 1
+                continue
+            if index.has(db, sha256):
+                continue
+            info = db.get_tp_file_content(item_id) if kind == 'tp' else db.get_submission_file(item_id)
+            if info and info['data'] and fulltext.index_file(db, sha256, bytes(info['data'])):
+                indexed += 1
+    return {"indexed": indexed, "hashed": hashed}
+
+
+def _ingest_failed(payload, error):
+    # Last attempt failed: park the upload instead of retrying it on every restart
+    admission.dead_letter(payload['receipt'], error)
+
+
+@handler('ingest_submission', on_failure=_ingest_failed)
+def ingest_submission(payload):
+    """ Writes a spooled report (admission.py) to the database, dated when it was received. """
+    receipt, data_path = admission.load_receipt(payload['receipt'])
+    if receipt is None:
+        return {"skipped": True}  # already ingested
+    with SchoolDB() as db:
+        # Streamed from the spool file into the BLOB, chunk by chunk
+        submission_id = db.submit_rapport_file(
+            tp_id=receipt['tp_id'],
+            etudiant_id=receipt['etudiant_id'],
+            file_bytes=admission.SpooledFile(data_path),
+            filename=receipt['filename'],
+            filetype=receipt['filetype'],
+            submitted_at=receipt['received_at'],
+            receipt_id=receipt['id']
+        )
+    if not submission_id:
+        raise RuntimeError(f"Submission {payload['receipt']} could not be saved")
+    admission.discard(payload['receipt'])
+    enqueue('file_metadata', {'kind': 'submission', 'id': submission_id})
+    return {"submission_id": submission_id}
+
+
+def requeue_spooled_uploads(older_than):
+    """
+    Startup: queues again the spooled reports whose job was lost (crash between receipt and
+    enqueue). Receipts that still have a queued or running ingest job are left alone.
+    """
+    receipts = admission.pending_receipts(older_than)
+    return enqueue_missing('ingest_submission', [{'receipt': r} for r in receipts], max_attempts=10)
+
+
+@handler('bulk_import_users', scrub_payload=True)  # rows carry plaintext passwords
+def bulk_import_users(payload):
+    """ Creates many accounts in one connection (password hashing included). """
+    created, failed = 0, []
+    with SchoolDB() as db:
+        for row in payload['rows']:
+            extra = {'cne': row.get('cne'), 'groupe_id': row.get('groupe_id'), 'matricule': row.get('matricule')}
+            ok = db.create_user_account(row['nom'], row['prenom'], row['email'], row['password'], row['role'], extra)
+            if ok: created += 1
+            else: failed.append(row['email'])
+    return {"created": created, "failed": failed}
+
+
+@handler('archive_old_attempts')
+def archive_old_attempts(payload):
+    """ Moves the BLOBs of superseded submission attempts to the archive table. """
+    with SchoolDB() as db:
+        archived = db.archive_old_attempts(payload.get('batch_size', 100))
+    return {"archived": archived}
+
+
+@handler('archive_academic_year')
+def archive_academic_year(payload):
+    """
+    Moves a closed academic year to the history tables (archive.py). A run stops after
+    max_seconds and queues the next one, which resumes where it stopped.
+    """
+    annee = int(payload['year'])
+    if not archive.is_closed(annee):
+        return {"skipped": True, "reason": f"{annee}-{annee + 1} is not over"}
+    with SchoolDB() as db:
+        result = db.archive_academic_year(annee, payload.get('batch_size', 1000), payload.get('max_seconds', 300))
+    if result['error']:
+        raise RuntimeError(f"Archival of {annee} failed (progress kept, retry resumes it)")
+    if not result['done']:
+        result['next_job'] = enqueue('archive_academic_year', payload, max_attempts=3)
+    return result
+
+
+@handler('compress_stored_files')
+def compress_stored_files(payload):
+    """ Compresses the files stored before BLOB compression existed (storage.py), one row per transaction. """
+    if storage.configured_codec() is None:
+        return {"skipped": True, "reason": "BLOB_COMPRESSION is off"}
+    compressed, original, stored = 0, 0, 0
+    with SchoolDB() as db:
+        for kind in ('tp', 'submission'):
+            after = 0
+            while True:
+                batch = db.get_uncompressed_files(kind, after, payload.get('batch_size', 100))
+                if not batch: break
+                for item_id, name, filetype in batch:
+                    after = item_id
+                    if storage.is_passthrough(name, filetype):
+                        continue
+                    sizes = db.compress_stored_file(kind, item_id)
+                    if sizes:
+                        compressed += 1
+                        original += sizes[0]
+                        stored += sizes[1]
+    return {"compressed": compressed, "original_bytes": original, "stored_bytes": stored, "saved_bytes": original - stored}
+
+
+@handler('refresh_attendance_cube')
+def refresh_attendance_cube(payload):
+    """ Incremental cube refresh for the given sessions (full rebuild when none are given). """
+    with SchoolDB() as db:
+        ok = db.refresh_attendance_cube(payload.get('seance_ids'))
+    if not ok:
+        raise RuntimeError("Cube refresh failed")
+    return {"seances": payload.get('seance_ids')}
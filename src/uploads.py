@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import contextlib
+
+import admission
+from settings import get_settings
+
+# Resumable chunked uploads (TP subjects and reports).
+#
+#   POST /api/uploads                      {kind, size, filename, ...}  -> session id + chunk size
+#   PUT  /api/uploads/<id>?offset=N        raw bytes, X-Chunk-SHA256     -> bytes received so far
+#   GET  /api/uploads/<id>                                               -> bytes received (to resume)
+#   POST /api/uploads/<id>/finalize                                      -> the usual publish / submit answer
+#
+# A session is a manifest (<id>.json) and the bytes received so far (<id>.part) in
+# UPLOAD_SPOOL_PATH/sessions. A chunk must start where the received bytes end; it is
+# streamed to disk while hashed and cut off again if the checksum does not match,
+# so a resumed upload continues from the last good byte. Finalize hands the
+# assembled file to the storage path (streamed into the BLOB, never loaded whole).
+# Chunks and finalize of one session take the same lock (per process), so a
+# second finalize, or a chunk racing a finalize, finds the session gone (404).
+# Sessions idle for UPLOAD_SESSION_TTL seconds are deleted by gc().
+
+KINDS = ("tp", "report")
+READ_SIZE = 64 * 1024
+GC_INTERVAL = 600
+
+_locks = {}
+_locks_guard = threading.Lock()
+_last_gc = [0.0]
+
+
+class UploadError(Exception):
+    """ A session request that cannot be honoured: status + message (+ extra JSON fields). """
+
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.extra = extra
+
+
+def _dir():
+    path = os.path.join(get_settings().upload_spool_path, "sessions")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(upload_id):
+    if not upload_id.isalnum():
+        raise UploadError(404, "Unknown upload")
+    directory = _dir()
+    return os.path.join(directory, f"{upload_id}.json"), os.path.join(directory, f"{upload_id}.part")
+
+
+def _lock(upload_id):
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _save(manifest):
+    path, _ = _paths(manifest["id"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load(upload_id, user_id):
+    """ The session manifest, checked against its owner. """
+    path, part = _paths(upload_id)
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise UploadError(404, "Unknown or expired upload")
+    if manifest["user_id"] != user_id:
+        raise UploadError(404, "Unknown or expired upload")
+    manifest["received"] = os.path.getsize(part) if os.path.exists(part) else 0
+    return manifest
+
+
+@contextlib.contextmanager
+def locked(upload_id, user_id):
+    """ with uploads.locked(id, user) as manifest: ...  the session, held against chunks and other finalizes. """
+    with _lock(upload_id):
+        yield load(upload_id, user_id)
+
+
+def status(manifest):
+    return {"upload_id": manifest["id"], "size": manifest["size"], "received": manifest["received"],
+            "chunk_size": get_settings().upload_chunk_size, "complete": manifest["received"] == manifest["size"]}
+
+
+def create(user_id, kind, size, filename, filetype, sha256=None, meta=None):
+    """ Opens a session for a file of `size` bytes. meta: what finalize needs (tp_id, or the TP fields). """
+    settings = get_settings()
+    if kind not in KINDS:
+        raise UploadError(400, f"kind must be one of {', '.join(KINDS)}")
+    if not filename or size is None or size <= 0:
+        raise UploadError(400, "filename and a positive size are required")
+    if size > settings.upload_max_size:
+        raise UploadError(413, f"File too large (max {settings.upload_max_size // (1024 * 1024)} MB)")
+
+    if time.time() - _last_gc[0] > GC_INTERVAL:
+        gc()
+
+    manifest = {"id": uuid.uuid4().hex, "user_id": user_id, "kind": kind, "size": size,
+                "filename": filename, "filetype": filetype or "application/octet-stream",
+                "sha256": (sha256 or "").lower() or None, "meta": meta or {},
+                "created_at": time.time(), "received": 0}
+    _, part = _paths(manifest["id"])
+    open(part, "wb").close()
+    _save(manifest)
+    return manifest
+
+
+def put_chunk(manifest, offset, stream, length, checksum=None):
+    """
+    Appends one chunk read from `stream` at `offset` (must equal the bytes received so far).
+    checksum: hex SHA-256 of the chunk; on mismatch the chunk is discarded.
+    """
+    settings = get_settings()
+    if length is None or length <= 0:
+        raise UploadError(411, "Content-Length required")
+    if length > settings.upload_chunk_size:
+        raise UploadError(413, f"Chunk larger than {settings.upload_chunk_size} bytes")
+
+    upload_id = manifest["id"]
+    _, part = _paths(upload_id)
+    with _lock(upload_id):
+        if not os.path.exists(part):  # finalized (or expired) meanwhile
+            raise UploadError(404, "Unknown or expired upload")
+        received = os.path.getsize(part)
+        if offset != received:
+            # Client resumes from the offset we report
+            raise UploadError(409, "Offset does not match the bytes received", received=received)
+        if received + length > manifest["size"]:
+            raise UploadError(416, "Chunk goes past the declared size", received=received)
+
+        digest = hashlib.sha256()
+        written = 0
+        with open(part, "r+b") as f:
+            f.seek(offset)
+            try:
+                while written < length:
+                    piece = stream.read(min(READ_SIZE, length - written))
+                    if not piece: break
+                    digest.update(piece)
+                    f.write(piece)
+                    written += len(piece)
+            except BaseException:
+                # Client gone mid-chunk: the bytes written so far were never verified
+                f.truncate(offset)
+                raise
+            if written != length or (checksum and digest.hexdigest() != checksum.lower()):
+                f.truncate(offset)
+                raise UploadError(422, "Chunk incomplete or checksum mismatch", received=received)
+            f.flush()
+            os.fsync(f.fileno())
+
+        manifest["received"] = received + written
+        manifest["touched_at"] = time.time()
+        _save(manifest)
+    return manifest
+
+
+def assembled(manifest):
+    """ Path of the complete file, after checking its size (and whole-file SHA-256 when declared). """
+    _, part = _paths(manifest["id"])
+    if manifest["received"] != manifest["size"]:
+        raise UploadError(409, "Upload incomplete", received=manifest["received"])
+    digest = hashlib.sha256()
+    for chunk in admission.SpooledFile(part):
+        digest.update(chunk)
+    manifest["computed_sha256"] = digest.hexdigest()
+    if manifest["sha256"] and manifest["sha256"] != manifest["computed_sha256"]:
+        raise UploadError(422, "File checksum mismatch: upload it again")
+    return part
+
+
+def discard(upload_id):
+    path, part = _paths(upload_id)
+    for p in (part, path):
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+
+
+def gc():
+    """ Deletes the sessions idle for longer than UPLOAD_SESSION_TTL. Returns how many. """
+    _last_gc[0] = time.time()
+    directory = _dir()
+    cutoff = time.time() - get_settings().upload_session_ttl
+    removed = 0
+    for name in os.listdir(directory):
+        ext = os.path.splitext(name)[1]
+        if ext not in (".json", ".part", ".tmp"):
+            continue
+        try:
+            if os.path.getmtime(os.path.join(directory, name)) < cutoff:
+                os.remove(os.path.join(directory, name))
+                removed += ext == ".json"
+        except FileNotFoundError:
+            pass
+    if removed:
+        print(f"🧹 Removed {removed} stale upload session(s)")
+    return removed
@@ -0,0 +1,105 @@
+import queue
+import threading
+
+# Data versions of the tables the dashboards render, and the in-process change bus.
+# SchoolDB write methods log their changes to the ChangeLog table (changefeed.py) in
+# the write transaction; changefeed.sync() then applies the log here, right after a
+# local commit and every CHANGE_POLL_INTERVAL seconds for other workers and scripts.
+# A table's version is the ChangeLog version of its latest change, so every worker
+# keys its caches the same way, and a write invalidates exactly the fragments built
+# from the tables it changed. When the writer knows which rows it changed their ids
+# are logged too, so a listener (e.g. the search index) can reload just those.
+#
+# bump() is a local counter, only seen by this process and kept apart from the log
+# version (so a later log entry can never land on a bumped value). SchoolDB._commit
+# bumps the tables it wrote in any case: sync() only reads the log below
+# MIN_ACTIVE_ROWVERSION, so while another transaction is open a process would not
+# see its own writes.
+#
+# Versions change at once; listeners run later on one notifier thread, so a write
+# (or a sync holding its lock) never waits for e.g. a search index reload.
+
+TABLES = ("users", "groups", "modules", "assignments", "tps", "annonces", "submissions", "presence")
+
+_versions = dict.fromkeys(TABLES, 0)
+_local = dict.fromkeys(TABLES, 0)
+_listeners = []
+_lock = threading.Lock()
+_pending = queue.Queue()
+_notifier = []
+
+
+def _notifier_loop():
+    while True:
+        listeners, tables, ids = _pending.get()
+        for fn in listeners:
+            try:
+                fn(tables, ids)
+            except Exception as e:
+                print(f"⚠️ Change listener {getattr(fn, '__name__', fn)} failed: {e}")
+
+
+def _notify(listeners, tables, ids):
+    """ Hands the change to the notifier thread (started on first use). """
+    if not listeners:
+        return
+    with _lock:
+        if not _notifier:
+            thread = threading.Thread(target=_notifier_loop, name="versions-notifier", daemon=True)
+            thread.start()
+            _notifier.append(thread)
+    _pending.put((listeners, tables, ids))
+
+
+def bump(*tables, ids=None, notify=True):
+    """ Local version bump. notify=False when the listeners will get the change from the log anyway. """
+    with _lock:
+        for table in tables:
+            _local[table] = _local.get(table, 0) + 1
+        listeners = list(_listeners)
+    if notify:
+        _notify(listeners, tables, ids)
+
+
+def seed(current):
+    """ Starting versions {table: version} read from the log; listeners are not called. """
+    with _lock:
+        for table, version in current.items():
+            _versions[table] = max(_versions.get(table, 0), version)
+
+
+def apply(changes):
+    """
+    Changes read from the log, oldest first: [(version, table, id or None), ...].
+    Listeners get each table once, with its ids (None if a change did not name its rows).
+    """
+    touched = {}
+    with _lock:
+        for version, table, row_id in changes:
+            _versions[table] = max(_versions.get(table, 0), version)
+            ids = touched.setdefault(table, set())
+            if row_id is None:
+                touched[table] = None
+            elif ids is not None:
+                ids.add(row_id)
+        listeners = list(_listeners)
+    for table, ids in touched.items():
+        _notify(listeners, (table,), sorted(ids) if ids is not None else None)
+
+
+def get(*tables):
+    """ Current versions of the given tables, as a tuple usable in a cache key. """
+    with _lock:
+        return tuple((_versions.get(t, 0), _local.get(t, 0)) for t in tables)
+
+
+def snapshot():
+    with _lock:
+        return dict(_versions)
+
+
+def on_change(fn):
+    """ Registers fn(tables, ids) to run after every change (ids is None if unknown). Usable as a decorator. """
+    with _lock:
+        _listeners.append(fn)
+    return fn
@@ -0,0 +1,56 @@
+import re
+import time
+import zipfile
+
+
+class _ChunkSink:
+    """
+    Write-only file object handed to ZipFile. It has no seek/tell, so zipfile
+    switches to streaming mode (data descriptors after each member) and we can
+    hand out the archive bytes as soon as they are produced.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def safe_name(text):
+    """ File-system friendly archive path component. """
+    text = re.sub(r"[^\w.\- ]+", "_", str(text or "").strip(), flags=re.UNICODE)
+    return text.strip(" ._") or "file"
+
+
+def stream_zip(entries):
+    """
+    Generator yielding a ZIP archive piece by piece.
+    entries: iterable of (arcname, chunks) where chunks is an iterable of bytes.
+    Only one chunk is held in memory at a time, whatever the archive size.
+    """
+    sink = _ChunkSink()
+    date_time = time.localtime()[:6]
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for arcname, chunks in entries:
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with zf.open(info, mode="w", force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data: yield data
+            data = sink.drain()
+            if data: yield data
+    # Central directory is written on close
+    data = sink.drain()
+    if data: yield data
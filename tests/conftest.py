@@ -0,0 +1,107 @@
+import os
+import sys
+
+import pytest
+
+# The app modules import each other as top-level modules (they run from src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from settings import get_settings
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """ Settings read again from the environment, with the spool in a temporary directory. """
+    def configure(**env):
+        monkeypatch.setenv("UPLOAD_SPOOL_PATH", str(tmp_path / "spool"))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        get_settings.cache_clear()
+        return get_settings()
+
+    configure()
+    yield configure
+    get_settings.cache_clear()
+
+
+class Row(tuple):
+    """ A result row with pyodbc-style attribute access (row.TPID). """
+
+    def __new__(cls, **fields):
+        row = super().__new__(cls, fields.values())
+        row._fields = dict(fields)
+        return row
+
+    def __getattr__(self, name):
+        try:
+            return self._fields[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+        self.description = None
+
+    def execute(self, sql, params=()):
+        self.conn.executed.append((" ".join(sql.split()), tuple(params)))
+        self.rows = list(self.conn.answer(sql, tuple(params)) or [])
+        first = self.rows[0] if self.rows else None
+        # (name, type_code) like pyodbc; the type is that of the first row's value.
+        # An empty SELECT still has a (here column-less) description.
+        if isinstance(first, Row):
+            self.description = [(name, type(value)) for name, value in first._fields.items()]
+        else:
+            self.description = [] if sql.lstrip().upper().startswith("SELECT") else None
+        return self
+
+    def executemany(self, sql, seq):
+        for params in seq:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchmany(self, size=1):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class FakeConnection:
+    """
+    Stands in for a pyodbc connection: answer(sql, params) returns the rows of each
+    statement. The session statements of isolation.py get neutral answers.
+    """
+
+    def __init__(self, answer=None):
+        self.executed = []
+        self.commits = self.rollbacks = 0
+        self._answer = answer or (lambda sql, params: [])
+
+    def answer(self, sql, params):
+        if "@@TRANCOUNT" in sql:
+            return [(0,)]
+        if "snapshot_isolation_state" in sql:
+            return [(1,)]
+        if "dm_exec_session_wait_stats" in sql:
+            return [(0, 0)]
+        return self._answer(sql, params)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def statements(self, containing):
+        return [(sql, params) for sql, params in self.executed if containing in sql]
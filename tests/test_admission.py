@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+
+import admission
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.005)
+
+
+class _Waiter(threading.Thread):
+    """ Enters admission.slot(route, user) and holds it until released. """
+
+    def __init__(self, route, user):
+        super().__init__(daemon=True)
+        self.route, self.user = route, user
+        self.admitted = threading.Event()
+        self.release = threading.Event()
+        self.error = None
+
+    def run(self):
+        try:
+            with admission.slot(self.route, self.user):
+                self.admitted.set()
+                self.release.wait(5)
+        except admission.Rejected as e:
+            self.error = e
+
+
+@pytest.fixture
+def slots(settings):
+    settings(UPLOAD_CONCURRENCY=2, UPLOAD_QUEUE_TIMEOUT=10)
+    started = []
+
+    def start(route, user):
+        waiter = _Waiter(route, user)
+        before = admission._seq[0]
+        waiter.start()
+        # Has its ticket before the next one arrives, so arrival order is known
+        _wait_for(lambda: admission._seq[0] > before)
+        started.append(waiter)
+        return waiter
+
+    yield start
+    for waiter in started:
+        waiter.release.set()
+        waiter.join(5)
+    assert admission._running() == 0 and not admission._waiting
+
+
+def test_free_slot_goes_to_user_with_fewest_uploads(slots):
+    a_first, other = slots("/submit", "a"), slots("/submit", "x")
+    assert a_first.admitted.wait(1) and other.admitted.wait(1)
+
+    a_second = slots("/upload_tp", "a")  # older, but "a" already has an upload in progress
+    b = slots("/submit", "b")
+    other.release.set()
+
+    assert b.admitted.wait(2)
+    assert not a_second.admitted.is_set()
+    a_first.release.set()
+    assert a_second.admitted.wait(2)
+
+
+def test_newer_request_on_same_route_supersedes_waiting_one(slots):
+    holders = [slots("/submit", "x"), slots("/submit", "y")]
+    older = slots("/submit", "a")
+    newer = slots("/submit", "a")
+
+    older.join(2)
+    assert older.error is not None and older.error.status == 409
+    assert admission.stats()["superseded"] >= 1
+
+    holders[0].release.set()
+    assert newer.admitted.wait(2)
+
+
+def test_full_queue_is_rejected_with_retry_after(slots, settings):
+    settings(UPLOAD_CONCURRENCY=1, UPLOAD_QUEUE_MAX=1, UPLOAD_QUEUE_TIMEOUT=10)
+    holder, queued = slots("/submit", "x"), slots("/submit", "y")
+    assert holder.admitted.wait(1) and not queued.admitted.is_set()
+
+    with pytest.raises(admission.Rejected) as rejected:
+        with admission.slot("/submit", "z"):
+            pass
+    assert rejected.value.status == 503 and rejected.value.retry_after
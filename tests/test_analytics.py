@@ -0,0 +1,74 @@
+import numpy as np
+
+import analytics
+
+
+def _cols(rows):
+    """ rows: (student, module, group, 'YYYY-MM-DD', present) """
+    days = np.array([r[3] for r in rows], dtype="datetime64[D]").astype(np.int64)
+    matrix = [(s, m, g, int(d), int(p)) for (s, m, g, _, p), d in zip(rows, days)]
+    return analytics.columns_from_matrix(np.array(matrix, dtype=np.int32))
+
+
+def test_columns_from_matrix():
+    cols = _cols([(7, 3, 2, "2024-09-02", 1)])
+    assert cols["day"][0] == np.datetime64("2024-09-02")
+    assert cols["present"].dtype == bool and cols["student"].tolist() == [7]
+
+
+def test_attendance_rates_per_student_and_module():
+    cols = _cols([(1, 10, 1, "2024-09-02", 1), (1, 10, 1, "2024-09-03", 0),
+                  (1, 11, 1, "2024-09-02", 1), (2, 10, 1, "2024-09-02", 0)])
+    keys, present, totals, rates = analytics.attendance_rates(cols, by=("student", "module"))
+
+    assert keys.tolist() == [[1, 10], [1, 11], [2, 10]]
+    assert present.tolist() == [1, 1, 0] and totals.tolist() == [2, 1, 1]
+    assert rates.tolist() == [50.0, 100.0, 0.0]
+
+
+def test_absence_streaks_follow_the_day_order():
+    # Out of order on purpose; per (student, module): A A P A A A (longest 3, current 3)
+    cols = _cols([(1, 10, 1, "2024-09-06", 0), (1, 10, 1, "2024-09-02", 0), (1, 10, 1, "2024-09-04", 1),
+                  (1, 10, 1, "2024-09-03", 0), (1, 10, 1, "2024-09-05", 0), (1, 10, 1, "2024-09-07", 0),
+                  (2, 10, 1, "2024-09-02", 0), (2, 10, 1, "2024-09-03", 1)])
+    keys, longest, current = analytics.absence_streaks(cols)
+
+    assert keys.tolist() == [[1, 10], [2, 10]]
+    assert longest.tolist() == [3, 1]
+    assert current.tolist() == [3, 0]
+
+
+def test_at_risk_flags_rule_rate_and_streak():
+    rows = [(1, 10, 1, f"2024-09-0{d}", 0) for d in range(1, 4)]          # 3 absences: excluded
+    rows += [(2, 10, 1, f"2024-09-0{d}", int(d != 4)) for d in range(1, 9)]  # 1/8 absent: fine
+    cols = _cols(rows)
+
+    risky = analytics.at_risk(cols)
+
+    assert [r["student_id"] for r in risky] == [1]
+    assert risky[0]["excluded"] and risky[0]["current_streak"] == 3 and risky[0]["rate"] == 0.0
+
+
+def test_empty_columns():
+    cols = analytics.columns_from_matrix(np.empty((0, 5), dtype=np.int32))
+    assert analytics.at_risk(cols) == [] and analytics.module_trends(cols) == []
+
+
+def test_weekly_trends_use_monday_weeks():
+    # Mon 2024-09-02 .. Sun 2024-09-08 is one week; Sun 2024-09-01 belongs to the week before
+    cols = _cols([(1, 10, 1, "2024-09-01", 0), (1, 10, 1, "2024-09-02", 1), (1, 10, 1, "2024-09-05", 0),
+                  (1, 10, 1, "2024-09-08", 1), (1, 10, 1, "2024-09-09", 1)])
+
+    assert analytics.module_trends(cols, unit="W") == [
+        (10, "2024-08-26", 0.0), (10, "2024-09-02", 66.7), (10, "2024-09-09", 100.0)]
+
+
+def test_monthly_trends():
+    cols = _cols([(1, 10, 1, "2024-09-30", 1), (1, 10, 1, "2024-10-01", 0)])
+    assert analytics.module_trends(cols, unit="M") == [(10, "2024-09-01", 100.0), (10, "2024-10-01", 0.0)]
+
+
+def test_period_starts_across_the_epoch():
+    days = np.array(["1969-12-29", "1970-01-01", "1970-01-04", "1970-01-05"], dtype="datetime64[D]")
+    assert [str(d) for d in analytics.period_starts(days, "W")] == [
+        "1969-12-29", "1969-12-29", "1969-12-29", "1970-01-05"]
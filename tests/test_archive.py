@@ -0,0 +1,72 @@
+from datetime import date
+
+import pytest
+
+import archive
+from conftest import FakeConnection
+from db_manager import SchoolDB
+
+
+@pytest.mark.parametrize("day, year", [(date(2024, 9, 1), 2024), (date(2025, 8, 31), 2024), (date(2025, 1, 15), 2024)])
+def test_year_of(day, year):
+    assert archive.year_of(day) == year
+
+
+def test_year_bounds_and_closed_years():
+    assert archive.year_bounds(2023) == (date(2023, 9, 1), date(2024, 9, 1))
+    today = date(2025, 3, 1)
+    assert archive.is_closed(2023, today)
+    assert not archive.is_closed(2024, today)
+
+
+def test_tables_point_reports_at_the_union_views_only_when_historical():
+    sql = "SELECT * FROM {Presence} P JOIN {Seance} S ON P.SeanceID = S.SeanceID"
+    assert sql.format(**archive.tables()) == "SELECT * FROM Presence P JOIN Seance S ON P.SeanceID = S.SeanceID"
+    assert "v_PresenceToutes" in sql.format(**archive.tables(historical=True))
+
+
+def _archiving(finished=(), batches=None):
+    """ A connection answering the archival statements; batches: step -> rows moved per batch. """
+    batches = {step: list(sizes) for step, sizes in (batches or {}).items()}
+
+    def answer(sql, params):
+        if "Statut = 'termine'" in sql and sql.startswith("SELECT"):
+            return [(step,) for step in finished]
+        for step, marker in (("presence", "INTO PresenceHist"), ("seance", "INTO SeanceHist"),
+                             ("soumission", "INTO SoumissionHist"), ("tp", "INTO TPHist")):
+            if marker in sql:
+                sizes = batches.get(step) or [0]
+                return [(sizes.pop(0),)]
+        return []
+    return FakeConnection(answer)
+
+
+def test_archival_moves_children_first_in_batches_and_skips_finished_steps():
+    db = SchoolDB()
+    db.conn = _archiving(finished=("presence",), batches={"seance": [2, 1], "tp": [3]})
+
+    result = db.archive_academic_year(2023, batch_size=2)
+
+    assert result == {"done": True, "moved": {"seance": 3, "soumission": 0, "tp": 3}, "error": False}
+    moves = [sql for sql, _ in db.conn.executed if "Hist" in sql and "DELETE" in sql]
+    assert not any("INTO PresenceHist" in sql for sql in moves)
+    first_tp = next(i for i, sql in enumerate(moves) if "INTO TPHist" in sql)
+    assert all("INTO TPHist" not in sql for sql in moves[:first_tp])
+    (_, params), *_ = db.conn.statements("INTO SeanceHist")
+    assert params == (2, 2023, date(2023, 9, 1), date(2024, 9, 1))
+    progress = [params[:2] for _, params in db.conn.statements("UPDATE ArchivageAnnee")]
+    assert progress[:3] == [(2, 2), (1, 1), (0, 0)]  # moved, then 0 marks the step 'termine'
+
+
+def test_archival_stops_after_max_seconds_and_resumes_later():
+    db = SchoolDB()
+    db.conn = _archiving(batches={"presence": [5] * 10})
+
+    result = db.archive_academic_year(2023, batch_size=5, max_seconds=-1)
+
+    assert result == {"done": False, "moved": {"presence": 5}, "error": False}
+
+
+def test_archive_job_refuses_an_open_year():
+    import tasks
+    assert tasks.archive_academic_year({"year": archive.year_of(date.today())})["skipped"] is True
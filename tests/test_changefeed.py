@@ -0,0 +1,90 @@
+import queue
+
+import pytest
+
+import changefeed
+import versions
+from conftest import FakeConnection, Row
+
+
+class ChangeLog:
+    """ ChangeLog rows [(version, table, id)] answered like SQL Server would. """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __call__(self, sql, params):
+        if "MIN(Version)" in sql:
+            return [(self.rows[0][0] if self.rows else None,)]
+        if "GROUP BY Tableau" in sql:
+            latest = {}
+            for version, table, _ in self.rows:
+                latest[table] = version
+            return list(latest.items())
+        if "FROM ChangeLog" in sql:
+            limit, after, *tables = params
+            found = [r for r in self.rows if r[0] > after and (not tables or r[1] in tables)]
+            return [Row(Version=v, Tableau=t, LigneID=i) for v, t, i in found[:limit]]
+        return []
+
+
+@pytest.fixture
+def state(monkeypatch):
+    monkeypatch.setattr(versions, "_versions", dict.fromkeys(versions.TABLES, 0))
+    monkeypatch.setattr(versions, "_local", dict.fromkeys(versions.TABLES, 0))
+    monkeypatch.setattr(versions, "_listeners", [])
+    monkeypatch.setattr(changefeed, "_position", [None])
+    heard = queue.Queue()
+    versions.on_change(lambda tables, ids: heard.put((tables, ids)))
+    return heard
+
+
+def test_record_logs_one_row_per_changed_row():
+    conn = FakeConnection()
+    changefeed.record(conn.cursor(), {"users": [3, "4"], "assignments": None, "tps": []})
+    assert [params for _, params in conn.executed] == [("users", 3), ("users", 4), ("assignments",)]
+
+
+def test_changes_since_pages_and_reports_pruned_history():
+    conn = FakeConnection(ChangeLog([(5, "users", 1), (6, "tps", 9), (7, "users", 2)]))
+
+    page = changefeed.changes_since(conn, 4, limit=2)
+    assert page == {"changes": [(5, "users", 1), (6, "tps", 9)], "version": 6, "more": True, "complete": True}
+    assert changefeed.changes_since(conn, 6, tables=["users"])["changes"] == [(7, "users", 2)]
+    assert changefeed.changes_since(conn, 2)["complete"] is False  # versions 3-4 were pruned
+
+
+def test_first_sync_seeds_then_later_syncs_apply_the_log(state):
+    log = ChangeLog([(5, "users", 1), (6, "tps", 9)])
+    conn = FakeConnection(log)
+
+    assert changefeed.sync(conn) == 0
+    assert versions.get("users", "tps") == ((5, 0), (6, 0))
+    assert state.empty()  # nothing to replay on the first sync
+
+    log.rows += [(7, "users", 2), (8, "users", 3), (9, "users", None)]
+    assert changefeed.sync(conn, batch_size=2) == 3
+    assert versions.get("users") == ((9, 0),)
+    assert changefeed.stats()["position"] == 9
+    # users changed in two pages; the page with an unnamed row reports ids None
+    assert [state.get(timeout=2) for _ in range(2)] == [(("users",), [2, 3]), (("users",), None)]
+
+
+def test_local_bump_is_kept_apart_from_the_log_version(state):
+    versions.seed({"users": 10})
+    versions.bump("users", ids=[4])
+    versions.apply([(11, "users", 5)])
+
+    assert versions.get("users") == ((11, 1),)
+    assert state.get(timeout=2) == (("users",), [4])
+    assert state.get(timeout=2) == (("users",), [5])
+
+
+def test_failing_listener_does_not_stop_the_others(state):
+    def broken(tables, ids):
+        raise RuntimeError("boom")
+    versions._listeners.insert(0, broken)
+
+    versions.bump("groups")
+
+    assert state.get(timeout=2) == (("groups",), None)
@@ -0,0 +1,108 @@
+import gzip
+
+import pytest
+from flask import Flask, Response
+
+import compression
+
+PAGE = "<p>" + "Présence du groupe G1 " * 400 + "</p>"
+
+
+class _FakeBrotli:
+    @staticmethod
+    def compress(data, quality):
+        return b"BR" + gzip.compress(data)
+
+
+@pytest.fixture
+def client(settings):
+    settings()
+    compression._cache.clear()
+    compression._cache_bytes[0] = 0
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route("/page")
+    def page():
+        return PAGE
+
+    @app.route("/tiny")
+    def tiny():
+        return "ok"
+
+    @app.route("/export.csv")
+    def export():
+        return Response((f"{i},{'x' * 50}\n" for i in range(200)), mimetype="text/csv")
+
+    @app.route("/file.pdf")
+    def pdf():
+        return Response(b"%PDF" + b"0" * 5000, mimetype="application/pdf")
+
+    return app.test_client()
+
+
+@pytest.fixture
+def with_brotli(monkeypatch):
+    monkeypatch.setattr(compression, "_brotli", lambda: _FakeBrotli)
+
+
+def test_gzip_page_with_etag_and_304(client):
+    response = client.get("/page", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).decode() == PAGE
+    assert "Accept-Encoding" in response.headers["Vary"]
+    etag = response.headers["ETag"]
+    assert etag.endswith('-gzip"')
+
+    again = client.get("/page", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert compression.stats()["endpoints"]["page"]["cache_hits"] == 1
+
+
+@pytest.mark.parametrize("header", ["", "identity", "gzip;q=0", "deflate", "*;q=0"])
+def test_refused_or_unsupported_encodings_are_not_used(client, header):
+    response = client.get("/page", headers={"Accept-Encoding": header})
+
+    assert "Content-Encoding" not in response.headers
+    assert response.get_data(as_text=True) == PAGE
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("*, br;q=0", "gzip"),
+])
+def test_brotli_negotiation_uses_q_values(client, with_brotli, header, expected):
+    assert client.get("/page", headers={"Accept-Encoding": header}).headers["Content-Encoding"] == expected
+
+
+def test_streamed_body_is_gzipped_chunk_by_chunk(client, with_brotli):
+    response = client.get("/export.csv", headers={"Accept-Encoding": "br, gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data).decode().startswith("0,xxx")
+
+
+def test_streamed_body_without_gzip(client):
+    response = client.get("/export.csv", headers={"Accept-Encoding": "br, gzip;q=0"})
+
+    assert "Content-Encoding" not in response.headers
+
+
+def test_small_and_binary_bodies_are_left_alone(client):
+    assert "Content-Encoding" not in client.get("/tiny", headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get("/file.pdf", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_cache_is_bounded(settings):
+    settings(COMPRESS_CACHE_ENTRIES=2)
+    compression._cache.clear()
+    compression._cache_bytes[0] = 0
+    for i in range(4):
+        compression._cache_put((f"etag{i}", False), b"x" * 10)
+
+    assert list(compression._cache) == [("etag2", False), ("etag3", False)]
+    assert compression._cache_bytes[0] == 20
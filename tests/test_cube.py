@@ -0,0 +1,70 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+import analytics
+from conftest import FakeConnection, Row
+from db_manager import SchoolDB
+
+
+def _db(rows):
+    db = SchoolDB(use_replica=False)
+    db.conn = FakeConnection(lambda sql, params: rows if "AttendanceCube" in sql else [])
+    return db
+
+
+def _query(db):
+    (sql, params), = db.conn.statements("FROM AttendanceCube")
+    return sql, params
+
+
+def test_roll_up_by_dimension_with_filters():
+    db = _db([Row(filiere_id=1, filiere="IL", Present=45, Total=60), Row(filiere_id=2, filiere="ADIA", Present=0, Total=0)])
+
+    rows = SchoolDB.query_attendance_cube(db, ["filiere"], filters={"module": 3, "date_from": "2024-09-01"})
+
+    sql, params = _query(db)
+    assert "C.FiliereID AS filiere_id" in sql and "JOIN Filiere F" in sql
+    assert "WHERE C.ModuleID = ? AND C.Jour >= ?" in sql and params == (3, "2024-09-01")
+    assert "GROUP BY C.FiliereID, F.NomFiliere" in sql
+    assert rows == [{"filiere_id": 1, "filiere": "IL", "present": 45, "total": 60, "rate": 75.0},
+                    {"filiere_id": 2, "filiere": "ADIA", "present": 0, "total": 0, "rate": 0}]
+
+
+def test_drill_down_by_week():
+    db = _db([Row(groupe_id=4, groupe="G4", Periode="2024-09-02 00:00:00", Present=9, Total=12)])
+
+    rows = SchoolDB.query_attendance_cube(db, ["groupe"], grain="week")
+
+    sql, _ = _query(db)
+    assert SchoolDB.CUBE_GRAINS["week"] + " AS Periode" in sql
+    assert "ORDER BY Periode, Total DESC" in sql
+    assert rows[0]["period"] == "2024-09-02" and rows[0]["rate"] == 75.0
+
+
+def test_grand_total_without_dimensions():
+    db = _db([Row(Present=3, Total=4)])
+
+    assert SchoolDB.query_attendance_cube(db, []) == [{"present": 3, "total": 4, "rate": 75.0}]
+    assert "GROUP BY" not in _query(db)[0]
+
+
+def _sql_week_start(day):
+    # DATEADD(DAY, -(DATEDIFF(DAY, 0, Jour) % 7), Jour), day 0 being 1900-01-01
+    return day - timedelta(days=(day - date(1900, 1, 1)).days % 7)
+
+
+@pytest.mark.parametrize("day, monday", [
+    (date(2024, 9, 1), date(2024, 8, 26)),  # Sunday: end of the previous week
+    (date(2024, 9, 2), date(2024, 9, 2)),
+    (date(2024, 9, 8), date(2024, 9, 2)),
+])
+def test_cube_week_starts_on_monday(day, monday):
+    assert _sql_week_start(day) == monday
+
+
+def test_cube_and_analytics_agree_on_weeks():
+    days = [date(2024, 8, 1) + timedelta(days=i) for i in range(400)]
+    starts = analytics.period_starts(np.array(days, dtype="datetime64[D]"), "W")
+    assert [_sql_week_start(d) for d in days] == [d.astype(date) for d in starts]
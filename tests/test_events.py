@@ -0,0 +1,50 @@
+import queue
+import time
+
+from events import EventBroker, FileEventBroker, group_channel
+
+
+def test_publish_reaches_only_the_channel_subscribers():
+    broker = EventBroker()
+    g1, g2 = broker.subscribe(group_channel(1)), broker.subscribe(group_channel(2))
+
+    broker.publish(group_channel(1), {"type": "tp", "id": 7})
+
+    assert g1.get_nowait() == {"type": "tp", "id": 7}
+    assert g2.empty()
+
+
+def test_slow_subscriber_drops_events_instead_of_blocking():
+    broker = EventBroker(max_queue=2)
+    q = broker.subscribe("group-1")
+    for i in range(5):
+        broker.publish("group-1", i)
+    assert [q.get_nowait(), q.get_nowait()] == [0, 1]
+    assert q.empty()
+
+
+def test_unsubscribe_drops_the_empty_channel():
+    broker = EventBroker()
+    q = broker.subscribe("group-1")
+    broker.unsubscribe("group-1", q)
+    broker.publish("group-1", "x")
+    assert q.empty()
+    assert "group-1" not in broker._subscribers
+
+
+def test_file_broker_delivers_events_across_workers(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    publisher = FileEventBroker(path, poll_interval=0.01)
+    listener = FileEventBroker(path, poll_interval=0.01)
+    q = listener.subscribe("group-3")
+    time.sleep(0.1)  # the tail starts at the end of the spool
+
+    publisher.publish("group-4", {"id": 1})
+    publisher.publish("group-3", {"id": 2, "title": "TP réseaux"})
+
+    assert q.get(timeout=2) == {"id": 2, "title": "TP réseaux"}
+    try:
+        extra = q.get(timeout=0.1)
+    except queue.Empty:
+        extra = None
+    assert extra is None
@@ -0,0 +1,76 @@
+import csv
+from datetime import date, datetime
+
+import pytest
+
+import exports
+from conftest import FakeConnection, Row
+
+
+def _attendance(sql, params):
+    start, end = params
+    # One session per day of January 2025, a student absent on the 1st
+    return [Row(SeanceID=d, DateDebut=datetime(2025, 1, d, 8, 30), EtudiantID=7, CNE="S-7",
+                Etat="Absent" if d == 1 else "Present", Note=None)
+            for d in range(1, 32) if start <= date(2025, 1, d) < end]
+
+
+def test_month_windows_clip_to_the_range():
+    assert exports.month_windows(date(2024, 11, 15), date(2025, 2, 3)) == [
+        ("2024-11", date(2024, 11, 15), date(2024, 12, 1)),
+        ("2024-12", date(2024, 12, 1), date(2025, 1, 1)),
+        ("2025-01", date(2025, 1, 1), date(2025, 2, 1)),
+        ("2025-02", date(2025, 2, 1), date(2025, 2, 3)),
+    ]
+
+
+def test_batches_read_the_hot_or_archived_tables():
+    conn = FakeConnection(_attendance)
+    batches = list(exports.iter_batches(conn, "attendance", date(2025, 1, 1), date(2025, 2, 1), batch_size=10))
+    list(exports.iter_batches(conn, "attendance", date(2025, 1, 1), date(2025, 1, 2), historical=True))
+
+    assert [len(rows) for _, rows in batches] == [10, 10, 10, 1]
+    columns = batches[0][0]
+    assert columns[:2] == ["SeanceID", "DateDebut"] and columns.types[:2] == [int, datetime]
+    hot, historical = (sql for sql, _ in conn.executed)
+    assert "FROM Presence P" in hot and "{" not in hot
+    assert "FROM Presence P" not in historical
+
+
+def test_csv_chunks_write_the_header_once():
+    columns = exports.Columns([("a", int), ("b", str)])
+    text = "".join(exports.csv_chunks([(columns, [(1, "x")]), (columns, [(2, "y, z")])]))
+    assert list(csv.reader(text.splitlines())) == [["a", "b"], ["1", "x"], ["2", "y, z"]]
+
+
+def test_export_dataset_writes_one_csv_per_non_empty_month(tmp_path):
+    conn = FakeConnection(_attendance)
+
+    written = exports.export_dataset(conn, "attendance", date(2024, 12, 20), date(2025, 3, 1), "csv", str(tmp_path))
+
+    assert [(p.rsplit("/", 1)[-1], n) for p, n in written] == [("2025-01.csv", 31)]
+    assert sorted(f.name for f in (tmp_path / "attendance").iterdir()) == ["2025-01.csv"]
+
+
+def test_parquet_schema_comes_from_the_column_types(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    from decimal import Decimal
+    columns = exports.Columns([("SoumissionID", int), ("Note", Decimal), ("DateSoumission", datetime), ("Code", None)])
+    batches = [(columns, [(1, None, datetime(2025, 1, 2, 9, 0), "x")]),
+               (columns, [(2, Decimal("14.50"), datetime(2025, 1, 3, 9, 0), None)])]
+
+    assert exports.write_file(iter(batches), str(tmp_path / "g.parquet"), "parquet") == 2
+
+    table = pq.read_table(tmp_path / "g.parquet")
+    assert table.schema.field("Note").type == pa.float64()  # NULL in the first batch
+    assert table.schema.field("DateSoumission").type == pa.timestamp("ms")
+    assert table.schema.field("Code").type == pa.string()
+    assert table.column("Note").to_pylist() == [None, 14.5]
+
+
+def test_needs_history_before_the_current_academic_year():
+    today = date(2025, 3, 1)
+    assert exports.academic_year_bounds(today) == (date(2024, 9, 1), date(2025, 9, 1))
+    assert exports.needs_history(date(2024, 8, 31), today)
+    assert not exports.needs_history(date(2024, 9, 1), today)
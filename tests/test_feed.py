@@ -0,0 +1,96 @@
+from datetime import datetime
+
+import pytest
+
+from conftest import FakeConnection, Row
+from db_manager import (SchoolDB, _keyset_clause, decode_feed_cursor, decode_since_cursor, encode_feed_cursor,
+                        encode_since_cursor)
+
+
+def _tp(tp_id, deadline):
+    return Row(TPID=tp_id, Titre=f"TP {tp_id}", Description="", DateLimite=deadline, NomModule="Réseaux")
+
+
+def _db(answer):
+    db = SchoolDB()
+    db.conn = FakeConnection(answer)
+    return db
+
+
+def test_feed_cursor_round_trip():
+    when = datetime(2024, 9, 2, 8, 30)
+    assert decode_feed_cursor(encode_feed_cursor(when, 'TP', 12)) == (when, 'TP', 12)
+    assert decode_feed_cursor(encode_feed_cursor(None, 'Annonce', 3)) == (None, 'Annonce', 3)
+    assert decode_feed_cursor("not a cursor") is None
+
+
+def test_since_cursor_round_trip():
+    assert decode_since_cursor(encode_since_cursor(41, 7), 2) == (41, 7)
+    assert decode_since_cursor(encode_since_cursor(41), 2) is None  # student cursor on the teacher feed
+    assert decode_since_cursor(encode_feed_cursor(None, 'TP', 3), 1) is None
+    assert decode_since_cursor(None, 1) is None
+
+
+@pytest.mark.parametrize("cursor, branch, sql, params", [
+    ((datetime(2024, 9, 2), 'TP', 5), 'TP', "(D < ? OR D IS NULL OR (D = ? AND (I < ?)))",
+     (datetime(2024, 9, 2), datetime(2024, 9, 2), 5)),
+    # Same date: 'TP' sorts above 'Annonce' (type DESC), so every Annonce of that date comes after a TP cursor
+    ((datetime(2024, 9, 2), 'TP', 5), 'Annonce', "(D < ? OR D IS NULL OR (D = ? AND (1=1)))",
+     (datetime(2024, 9, 2), datetime(2024, 9, 2))),
+    ((datetime(2024, 9, 2), 'Annonce', 5), 'TP', "(D < ? OR D IS NULL OR (D = ? AND (1=0)))",
+     (datetime(2024, 9, 2), datetime(2024, 9, 2))),
+    ((None, 'TP', 5), 'TP', "(D IS NULL AND (I < ?))", (5,)),
+])
+def test_keyset_clause(cursor, branch, sql, params):
+    assert _keyset_clause("D", branch, "I", cursor) == (sql, params)
+
+
+def test_new_since_last_seen_is_keyed_on_tpid_not_deadline():
+    # The top card has the latest deadline; TP 9 is published after it, with an earlier deadline
+    def answer(sql, params):
+        if "TP.TPID > ?" in sql:
+            return [_tp(9, datetime(2024, 9, 10)), _tp(10, datetime(2024, 12, 1))]
+        return []
+
+    db = _db(answer)
+    page = SchoolDB.get_student_feed(db, groupe_id=2, after=encode_since_cursor(8))
+
+    (sql, params), = db.conn.statements("TP.TPID > ?")
+    assert params[1:] == (2, 8)
+    assert [item["id"] for item in page["items"]] == [10, 9]  # feed order: deadline DESC
+    assert decode_since_cursor(page["top_cursor"], 1) == (10,)
+    assert page["next_cursor"] is None
+
+
+def test_first_page_top_cursor_is_the_highest_tpid_of_the_group():
+    def answer(sql, params):
+        if "MAX(TPID)" in sql:
+            return [(14,)]
+        if "ORDER BY TP.DateLimite DESC" in sql:
+            return [_tp(3, datetime(2025, 1, 1)), _tp(14, datetime(2024, 10, 1))]
+        return []
+
+    page = SchoolDB.get_student_feed(_db(answer), groupe_id=2, limit=2)
+
+    assert decode_since_cursor(page["top_cursor"], 1) == (14,)
+    assert decode_feed_cursor(page["next_cursor"]) == (datetime(2024, 10, 1), 'TP', 14)
+
+
+def test_teacher_feed_keys_tps_and_announcements_on_their_own_ids():
+    def answer(sql, params):
+        if "TP.TPID > ?" in sql:
+            return [Row(ID=31, Titre="TP", DateItem=datetime(2024, 9, 1), Type='TP', NomGroupe="G1",
+                        NomModule="M", HasImage=0),
+                    Row(ID=12, Titre="News", DateItem=datetime(2024, 9, 5), Type='Annonce', NomGroupe="G1",
+                        NomModule="M", HasImage=1)]
+        return []
+
+    db = _db(answer)
+    page = SchoolDB.get_formateur_feed(db, formateur_id=4, after=encode_since_cursor(30, 11))
+
+    (sql, params), = db.conn.statements("TP.TPID > ?")
+    assert "A.AnnonceID > ?" in sql and "DateLimite >" not in sql and "DatePublication >" not in sql
+    assert params[1:3] == (4, 30) and params[4:] == (4, 11)
+    assert [(i["type"], i["id"]) for i in page["items"]] == [('Annonce', 12), ('TP', 31)]
+    assert page["items"][0]["thumb_url"] == "/annonce_image/12/thumb"
+    assert decode_since_cursor(page["top_cursor"], 2) == (31, 12)
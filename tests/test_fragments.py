@@ -0,0 +1,62 @@
+import pytest
+from flask import Flask, render_template_string
+
+import fragments
+import versions
+
+PAGE = '{% cache "users", "users", who %}{% for u in users %}{{ u }};{% endfor %}{% endcache %}'
+
+
+@pytest.fixture
+def render(settings, monkeypatch):
+    settings(FRAGMENT_CACHE_TTL="60", FRAGMENT_CACHE_ENTRIES="2")
+    monkeypatch.setattr(fragments, "_cache", type(fragments._cache)())
+    monkeypatch.setattr(fragments, "_stats", {})
+    monkeypatch.setitem(versions._local, "users", versions._local["users"])
+    app = Flask(__name__)
+    fragments.init_app(app)
+    loads = []
+
+    def render(who="admin"):
+        users = fragments.Lazy(lambda: loads.append(who) or ["Sara", "Omar"])
+        with app.app_context():
+            return render_template_string(PAGE, users=users, who=who)
+    render.loads = loads
+    return render
+
+
+def test_hit_skips_the_lazy_query(render):
+    assert render() == render() == "Sara;Omar;"
+    assert render.loads == ["admin"]
+    assert fragments.stats()["fragments"]["users"]["hit_rate"] == 50.0
+
+
+def test_table_change_invalidates(render):
+    render()
+    versions.bump("users", notify=False)
+    render()
+    assert render.loads == ["admin", "admin"]
+
+
+def test_vary_arguments_and_entry_bound(render):
+    for who in ("a", "b", "c", "a"):
+        render(who)
+    assert render.loads == ["a", "b", "c", "a"]  # "a" was evicted by "c"
+    assert fragments.stats()["entries"] == 2
+
+
+def test_expired_entry_is_rendered_again(render, monkeypatch):
+    render()
+    now = fragments.time.time()
+    monkeypatch.setattr(fragments.time, "time", lambda: now + 61)
+    render()
+    assert len(render.loads) == 2
+
+
+def test_lazy_loads_once_on_first_use():
+    calls = []
+    value = fragments.Lazy(lambda: calls.append(1) or {"rows": [1, 2]})
+    rows = value.then(lambda v: v["rows"])
+    assert not calls
+    assert len(rows) == 2 and 2 in rows and value["rows"] == [1, 2]
+    assert calls == [1]
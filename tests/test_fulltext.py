@@ -0,0 +1,74 @@
+import pytest
+
+import fulltext
+
+
+@pytest.fixture
+def index(settings, tmp_path):
+    settings(FULLTEXT_BACKEND="sqlite", FULLTEXT_PATH=str(tmp_path / "fulltext.sqlite3"))
+    fulltext.get_index.cache_clear()
+    yield fulltext.get_index()
+    fulltext.get_index.cache_clear()
+
+
+class _ScopedDB:
+    """ Sees only the hashes in `visible`; records the hashes each lookup asked about. """
+
+    def __init__(self, visible):
+        self.visible = visible
+        self.asked = []
+
+    def search_documents(self, role, user_id, groupe_id, hashes=None, **kwargs):
+        self.asked.append(list(hashes))
+        return [{"sha256": h, "name": f"{h}.pdf"} for h in reversed(hashes) if h in self.visible]
+
+
+def test_query_builders_quote_words_as_prefixes():
+    assert fulltext.fts5_query('Réseau "TCP"; drop') == '"Réseau"* "TCP"* "drop"*'
+    assert fulltext.contains_query("réseau tcp") == '"réseau*" AND "tcp*"'
+    assert fulltext.fts5_query("-- ;") == ""
+    assert len(fulltext.contains_query("a " * 20).split(" AND ")) == fulltext.MAX_TERMS
+
+
+def test_sqlite_index_matches_prefixes_without_accents(index):
+    index.store(None, "h1", "Configuration du routage statique sur un réseau local")
+    index.store(None, "h1", "stored once per hash")
+    index.store(None, "h2", "Rapport : protocole TCP et UDP")
+
+    assert index.has(None, "h1") and not index.has(None, "h3")
+    assert [sha for sha, _ in index.match("reseau rout", 10)] == ["h1"]
+    (sha, snippet), = index.match("tcp", 10)
+    assert sha == "h2" and "[TCP]" in snippet
+    assert index.stats() == {"backend": "sqlite", "documents": 2,
+                             "chars": len("Configuration du routage statique sur un réseau local")
+                             + len("Rapport : protocole TCP et UDP")}
+
+
+def test_search_pages_through_matches_outside_the_users_scope(index):
+    for i in range(30):
+        # The visible files are longer, so they rank last
+        padding = " suivi des séances et annexes" * 20 if i in (3, 17, 29) else ""
+        index.store(None, f"h{i:02}", f"compte rendu TP réseau numéro {i}{padding}")
+    db = _ScopedDB(visible={"h03", "h17", "h29"})
+
+    found = fulltext.search(db, "reseau", "Etudiant", 5, groupe_id=1, limit=2)
+
+    assert len(found) == 2 and all(d["snippet"] for d in found)
+    assert {d["sha256"] for d in found} <= db.visible
+    # 10 hits (none visible), then the next 20
+    assert [len(asked) for asked in db.asked] == [10, 20]
+
+
+def test_index_file_skips_known_hashes_and_non_pdfs(index):
+    index.store(None, "known", "déjà indexé")
+    assert fulltext.index_file(None, "known", b"%PDF-1.7 ...") is False
+    assert fulltext.index_file(None, "docx", b"PK\x03\x04") is False
+    assert fulltext.extract_text(b"") is None
+
+
+def test_unknown_backend_is_rejected(settings):
+    settings(FULLTEXT_BACKEND="elastic")
+    fulltext.get_index.cache_clear()
+    with pytest.raises(ValueError):
+        fulltext.get_index()
+    fulltext.get_index.cache_clear()
@@ -0,0 +1,84 @@
+import pytest
+
+import app as app_module
+from conftest import FakeConnection, Row
+from db_manager import SchoolDB
+
+
+def _existing(*ids):
+    """ Answers the bulk UPDATE with the rows of its VALUES list that exist. """
+    def answer(sql, params):
+        if sql.lstrip().startswith("UPDATE S SET S.Note"):
+            return [Row(SoumissionID=sub_id) for sub_id in params[::2] if sub_id in ids]
+        return []
+    return answer
+
+
+def test_save_grades_bulk_keeps_the_last_grade_of_a_repeated_submission():
+    db = SchoolDB()
+    db.conn = FakeConnection(_existing(1, 2))
+
+    updated = db.save_grades_bulk([(1, 10.0), (2, 12.0), (1, 15.5)])
+
+    assert updated == {1, 2}
+    (sql, params), = db.conn.statements("UPDATE S SET S.Note")
+    assert sql.count("(?, ?)") == 2
+    assert list(params) == [1, 15.5, 2, 12.0]
+
+
+def test_save_grades_bulk_batches_distinct_ids():
+    db = SchoolDB()
+    db.conn = FakeConnection(_existing(*range(5)))
+
+    updated = db.save_grades_bulk([(i % 5, float(i)) for i in range(10)], batch_size=2)
+
+    assert updated == set(range(5))
+    assert len(db.conn.statements("UPDATE S SET S.Note")) == 3
+    assert db.conn.commits == 1
+
+
+class _FakeDB:
+    saved = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def save_grades_bulk(self, grades):
+        _FakeDB.saved = list(grades)
+        return {sub_id for sub_id, _ in grades if sub_id != 404}
+
+
+@pytest.fixture
+def client(settings, monkeypatch):
+    settings(JOB_WORKERS="0")
+    monkeypatch.setattr(app_module, "_background_started", True)
+    monkeypatch.setattr(app_module, "SchoolDB", _FakeDB)
+    app_module.app.config["TESTING"] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as session:
+            session.update(user_id=1, role="Formateur")
+        yield client
+
+
+def test_grade_submissions_answers_in_request_order(client):
+    grades = [
+        {"submission_id": 3, "grade": 9},
+        {"submission_id": "x", "grade": 10},
+        {"submission_id": 404, "grade": 11},
+        {"submission_id": 3, "grade": 14},
+        {"submission_id": 5, "grade": 25},
+        {"submission_id": 7, "grade": 18},
+    ]
+
+    body = client.post("/api/grade_submissions", json={"grades": grades}).get_json()
+
+    assert _FakeDB.saved == [(3, 14.0), (404, 11.0), (7, 18.0)]
+    assert [(r["submission_id"], r["status"]) for r in body["results"]] == [
+        (3, "duplicate"), ("x", "invalid"), (404, "not_found"),
+        (3, "ok"), (5, "invalid"), (7, "ok"),
+    ]
+    assert body["results"][3]["grade"] == 14.0
+    assert body["message"] == "2 grade(s) saved."
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+import images
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(size, mode="RGBA"):
+    out = io.BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_variants_are_shrunk_jpegs_within_their_box():
+    variants = images.build_variants(_png((2000, 1000)))
+
+    assert set(variants) == {"thumb", "display"}
+    assert (variants["thumb"]["width"], variants["thumb"]["height"]) == (320, 160)
+    assert (variants["display"]["width"], variants["display"]["height"]) == (1280, 640)
+    for v in variants.values():
+        assert v["type"] == "image/jpeg"
+        assert v["data"][:2] == b"\xff\xd8"
+        assert Image.open(io.BytesIO(v["data"])).mode == "RGB"  # alpha flattened
+        assert len(v["etag"]) == 40
+
+
+def test_small_images_are_never_upscaled():
+    variants = images.build_variants(_png((100, 50), mode="RGB"))
+    assert (variants["display"]["width"], variants["display"]["height"]) == (100, 50)
+
+
+def test_exif_rotation_is_applied():
+    out = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90° clockwise
+    Image.new("RGB", (400, 200)).save(out, format="JPEG", exif=exif)
+
+    thumb = images.build_variants(out.getvalue())["thumb"]
+
+    assert (thumb["width"], thumb["height"]) == (160, 320)
+
+
+@pytest.mark.parametrize("data", [b"", b"not an image"])
+def test_unreadable_bytes_give_no_variants(data):
+    assert images.build_variants(data) == {}
+
+
+def test_without_pillow_there_are_no_variants(monkeypatch):
+    import builtins
+    real_import = builtins.__import__
+
+    def no_pil(name, *args, **kwargs):
+        if name == "PIL" or name.startswith("PIL."):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_pil)
+    assert images.build_variants(_png((10, 10))) == {}
@@ -0,0 +1,53 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+# Import-time budget for the web app.
+# Runs `import app` in a fresh interpreter with -X importtime and fails when the
+# app's own import time exceeds the budget or when a heavy optional module
+# (NumPy, pyarrow, Pillow, pypdf, pyodbc) is loaded eagerly at import.
+# Flask itself takes most of the total and varies with the machine, so the budget
+# is for `import app` minus a bare `import flask` measured the same way.
+# IMPORT_BUDGET_MS overrides the budget (default 150).
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+LAZY_MODULES = ["numpy", "pyarrow", "PIL", "pypdf", "pyodbc"]
+RUNS = 3
+
+
+def measure(module):
+    """ {module: cumulative import ms} of `import module` in a fresh interpreter. """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=SRC, env=dict(os.environ, JOB_WORKERS="0"), capture_output=True, text=True)
+    assert proc.returncode == 0, f"import {module} failed:\n{proc.stderr[-2000:]}"
+    modules = {}
+    for line in proc.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if m:
+            modules[m.group(4)] = int(m.group(2)) / 1000.0
+    return modules
+
+
+@pytest.fixture(scope="module")
+def app_imports():
+    # Best of a few runs: the first one also pays for cold disk caches
+    return min((measure("app") for _ in range(RUNS)), key=lambda m: m.get("app", float("inf")))
+
+
+def test_heavy_modules_are_not_imported_eagerly(app_imports):
+    eager = [m for m in LAZY_MODULES if m in app_imports]
+    assert not eager, f"Loaded at import time (should be lazy): {', '.join(eager)}"
+
+
+def test_import_time_budget(app_imports):
+    budget_ms = float(os.getenv("IMPORT_BUDGET_MS", "150"))
+    total = app_imports["app"]
+    baseline = min(measure("flask").get("flask", 0.0) for _ in range(RUNS))
+    own = max(total - baseline, 0.0)
+    slowest = sorted(((t, n) for n, t in app_imports.items() if "." not in n), reverse=True)[:10]
+    assert own <= budget_ms, (
+        f"import app took {total:.1f} ms, {own:.1f} ms over bare Flask ({baseline:.1f} ms), "
+        f"budget {budget_ms:.0f} ms; slowest: " + ", ".join(f"{n} {t:.1f} ms" for t, n in slowest))
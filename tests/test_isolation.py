@@ -0,0 +1,123 @@
+import sqlite3
+
+import pytest
+
+import isolation
+from conftest import FakeConnection
+
+
+class Deadlock(Exception):
+    pass
+
+
+DEADLOCK = Deadlock("40001", "[40001] Transaction was deadlocked on lock resources (1205) (SQLExecDirectW)")
+
+
+class Store:
+    """ A SchoolDB-like object: write methods roll back, then call raise_if_retryable. """
+
+    def __init__(self, conn, failures=0):
+        self.conn = conn
+        self.failures = failures
+        self.calls = 0
+
+    @isolation.write_transaction(retries=2)
+    def save(self):
+        self.calls += 1
+        try:
+            if self.calls <= self.failures:
+                raise DEADLOCK
+            self.conn.commit()
+            return True
+        except Exception as e:
+            self.conn.rollback()
+            isolation.raise_if_retryable(self, e)
+            return False
+
+    @isolation.read_isolation('SNAPSHOT')
+    def read(self):
+        return self.conn.cursor().execute("SELECT 1").fetchall()
+
+    @isolation.write_transaction
+    def save_then_read(self):
+        return self.read()
+
+
+@pytest.fixture(autouse=True)
+def fresh(settings, monkeypatch):
+    settings(DB_TRACK_LOCK_WAITS="0")
+    monkeypatch.setattr(isolation.time, "sleep", lambda s: None)
+    monkeypatch.setitem(isolation._snapshot, "allowed", None)
+    monkeypatch.setattr(isolation, "stats", dict.fromkeys(isolation.stats, 0))
+
+
+@pytest.mark.parametrize("message, number", [
+    ("[40001] Transaction was deadlocked (1205) (SQLExecDirectW)", 1205),
+    ("[HYT00] Lock request time out period exceeded. (1222)", 1222),
+    ("[42000] Snapshot isolation transaction aborted (3960)", 3960),
+    ("[23000] Violation of UNIQUE KEY constraint (2627)", None),
+])
+def test_sql_error_number(message, number):
+    assert isolation.sql_error_number(Exception("HY000", message)) == number
+
+
+def test_deadlock_victim_is_retried():
+    store = Store(FakeConnection(), failures=2)
+
+    assert store.save() is True
+    assert store.calls == 3
+    assert store.conn.rollbacks == 2
+    assert isolation.stats["deadlocks"] == isolation.stats["retries"] == 2
+    timeouts = [sql for sql, _ in store.conn.statements("SET LOCK_TIMEOUT")]
+    assert timeouts == ["SET LOCK_TIMEOUT 5000", "SET LOCK_TIMEOUT -1"] * 3
+
+
+def test_last_attempt_reports_the_error_the_usual_way():
+    store = Store(FakeConnection(), failures=10)
+
+    assert store.save() is False
+    assert store.calls == 3
+    assert isolation.stats["gave_up"] == 1
+
+
+def test_read_runs_in_its_own_snapshot_transaction():
+    store = Store(FakeConnection())
+
+    store.read()
+
+    levels = [sql for sql, _ in store.conn.statements("ISOLATION LEVEL")]
+    assert levels == ["SET TRANSACTION ISOLATION LEVEL SNAPSHOT", "SET TRANSACTION ISOLATION LEVEL READ COMMITTED"]
+    assert store.conn.commits == 1
+    assert isolation.stats["reads"] == 1
+
+
+def test_read_falls_back_when_snapshot_is_not_allowed():
+    conn = FakeConnection()
+    conn.answer = lambda sql, params: [(0,)]  # no open transaction, snapshot_isolation_state = 0
+    store = Store(conn)
+
+    store.read()
+
+    assert conn.statements("ISOLATION LEVEL")[0][0] == "SET TRANSACTION ISOLATION LEVEL READ COMMITTED"
+
+
+def test_open_transaction_is_ended_before_a_read_but_not_inside_a_write():
+    conn = FakeConnection()
+    trancount = FakeConnection.answer
+    conn.answer = lambda sql, params: [(1,)] if "@@TRANCOUNT" in sql else trancount(conn, sql, params)
+    store = Store(conn)
+
+    store.read()
+    assert isolation.stats["reads_ended_open_tx"] == 1
+    assert conn.commits == 2
+
+    conn.executed.clear()
+    store.save_then_read()
+    assert isolation.stats["reads_in_write"] == 1
+    assert not conn.statements("ISOLATION LEVEL")
+
+
+def test_sqlite_connections_are_left_alone():
+    store = Store(sqlite3.connect(":memory:"))
+    assert store.read() == [(1,)]
+    assert isolation.stats["reads"] == 0
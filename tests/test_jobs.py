@@ -0,0 +1,57 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+@pytest.fixture
+def queue(settings, tmp_path, monkeypatch):
+    settings(JOB_QUEUE_PATH=str(tmp_path / "jobs.sqlite3"), JOB_STALE_SECONDS="1")
+    monkeypatch.setattr(jobs, "_handlers", {})
+    conn = jobs._connect()
+    yield conn
+    conn.close()
+
+
+def _status(conn, job_id):
+    return conn.execute("SELECT status, updated_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_long_running_job_keeps_its_claim(queue):
+    started, release = threading.Event(), threading.Event()
+
+    @jobs.handler("slow")
+    def slow(payload):
+        started.set()
+        release.wait(5)
+        return {"n": payload["n"]}
+
+    job_id = jobs.enqueue("slow", {"n": 1})
+    job = jobs._claim(queue)
+    worker = threading.Thread(target=lambda: jobs._run_one(jobs._connect(), job))
+    worker.start()
+    started.wait(5)
+
+    time.sleep(1.6)  # longer than JOB_STALE_SECONDS
+    assert time.time() - _status(queue, job_id)["updated_at"] < 1
+    assert jobs._claim(queue) is None  # not reclaimed: the heartbeat is alive
+    assert _status(queue, job_id)["status"] == jobs.RUNNING
+
+    release.set()
+    worker.join(5)
+    assert jobs.get_job(job_id)["status"] == jobs.DONE
+    assert jobs.get_job(job_id)["result"] == {"n": 1}
+
+
+def test_job_without_heartbeat_is_reclaimed(queue):
+    job_id = jobs.enqueue("crashed")
+    jobs._claim(queue)
+    queue.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 5, job_id))
+
+    job = jobs._claim(queue)
+
+    assert job["id"] == job_id
+    assert job["attempts"] == 1  # claimed a second time
+    assert _status(queue, job_id)["status"] == jobs.RUNNING
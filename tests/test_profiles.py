@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import db_manager
+import versions
+from conftest import FakeConnection, Row
+from db_manager import SchoolDB
+
+
+@pytest.fixture
+def db(settings):
+    settings(PROFILE_CACHE_ENTRIES="3")
+    db_manager._profile_cache.clear()
+    db = SchoolDB()
+    db.conn = FakeConnection(lambda sql, params: [
+        Row(Role="Etudiant", CNE=f"S-{params[0]}", GroupeID=params[0] % 2, Matricule=None)
+    ])
+    yield db
+    db_manager._profile_cache.clear()
+
+
+def _lookups(db):
+    return len(db.conn.statements("FROM Utilisateur U"))
+
+
+def test_profiles_are_cached_and_bounded(db):
+    for user_id in (1, 2, 3):
+        db.get_user_profile(user_id)
+    db.get_user_profile(1)          # most recently used again
+    db.get_user_profile(4)          # evicts 2, the least recently used
+
+    assert _lookups(db) == 4
+    assert list(db_manager._profile_cache) == [3, 1, 4]
+    assert db.get_user_profile("1")["cne"] == "S-1"
+    assert _lookups(db) == 4
+
+
+def test_users_change_evicts_the_changed_ids(db):
+    for user_id in (1, 2, 3):
+        db.get_user_profile(user_id)
+
+    db_manager._evict_profiles(("groups",), [1])
+    db_manager._evict_profiles(("users",), [2])
+    assert list(db_manager._profile_cache) == [1, 3]
+
+    db_manager._evict_profiles(("users",), None)
+    assert not db_manager._profile_cache
+
+
+def test_users_change_from_the_log_reaches_the_cache(db, monkeypatch):
+    monkeypatch.setitem(versions._versions, "users", versions._versions["users"])
+    db.get_user_profile(7)
+
+    versions.apply([(10**9, "users", 7)])
+
+    deadline = time.monotonic() + 2
+    while 7 in db_manager._profile_cache and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 7 not in db_manager._profile_cache
@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import analytics
+import exports
+import replica
+from conftest import FakeConnection
+from db_manager import SchoolDB
+
+SCHEMA = """
+CREATE TABLE ReplicaHeartbeat (ID INTEGER PRIMARY KEY, Battement TEXT NOT NULL);
+CREATE TABLE Seance (SeanceID INTEGER, ModuleID INTEGER, GroupeID INTEGER, FormateurID INTEGER, DateDebut TEXT);
+CREATE TABLE Presence (SeanceID INTEGER, EtudiantID INTEGER, Etat TEXT);
+CREATE TABLE Etudiant (EtudiantID INTEGER, CNE TEXT);
+CREATE TABLE Groupe (GroupeID INTEGER, NomGroupe TEXT);
+CREATE TABLE Module (ModuleID INTEGER, NomModule TEXT);
+CREATE TABLE TP (TPID INTEGER, Titre TEXT, DateLimite TEXT, ModuleID INTEGER, GroupeID INTEGER, FormateurID INTEGER);
+CREATE TABLE Soumission (SoumissionID INTEGER, TPID INTEGER, EtudiantID INTEGER, DateSoumission TEXT,
+                         Tentative INTEGER, EstDerniere INTEGER, Note REAL);
+INSERT INTO Etudiant VALUES (7, 'A123');
+INSERT INTO Groupe VALUES (2, 'G2');
+INSERT INTO Module VALUES (3, 'Réseaux');
+INSERT INTO TP VALUES (5, 'TCP', '2024-10-01', 3, 2, 4);
+INSERT INTO Soumission VALUES (11, 5, 7, '2024-09-30 10:00:00', 1, 1, 15.5);
+"""
+
+
+@pytest.fixture
+def replica_file(tmp_path, settings, monkeypatch):
+    """ A local SQLite replica (DB_REPLICA_URL=sqlite:///...) with a heartbeat `lag` seconds old. """
+    path = tmp_path / "replica.db"
+
+    def make(lag=0):
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        beat = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=lag)
+        conn.execute("INSERT INTO ReplicaHeartbeat VALUES (1, ?)", (beat.isoformat(sep=" "),))
+        conn.commit()
+        conn.close()
+        settings(DB_REPLICA_URL=f"sqlite:///{path}", DB_REPLICA_MAX_LAG=30)
+        return path
+
+    monkeypatch.setattr(replica, "_state", {"down_until": 0.0, "lag": None, "lag_checked": 0.0})
+    monkeypatch.setattr(replica, "stats", dict.fromkeys(replica.stats, 0))
+    return make
+
+
+def _db(answer=None):
+    db = SchoolDB()
+    db.conn = FakeConnection(answer)
+    return db
+
+
+def test_lag_is_read_from_the_replica_clock(replica_file):
+    replica_file(lag=12)
+    lag = replica.replica_lag(replica.connect_replica())
+    assert 11 <= lag <= 14
+
+
+def test_fresh_replica_serves_the_report(replica_file):
+    replica_file()
+    db = _db()
+
+    chunks = list(exports.csv_chunks(db.reporting_stream(exports.iter_batches, "grades", "2024-09-01", "2025-09-01")))
+
+    assert "TCP" in "".join(chunks) and "15.5" in "".join(chunks)
+    assert db.conn.executed == []  # nothing ran on the primary
+    assert replica.stats["replica_reads"] == 1
+
+
+def test_tsql_report_falls_back_to_the_primary(replica_file):
+    # analytics uses DATEDIFF(DAY, ...), which the SQLite replica cannot run
+    replica_file()
+    db = _db(lambda sql, params: [(7, 3, 2, 19968, 1), (7, 3, 2, 19969, 0)] if "DATEDIFF" in sql else [])
+
+    cols = db.reporting(analytics.load_presence_columns)
+
+    assert cols["student"].tolist() == [7, 7] and cols["present"].tolist() == [True, False]
+    assert replica.stats["fallbacks"] == 1 and replica.is_down()
+    assert db.read_conn is None
+
+    # Marked down: the next report goes straight to the primary
+    db.reporting(analytics.load_presence_columns)
+    assert replica.stats["primary_reads"] == 1
+
+
+def test_stream_falls_back_before_the_first_item(replica_file):
+    replica_file()
+
+    def failing_on_replica(conn):
+        if isinstance(conn, sqlite3.Connection):
+            conn.execute("SELECT DATEDIFF(DAY, '1970-01-01', DateDebut) FROM Seance")
+        yield "primary"
+
+    assert list(_db().reporting_stream(failing_on_replica)) == ["primary"]
+    assert replica.stats["fallbacks"] == 1
+
+
+def test_stale_replica_is_skipped(replica_file):
+    replica_file(lag=120)
+    db = _db()
+
+    db.reporting(lambda conn: conn.cursor().execute("SELECT 1"))
+
+    assert replica.stats["stale_skips"] == 1 and replica.stats["primary_reads"] == 1
+    assert db.conn.statements("SELECT 1")
@@ -0,0 +1,77 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+import rows
+from conftest import FakeConnection
+
+UserRow = rows.record("UserRow", "id name joined")
+
+
+def test_records_answer_like_the_old_row_dicts():
+    r = UserRow(7, "Sara Alami", date(2024, 9, 2))
+
+    assert r["name"] == r.name == r[1] == "Sara Alami"
+    assert r.get("missing", "-") == "-"
+    assert list(r.keys()) == ["id", "name", "joined"]
+    assert r.to_dict() == {"id": 7, "name": "Sara Alami", "joined": date(2024, 9, 2)}
+    with pytest.raises(KeyError):
+        r["missing"]
+    assert not hasattr(r, "__dict__")
+
+
+def test_map_rows_fetches_in_batches():
+    conn = FakeConnection(lambda sql, params: [(i, f"u{i}", None) for i in range(5)])
+    cursor = conn.cursor().execute("SELECT ...")
+    fetches = []
+    fetchmany = cursor.fetchmany
+    cursor.fetchmany = lambda size: fetches.append(size) or fetchmany(size)
+
+    records = list(rows.map_rows(cursor, UserRow, batch_size=2))
+
+    assert [r.id for r in records] == [0, 1, 2, 3, 4]
+    assert fetches == [2, 2, 2, 2]
+
+
+def test_dumps_matches_the_old_str_conversions():
+    doc = {"when": datetime(2025, 1, 2, 8, 30), "rate": Decimal("87.5"), "user": UserRow(1, "Élise", None)}
+    assert json.loads(rows.dumps(doc)) == {
+        "when": "2025-01-02 08:30:00", "rate": "87.5", "user": {"id": 1, "name": "Élise", "joined": None}}
+    with pytest.raises(TypeError):
+        rows.dumps({"x": object()})
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 500])
+def test_iter_json_streams_the_same_document(chunk_rows):
+    users = [UserRow(i, f"u{i}", date(2024, 9, i + 1)) for i in range(5)]
+    doc = {"count": 5, "users": users, "empty": [], "meta": {"page": 1}}
+
+    pieces = list(rows.iter_json(doc, chunk_rows=chunk_rows))
+
+    assert json.loads("".join(pieces)) == json.loads(rows.dumps(doc))
+    assert json.loads("".join(rows.iter_json(iter(users), chunk_rows))) == [u.to_dict() | {"joined": str(u.joined)}
+                                                                           for u in users]
+    assert len(pieces) > 5 // chunk_rows
+
+
+def test_stdlib_encoder_gives_the_same_json(monkeypatch):
+    import importlib.util
+    import sys
+
+    def doc(module):
+        row = module.record("UserRow", "id name joined")
+        return {"when": date(2025, 1, 2), "users": [row(1, "Élise", None)], "first": row(2, "Sara", None),
+                "rate": Decimal("1.5")}
+
+    # A separate copy of the module, loaded as if orjson were not installed
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    spec = importlib.util.spec_from_file_location("rows_without_orjson", rows.__file__)
+    plain = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plain)
+
+    expected = json.loads(rows.dumps(doc(rows)))
+    assert plain.orjson is None
+    assert json.loads(plain.dumps(doc(plain))) == expected
+    assert json.loads("".join(plain.iter_json(doc(plain), chunk_rows=1))) == expected
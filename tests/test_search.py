@@ -0,0 +1,85 @@
+import pytest
+
+import search
+from db_manager import ContentSearchRow, UserSearchRow
+
+ROWS = {
+    "user": {
+        1: UserSearchRow(1, "Élodie Martin", "elodie.martin@ofppt.ma", "Etudiant", "S-101", None, "DEV101"),
+        2: UserSearchRow(2, "Omar Benali", "o.benali@ofppt.ma", "Formateur", None, "PROF-12", None),
+        3: UserSearchRow(3, "Martine Omari", "martine@ofppt.ma", "Etudiant", "S-102", None, "DEV102"),
+    },
+    "tp": {
+        10: ContentSearchRow(10, "TP Réseaux : routage statique", "DEV101", "Réseaux"),
+    },
+    "annonce": {
+        20: ContentSearchRow(20, "Report du contrôle de Martin", "DEV101", "Algorithmique"),
+    },
+}
+
+
+DATA = {}  # what _FakeDB serves: a fresh copy of ROWS per test
+
+
+class _FakeDB:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def get_search_documents(self, kind, ids=None):
+        rows = DATA[kind]
+        return [row for i, row in rows.items() if ids is None or i in ids]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(search, "SchoolDB", _FakeDB)
+    for name in ("_docs", "_postings", "_terms"):
+        monkeypatch.setattr(search, name, getattr(search, name))
+    monkeypatch.setattr(search, "_stats", dict(search._stats))
+    DATA.clear()
+    DATA.update({kind: dict(rows) for kind, rows in ROWS.items()})
+    search.build()
+    return search
+
+
+def _hits(results):
+    return [(r["kind"], r["id"]) for r in results]
+
+
+def test_fold_and_words():
+    assert search.fold("Élodie") == "elodie"
+    assert search.words("TP Réseaux : routage") == ["tp", "reseaux", "routage"]
+
+
+def test_prefixes_match_accent_free_and_rank_exact_words_first(index):
+    # Shorter completions of the prefix first; on a tie the shorter label
+    assert _hits(index.query("mart")) == [("user", 1), ("annonce", 20), ("user", 3)]
+    # An exact word outranks a longer word it is a prefix of, even in a heavier field
+    assert _hits(index.query("omar")) == [("user", 2), ("user", 3)]
+    assert _hits(index.query("reseaux")) == [("tp", 10)]
+
+
+def test_every_word_must_match(index):
+    assert _hits(index.query("mar om")) == [("user", 3)]
+    assert index.query("martin algebre") == []
+
+
+def test_short_queries_and_kind_filter(index):
+    assert index.query("m") == []
+    assert _hits(index.query("martin", kinds=("annonce",))) == [("annonce", 20)]
+
+
+def test_changes_reload_only_the_changed_rows(index):
+    DATA["user"][3] = UserSearchRow(3, "Martine Idrissi", "martine@ofppt.ma", "Etudiant", "S-102", None, "DEV102")
+    del DATA["user"][1]
+
+    index._on_change(("users",), [1, 3])
+
+    assert _hits(index.query("omari")) == []
+    assert _hits(index.query("idrissi")) == [("user", 3)]
+    assert _hits(index.query("elodie")) == []
+    assert "elodie" not in index._terms
+    assert index.stats()["documents"] == 4
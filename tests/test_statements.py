@@ -0,0 +1,93 @@
+import types
+
+import pytest
+
+import pool
+import statements
+from conftest import FakeConnection, Row
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(statements, "_stats", {})
+
+
+def _db(conn, pooled=True):
+    return types.SimpleNamespace(conn=conn, pooled=pool.PooledConnection(conn) if pooled else None)
+
+
+def test_registered_statements_have_one_fixed_tagged_text():
+    for name, sql in statements.STATEMENTS.items():
+        assert sql.startswith(f"/* stmt:{name} */\n")
+        assert "{" not in sql
+    assert statements.sql_for("login.by_email").endswith("FROM Utilisateur WHERE Email = ?")
+
+
+def test_pooled_connection_reuses_one_cursor_per_statement():
+    conn = FakeConnection(lambda sql, params: [Row(UserID=1)])
+    db = _db(conn)
+
+    first = statements.execute(db, "login.by_email", ("a@b.ma",))
+    again = statements.execute(db, "login.by_email", ("c@d.ma",))
+    other = statements.execute(db, "kpis.all")
+
+    assert first is again and other is not first
+    assert [params for _, params in conn.executed] == [("a@b.ma",), ("c@d.ma",), ()]
+    report = statements.stats()["statements"]
+    assert report["login.by_email"]["prepared"] == 1 and report["login.by_email"]["reused"] == 1
+    assert report["login.by_email"]["reuse_rate"] == 50.0
+
+
+def test_failed_statement_drops_its_cursor():
+    def answer(sql, params):
+        raise RuntimeError("connection reset")
+    db = _db(FakeConnection(answer))
+
+    with pytest.raises(RuntimeError):
+        statements.execute(db, "kpis.all")
+
+    assert "kpis.all" not in db.pooled.cursors
+    assert statements.stats()["statements"]["kpis.all"]["executions"] == 1
+
+
+def test_unpooled_connection_gets_a_plain_cursor():
+    db = _db(FakeConnection(), pooled=False)
+    assert statements.execute(db, "kpis.all") is not statements.execute(db, "kpis.all")
+    assert statements.stats()["statements"]["kpis.all"]["reused"] == 0
+
+
+class _Conn:
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.closed = False
+
+    def rollback(self):
+        if self.broken:
+            raise OSError("link down")
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_idle_connections_and_discards_broken_ones():
+    p = pool.ConnectionPool(_Conn, size=1, max_idle=300)
+
+    a = p.acquire()
+    a.cursors["kpis.all"] = object()
+    p.release(a)
+    assert p.acquire() is a and a.cursors  # prepared cursors kept
+
+    a.conn.broken = True
+    p.release(a)
+    assert a.conn.closed and p.stats["discarded"] == 1
+    assert p.acquire() is not a
+
+
+def test_pool_expires_idle_connections(monkeypatch):
+    p = pool.ConnectionPool(_Conn, size=2, max_idle=300)
+    a = p.acquire()
+    p.release(a)
+    monkeypatch.setattr(pool.time, "time", lambda: a.last_used + 301)
+
+    assert p.acquire() is not a
+    assert a.conn.closed and p.stats["expired"] == 1
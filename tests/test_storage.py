@@ -0,0 +1,80 @@
+import os
+import zlib
+
+import pytest
+
+import storage
+
+
+@pytest.fixture
+def zlib_codec(settings):
+    settings(BLOB_COMPRESSION="zlib")
+
+
+TEXT = b"int main(void) { return 0; }\n" * 2000
+
+
+def _joined(chunks):
+    return b"".join(chunks)
+
+
+def test_bytes_round_trip(zlib_codec):
+    encoded = storage.encode(TEXT, "main.c", "text/x-c")
+
+    assert encoded.codec == "zlib" and encoded.size == len(TEXT)
+    assert len(encoded.data) < len(TEXT)
+    assert storage.decode(encoded.data, encoded.codec) == TEXT
+    assert _joined(storage.iter_decoded(encoded.data, encoded.codec, chunk_size=100)) == TEXT
+
+
+def test_chunk_stream_round_trip(zlib_codec):
+    chunks = [TEXT[i:i + 4096] for i in range(0, len(TEXT), 4096)]
+    encoded = storage.encode(chunks, "main.c", "text/x-c")
+
+    assert encoded.codec == "zlib"
+    stored = list(encoded.data)
+    assert list(encoded.data) == stored  # re-iterable: SchoolDB may stream it more than once
+    assert _joined(storage.iter_decoded(stored, "zlib")) == TEXT
+
+
+def test_compressed_formats_are_stored_as_is(zlib_codec):
+    pdf = b"%PDF-1.7\n" + TEXT
+    encoded = storage.encode(pdf, "sujet.pdf", "application/pdf")
+
+    assert encoded.codec is None and encoded.data is pdf
+    assert storage.decode(encoded.data, None) is pdf
+    assert _joined(storage.iter_decoded(pdf, None, chunk_size=1000)) == pdf
+
+
+def test_incompressible_data_is_stored_as_is(zlib_codec):
+    noise = os.urandom(64 * 1024)
+
+    assert storage.encode(noise, "data.bin", "application/octet-stream").codec is None
+    assert storage.encode([noise[:32768], noise[32768:]], "data.bin", None).codec is None
+
+
+def test_compression_off(settings):
+    settings(BLOB_COMPRESSION="off")
+
+    assert storage.encode(TEXT, "main.c", "text/x-c").codec is None
+
+
+def test_zlib_blob_is_an_http_deflate_stream(zlib_codec):
+    encoded = storage.encode(TEXT, "main.c", "text/x-c")
+
+    assert zlib.decompress(encoded.data) == TEXT
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "deflate"),
+    ("gzip, deflate;q=0", None),
+    ("deflate;q=0.5", "deflate"),
+    ("*", "deflate"),
+    ("*, deflate;q=0", None),
+    ("gzip", None),
+    ("", None),
+    (None, None),
+])
+def test_accepted_coding(header, expected):
+    assert storage.accepted_coding("zlib", header) == expected
+    assert storage.accepted_coding(None, header) is None
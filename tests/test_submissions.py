@@ -0,0 +1,70 @@
+import types
+
+import pytest
+
+import db_manager
+from conftest import FakeConnection, Row
+from db_manager import SchoolDB
+
+
+@pytest.fixture(autouse=True)
+def binary(monkeypatch, settings):
+    settings(BLOB_COMPRESSION="off")
+    monkeypatch.setattr(db_manager, "_pyodbc", lambda: types.SimpleNamespace(Binary=bytes))
+
+
+def test_resubmission_becomes_the_latest_numbered_attempt():
+    def answer(sql, params):
+        if "MAX(Tentative)" in sql:
+            return [(2,)]
+        if "@@IDENTITY" in sql:
+            return [(55,)]
+        return []
+    db = SchoolDB()
+    db.conn = FakeConnection(answer)
+
+    assert db.submit_rapport_file(9, 4, b"%PDF-1.7", "rapport.pdf", "application/pdf") == 55
+
+    executed = [sql for sql, _ in db.conn.executed]
+    demote = next(i for i, sql in enumerate(executed) if "SET EstDerniere = 0" in sql)
+    insert = next(i for i, sql in enumerate(executed) if sql.startswith("INSERT INTO Soumission"))
+    assert demote < insert
+    assert "WITH (UPDLOCK, HOLDLOCK)" in executed[demote - 1]
+    (_, params), = db.conn.statements("INSERT INTO Soumission")
+    assert params[:2] == (9, 4) and params[6] == 3  # TPID, EtudiantID ... Tentative
+    assert db.conn.commits == 1
+
+
+def test_replayed_receipt_returns_the_attempt_already_saved():
+    db = SchoolDB()
+    db.conn = FakeConnection(lambda sql, params: [Row(SoumissionID=41)] if "RecuID = ?" in sql else [])
+
+    assert db.submit_rapport_file(9, 4, b"%PDF", "r.pdf", "application/pdf", receipt_id="abc") == 41
+    assert not db.conn.statements("INSERT INTO Soumission")
+
+
+def test_archive_old_attempts_moves_superseded_blobs_in_batches():
+    batches = [[(1,), (2,)], [(3,)], []]
+
+    def answer(sql, params):
+        if sql.startswith("SELECT TOP (?) SoumissionID"):
+            assert "EstDerniere = 0" in sql
+            return batches.pop(0)
+        return []
+    db = SchoolDB()
+    db.conn = FakeConnection(answer)
+
+    assert db.archive_old_attempts(batch_size=2) == 3
+    assert [p for _, p in db.conn.statements("INSERT INTO SoumissionArchive")] == [(1, 2), (3,)]
+    assert [p for _, p in db.conn.statements("SET FichierData = NULL")] == [(1, 2), (3,)]
+    assert db.conn.commits == 2
+
+
+def test_latest_only_views():
+    db = SchoolDB()
+    db.conn = FakeConnection()
+    db.get_submissions_for_tp(9)
+    db.get_submission_manifest(9)
+    reads = [sql for sql, _ in db.conn.executed if "FROM Soumission S" in sql]
+    assert len(reads) == 2
+    assert all("S.EstDerniere = 1" in sql for sql in reads)
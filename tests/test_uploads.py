@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+import uploads
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def session(settings):
+    settings(UPLOAD_CHUNK_SIZE=8)
+    return uploads.create(1, "report", 20, "rapport.txt", "text/plain", meta={"tp_id": 3})
+
+
+def _part_size(manifest):
+    return os.path.getsize(uploads._paths(manifest["id"])[1])
+
+
+def test_chunks_are_appended_at_the_expected_offset(session):
+    uploads.put_chunk(session, 0, io.BytesIO(b"abcdefgh"), 8, _sha(b"abcdefgh"))
+    manifest = uploads.put_chunk(session, 8, io.BytesIO(b"ijkl"), 4)
+
+    assert manifest["received"] == 12
+    assert uploads.load(session["id"], 1)["received"] == 12
+
+
+def test_wrong_offset_reports_bytes_received(session):
+    uploads.put_chunk(session, 0, io.BytesIO(b"abcd"), 4)
+
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 2, io.BytesIO(b"cdef"), 4)
+    assert error.value.status == 409 and error.value.extra["received"] == 4
+
+
+def test_checksum_mismatch_truncates_the_chunk(session):
+    uploads.put_chunk(session, 0, io.BytesIO(b"abcd"), 4)
+
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 4, io.BytesIO(b"efgh"), 4, _sha(b"other"))
+    assert error.value.status == 422
+    assert _part_size(session) == 4
+
+    # The client resumes from the last good byte
+    assert uploads.put_chunk(session, 4, io.BytesIO(b"efgh"), 4, _sha(b"efgh"))["received"] == 8
+
+
+def test_short_body_truncates_the_chunk(session):
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 0, io.BytesIO(b"abc"), 8)
+    assert error.value.status == 422
+    assert _part_size(session) == 0
+
+
+class _Disconnecting(io.BytesIO):
+    """ Request stream whose client goes away after `after` bytes. """
+
+    def __init__(self, data, after):
+        super().__init__(data)
+        self.after = after
+
+    def read(self, size=-1):
+        if self.tell() >= self.after:
+            raise ConnectionResetError("client disconnected")
+        return super().read(min(size, self.after - self.tell()))
+
+
+def test_disconnect_mid_chunk_truncates_the_chunk(session, monkeypatch):
+    monkeypatch.setattr(uploads, "READ_SIZE", 2)
+    uploads.put_chunk(session, 0, io.BytesIO(b"abcd"), 4)
+
+    with pytest.raises(ConnectionResetError):
+        uploads.put_chunk(session, 4, _Disconnecting(b"efgh", after=3), 4)
+    assert _part_size(session) == 4
+    assert uploads.load(session["id"], 1)["received"] == 4
+
+
+def test_chunk_limits(session):
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 0, io.BytesIO(b"x" * 9), 9)
+    assert error.value.status == 413
+
+    uploads.put_chunk(session, 0, io.BytesIO(b"x" * 8), 8)
+    uploads.put_chunk(session, 8, io.BytesIO(b"x" * 8), 8)
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 16, io.BytesIO(b"x" * 8), 8)
+    assert error.value.status == 416
+
+
+def test_chunk_after_finalize_is_not_found(session):
+    uploads.discard(session["id"])
+
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.put_chunk(session, 0, io.BytesIO(b"abcd"), 4)
+    assert error.value.status == 404
+    with pytest.raises(uploads.UploadError):
+        with uploads.locked(session["id"], 1):
+            pass
+
+
+def test_assembled_checks_size_and_checksum(settings):
+    settings(UPLOAD_CHUNK_SIZE=8)
+    manifest = uploads.create(1, "report", 6, "rapport.txt", "text/plain", sha256=_sha(b"abcdef"))
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.assembled(uploads.put_chunk(manifest, 0, io.BytesIO(b"abc"), 3))
+    assert error.value.status == 409
+
+    manifest = uploads.put_chunk(manifest, 3, io.BytesIO(b"def"), 3)
+    with open(uploads.assembled(manifest), "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+def test_sessions_belong_to_their_user(session):
+    with pytest.raises(uploads.UploadError) as error:
+        uploads.load(session["id"], 2)
+    assert error.value.status == 404
@@ -0,0 +1,45 @@
+import io
+import zipfile
+
+import pytest
+
+from zipstream import safe_name, stream_zip
+
+
+def test_streamed_archive_round_trips():
+    report = [b"%PDF-1.4 " + bytes(range(256)) * 40, b"fin"]
+    entries = [("Alami_Sara_S-1/rapport.pdf", iter(report)), ("vide.txt", iter([]))]
+
+    archive = b"".join(stream_zip(entries))
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ["Alami_Sara_S-1/rapport.pdf", "vide.txt"]
+        assert zf.read("Alami_Sara_S-1/rapport.pdf") == b"".join(report)
+        assert zf.read("vide.txt") == b""
+
+
+def test_entries_are_consumed_lazily():
+    consumed = []
+
+    def chunks(name):
+        for i in range(3):
+            consumed.append((name, i))
+            yield bytes(1000)
+
+    stream = stream_zip((name, chunks(name)) for name in ("a", "b"))
+    next(stream)
+    assert consumed == [("a", 0)]
+    b"".join(stream)
+    assert len(consumed) == 6
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Rapport final.pdf", "Rapport final.pdf"),
+    ("../../etc/passwd", "etc_passwd"),
+    ("Élève/TP:1", "Élève_TP_1"),
+    ("  ..  ", "file"),
+    (None, "file"),
+])
+def test_safe_name(text, expected):
+    assert safe_name(text) == expected
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import json
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import rows  # noqa: E402
+
+# Compares the old listing path (one dict per row + json.dumps of the whole document)
+# with tuple-backed records + rows.iter_json on a synthetic users / TP listing.
+#
+#   python utils/bench_rows.py [n_rows]
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+random.seed(7)
+
+TPRow = rows.record("TPRow", "id titre deadline group module teacher")
+base = datetime(2024, 9, 1)
+# What pyodbc hands back: one tuple per row (Teacher already concatenated by SQL on the new path)
+raw = [(i, f"TP {i} - Rapport", base + timedelta(hours=i), f"G{i % 40}", f"Module {i % 25}",
+        f"Nom{i % 900}", f"Prenom{i % 300}") for i in range(N)]
+raw_concat = [r[:5] + (f"{r[5]} {r[6]}",) for r in raw]
+
+
+def old_path():
+    items = [{"id": r[0], "titre": r[1], "deadline": str(r[2]), "group": r[3], "module": r[4],
+              "teacher": f"{r[5]} {r[6]}"} for r in raw]
+    return json.dumps(items)
+
+
+def new_path():
+    items = [TPRow._make(r) for r in raw_concat]
+    return "".join(rows.iter_json(items))
+
+
+def measure(fn):
+    # Timed without tracing (tracemalloc slows allocation-heavy code down), then traced for the peak
+    started = time.perf_counter()
+    out = fn()
+    elapsed = (time.perf_counter() - started) * 1000
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+old_out, old_ms, old_mb = measure(old_path)
+new_out, new_ms, new_mb = measure(new_path)
+assert json.loads(old_out) == json.loads(new_out), "outputs differ"
+
+print(f"--- {N} rows (encoder: {'orjson' if rows.orjson else 'stdlib json'}) ---")
+print(f"dicts + json.dumps     : {old_ms:8.1f} ms   peak {old_mb:7.1f} MB")
+print(f"records + iter_json    : {new_ms:8.1f} ms   peak {new_mb:7.1f} MB")
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import random
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import search  # noqa: E402
+from db_manager import UserSearchRow, ContentSearchRow  # noqa: E402
+
+# Autocomplete latency of the in-memory search index on a synthetic school
+# (n users, plus TPs and announcements), for prefixes of 1 to 3 words.
+#
+#   python utils/bench_search.py [n_users]
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+random.seed(7)
+
+FIRST = ["Élodie", "Yassine", "Fatima-Zahra", "Mohamed", "Salma", "Anas", "Hajar", "Omar", "Imane", "Mehdi",
+         "Sara", "Youssef", "Nour", "Hamza", "Khadija", "Ayoub", "Zineb", "Ilyas", "Meryem", "Achraf"]
+LAST = ["El Amrani", "Benali", "Idrissi", "Tazi", "Ouazzani", "Berrada", "Chraïbi", "Alaoui", "Fassi", "Naciri",
+        "Bennani", "Lahlou", "Skalli", "Kettani", "Sebti", "Jebli", "Hamdaoui", "Rami", "Zahiri", "Bouzid"]
+MODULES = ["Réseaux", "Bases de données", "Développement Web", "Systèmes", "Sécurité", "Algorithmique"]
+
+
+def fill():
+    docs = []
+    for i in range(1, N + 1):
+        first, last = random.choice(FIRST), random.choice(LAST) + ("" if i % 3 else f"{i % 97}")
+        role = "Formateur" if i % 25 == 0 else "Etudiant"
+        row = UserSearchRow(i, f"{last} {first}", f"{first}.{last}{i}@ofppt.ma".replace(" ", "").lower(), role,
+                            None if role == "Formateur" else f"S-{10000 + i}",
+                            f"PROF-{i}" if role == "Formateur" else None, f"DEV{i % 40}")
+        docs.append((("user", i), search._document("user", row)))
+    for i in range(1, N // 5 + 1):
+        row = ContentSearchRow(i, f"TP {i} {random.choice(MODULES)} - Rapport", f"DEV{i % 40}", random.choice(MODULES))
+        docs.append((("tp", i), search._document("tp", row)))
+        row = ContentSearchRow(i, f"Annonce {random.choice(MODULES)} séance {i}", f"DEV{i % 40}", random.choice(MODULES))
+        docs.append((("annonce", i), search._document("annonce", row)))
+    started = time.perf_counter()
+    with search._lock:
+        for key, doc in docs:
+            search._add(key, doc)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    build_ms = fill()
+    print(f"{N} users: {len(search._docs)} documents, {len(search._terms)} words, incremental build {build_ms:.0f} ms")
+    queries = ["el", "elo", "elodie", "chraibi", "Chraï", "s-100", "prof-25", "yassine ben", "el am y",
+               "tp 12", "reseaux", "annonce sec", "dev1", "fatima zahra idr", "hajar.lahlou"]
+    worst = 0.0
+    for q in queries:
+        times = []
+        for _ in range(50):
+            started = time.perf_counter()
+            results = search.query(q)
+            times.append((time.perf_counter() - started) * 1000)
+        p50, p_max = statistics.median(times), max(times)
+        worst = max(worst, p50)
+        top = results[0]["label"] if results else "-"
+        print(f"  {q!r:22} median {p50:6.2f} ms  max {p_max:6.2f} ms  top: {top}")
+    print(f"worst median: {worst:.2f} ms (target < 10 ms)")
+    return 0 if worst < 10 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())